@@ -3,7 +3,7 @@ from typing import Any
 from langchain_core.tools import Tool
 from langgraph.prebuilt import create_react_agent
 
-from core.model import LanguageModelManager
+from core.model import get_model_manager
 from core.state import StockAnalysisState
 from helpers.logger import setup_logger
 from helpers.prompt import adversarial_prompt  
@@ -21,7 +21,7 @@ def create_adversarial_agent(state: StockAnalysisState) -> Any:
     创建对抗性分析 Agent，输入为三份分析报告，输出批判性总结。
     """
     logger = setup_logger("adversarial_agent.log")
-    llm = LanguageModelManager().get_models()["llm_oai_o3"]
+    llm = get_model_manager().get_models()["llm_oai_o3"]
 
     # 读取已有报告内容
     sentiment = state.report_state.text_reports.get("sentiment_report", "无情绪分析")
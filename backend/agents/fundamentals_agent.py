@@ -6,7 +6,7 @@ from langchain_core.tools import Tool
 from langgraph.prebuilt import create_react_agent
 from langchain_community.tools.tavily_search import TavilySearchResults
 
-from core.model import LanguageModelManager
+from core.model import get_model_manager
 from core.state import StockAnalysisState
 from helpers.logger import setup_logger
 from helpers.prompt import fundamentals_prompt
@@ -74,7 +74,7 @@ def create_fundamentals_agent(state: StockAnalysisState) -> Any:
     ]
     
     # Get LLM from model manager
-    llm = LanguageModelManager().get_models()["llm_oai_o3"]
+    llm = get_model_manager().get_models()["llm_oai_o3"]
     
     # Extract metrics for the prompt
     metrics = {
@@ -12,7 +12,7 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import time  # 添加 time 模块
 
-from core.model import LanguageModelManager
+from core.model import get_model_manager
 from core.state import StockAnalysisState
 from helpers.logger import setup_logger
 
@@ -55,7 +55,7 @@ def create_visualization_agent(state: StockAnalysisState,stock_code:str, file_pa
     ]
     
     # Get LLM from model manager
-    llm = LanguageModelManager().get_models()["llm_oai_4o"]
+    llm = get_model_manager().get_models()["llm_oai_4o"]
     
     # Create prompt template with file paths
     prompt = """Expert Data Visualization Analyst Guidelines:
@@ -1,18 +1,20 @@
-from langgraph_codeact import create_codeact
-from core.model import LanguageModelManager
+from core.model import get_model_manager
 from core.state import StockAnalysisState
 from helpers.logger import setup_logger
 from tools.code_executor import eval
 
 
 logger = setup_logger("agent_coder.log")
-llm = LanguageModelManager().get_models()["llm_oai_o3"]
 
 
+def get_coder_llm():
+    """代码生成使用的模型，来自进程内共享的模型管理器"""
+    return get_model_manager().get_models()["llm_oai_o3"]
+
 
 def agent_coder(state: StockAnalysisState):
     logger.info("Start agent coder")
+    from langgraph_codeact import create_codeact
 
-    
-    codeact = create_codeact(model=llm, tools=[], eval_fn=eval)
+    codeact = create_codeact(model=get_coder_llm(), tools=[], eval_fn=eval)
     return codeact.compile()
@@ -5,7 +5,7 @@ from langchain_core.tools import Tool
 from langgraph.prebuilt import create_react_agent
 from langchain_community.tools.tavily_search import TavilySearchResults
 
-from core.model import LanguageModelManager
+from core.model import get_model_manager
 from core.state import StockAnalysisState
 from helpers.logger import setup_logger
 from helpers.prompt import sentiment_prompt
@@ -26,7 +26,7 @@ def create_sentiment_agent(state: StockAnalysisState) -> Any:
     tools = [TavilySearchResults(max_results=3)]
     
     # Get LLM from model manager
-    llm = LanguageModelManager().get_models()["llm_oai_o3"]
+    llm = get_model_manager().get_models()["llm_oai_o3"]
     
     # Create prompt template with file paths
     prompt = sentiment_prompt.format(
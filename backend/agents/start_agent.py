@@ -5,7 +5,7 @@ from langchain_community.tools.tavily_search import TavilySearchResults
 from langgraph.prebuilt import create_react_agent
 from pydantic import BaseModel, Field
 
-from core.model import LanguageModelManager
+from core.model import get_model_manager
 from core.state import StockAnalysisState
 from tools.company_info_tools import analyze_company_info
 from tools.company_info_tools_db import get_company_info_from_db_tool
@@ -25,7 +25,7 @@ def create_stock_code_search_agent(state: StockAnalysisState):
     Returns:
         Agent: 配置好的股票搜索代理
     """
-    llm = LanguageModelManager().get_models()["llm_oai_mini"]
+    llm = get_model_manager().get_models()["llm_oai_mini"]
     logger = setup_logger("agent.log")
     # 初始化工具
     # search = DuckDuckGoSearchRun()
@@ -0,0 +1,131 @@
+"""
+启动耗时基准测试
+
+在子进程中以 `python -X importtime` 导入服务模块，统计导入耗时、最慢的模块，
+并检查是否有重量级依赖在导入阶段被加载。超出启动预算时以非零状态退出，可用于CI。
+
+用法:
+    python benchmarks/startup_benchmark.py                      # 默认测试 server 和 run_insight
+    python benchmarks/startup_benchmark.py server --budget 1.5 --top 20
+    python benchmarks/startup_benchmark.py --output log/startup_report.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只应在首次使用时加载的重量级依赖
+DEFERRED_MODULES = (
+    "akshare",
+    "talib",
+    "langchain_community",
+    "langgraph_codeact",
+    "matplotlib",
+    "seaborn",
+    "core.workflow",
+    "node",
+    "agents",
+    "bs4",
+)
+
+DEFAULT_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+
+
+def measure_import(module: str) -> Dict:
+    """在干净的子进程中导入模块，返回墙钟时间和 -X importtime 的逐模块耗时"""
+    env = dict(os.environ, FAST_START="true", PYTHONDONTWRITEBYTECODE="1")
+    code = f"import {module}"
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall_seconds = time.perf_counter() - start
+
+    imports: List[Dict] = []
+    errors: List[str] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            errors.append(line)
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        imports.append({
+            "module": parts[2].strip(),
+            "self_us": int(parts[0]),
+            "cumulative_us": int(parts[1]),
+        })
+
+    return {
+        "module": module,
+        "returncode": proc.returncode,
+        "wall_seconds": round(wall_seconds, 3),
+        "import_seconds": round(max((item["cumulative_us"] for item in imports), default=0) / 1e6, 3),
+        "imports": imports,
+        "errors": errors[-20:],
+    }
+
+
+def find_deferred(target: str, imports: List[Dict]) -> List[str]:
+    """找出导入目标模块时被加载的重量级依赖(不包括目标模块本身)"""
+    loaded = []
+    for item in imports:
+        name = item["module"]
+        if name == target:
+            continue
+        for deferred in DEFERRED_MODULES:
+            if name == deferred or name.startswith(deferred + "."):
+                loaded.append(name)
+                break
+    return loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="服务启动耗时基准测试")
+    parser.add_argument("modules", nargs="*", default=["server", "run_insight"], help="要导入的模块")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS, help="每个模块的导入时间预算(秒)")
+    parser.add_argument("--top", type=int, default=15, help="显示累计耗时最高的模块数量")
+    parser.add_argument("--output", help="将完整报告写入JSON文件")
+    args = parser.parse_args()
+
+    report = []
+    failed = False
+    for module in args.modules:
+        result = measure_import(module)
+        result["deferred_loaded"] = find_deferred(module, result["imports"])
+        result["budget_seconds"] = args.budget
+        result["within_budget"] = result["returncode"] == 0 and result["wall_seconds"] <= args.budget
+        report.append(result)
+
+        print(f"== {module}: 墙钟 {result['wall_seconds']}s, 导入 {result['import_seconds']}s, 预算 {args.budget}s")
+        if result["returncode"] != 0:
+            print("   导入失败:")
+            for line in result["errors"]:
+                print(f"   {line}")
+        slowest = sorted(result["imports"], key=lambda item: item["cumulative_us"], reverse=True)[:args.top]
+        for item in slowest:
+            print(f"   {item['cumulative_us'] / 1000:9.1f} ms  {item['module']}")
+        if result["deferred_loaded"]:
+            print(f"   导入阶段加载了应延迟的模块: {', '.join(sorted(set(result['deferred_loaded'])))}")
+        if not result["within_budget"] or result["deferred_loaded"]:
+            failed = True
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
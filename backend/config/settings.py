@@ -10,4 +10,72 @@ REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
-REDIS_CACHE_TTL = int(os.getenv("REDIS_CACHE_TTL", "86400"))  # 默认缓存1天(86400秒) 
\ No newline at end of file
+REDIS_CACHE_TTL = int(os.getenv("REDIS_CACHE_TTL", "86400"))  # 默认缓存1天(86400秒) 
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1"))  # 建立连接的超时(秒)
+
+# 任务存储配置
+TASK_STORE_DB = os.getenv("TASK_STORE_DB", "database/task_store.db")
+
+# 分析任务调度配置
+ANALYSIS_MAX_WORKERS = int(os.getenv("ANALYSIS_MAX_WORKERS", "2"))  # 同时运行的工作流数量
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "20"))  # 排队任务上限，超过返回429
+ANALYSIS_BATCH_MAX_ACTIVE = int(os.getenv("ANALYSIS_BATCH_MAX_ACTIVE", str(max(1, ANALYSIS_MAX_WORKERS - 1))))
+ANALYSIS_WORKER_LEASE = int(os.getenv("ANALYSIS_WORKER_LEASE", "60"))  # 共享队列工作进程的心跳过期时间(秒)，过期后回收其任务
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "2"))  # 工作进程崩溃后任务最多执行的次数
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))  # 独立工作进程的 /metrics 端口，0表示不启动
+WORKER_METRICS_HOST = os.getenv("WORKER_METRICS_HOST", "0.0.0.0")
+
+# 图片服务配置
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "database/cache/images")  # 缩放/转码后的图片缓存目录
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", "86400"))  # 浏览器缓存时间(秒)，过期后用ETag校验
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 图片缓存目录的大小上限
+
+# 任务注册表后端: "sqlite"(单进程) 或 "redis"(多个uvicorn工作进程/多台主机共享任务和队列)
+TASK_REGISTRY_BACKEND = os.getenv("TASK_REGISTRY_BACKEND", "sqlite").lower()
+TASK_REDIS_TTL = int(os.getenv("TASK_REDIS_TTL", "604800"))  # Redis中任务记录的过期时间，默认7天
+
+# 内存任务缓存配置，超出上限或过期的已结束任务从内存淘汰，需要时从注册表重新加载
+TASK_CACHE_MAX_TASKS = int(os.getenv("TASK_CACHE_MAX_TASKS", "500"))
+TASK_CACHE_MAX_BYTES = int(os.getenv("TASK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 结果模块占用的内存上限
+TASK_CACHE_TTL_COMPLETED = int(os.getenv("TASK_CACHE_TTL_COMPLETED", "3600"))  # 已完成任务在内存中的存活时间(秒)
+TASK_CACHE_TTL_FAILED = int(os.getenv("TASK_CACHE_TTL_FAILED", "600"))  # 失败任务在内存中的存活时间(秒)
+
+# 快速启动模式：启动时不预加载股票索引和工作流，全部推迟到首次使用
+FAST_START = os.getenv("FAST_START", "false").lower() in ("1", "true", "yes")
+
+# LLM HTTP连接池配置，进程内所有OpenAI模型共享一个长连接池
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))  # 空闲连接保持时间(秒)
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "600"))  # 推理模型响应较慢，超时时间较长
+
+# 工作流检查点：每个节点完成后按任务ID保存状态，失败重试或服务重启后从最后完成的节点继续
+WORKFLOW_CHECKPOINTS_ENABLED = os.getenv("WORKFLOW_CHECKPOINTS_ENABLED", "true").lower() in ("1", "true", "yes")
+WORKFLOW_CHECKPOINT_DB = os.getenv("WORKFLOW_CHECKPOINT_DB", "database/checkpoints.db")
+WORKFLOW_CHECKPOINT_TTL = int(os.getenv("WORKFLOW_CHECKPOINT_TTL", str(3 * 86400)))  # 失败/已取消任务的检查点保留时间(秒)
+WORKFLOW_CHECKPOINT_PRUNE_INTERVAL = int(os.getenv("WORKFLOW_CHECKPOINT_PRUNE_INTERVAL", "3600"))  # 检查点清理间隔(秒)，0表示不清理
+
+# 节点输出缓存：按输入内容的指纹保存分析报告和图表，输入未变化的节点直接复用
+NODE_MEMO_ENABLED = os.getenv("NODE_MEMO_ENABLED", "true").lower() in ("1", "true", "yes")
+NODE_MEMO_DIR = os.getenv("NODE_MEMO_DIR", "database/cache/node_memo")
+NODE_MEMO_MAX_AGE = int(os.getenv("NODE_MEMO_MAX_AGE", str(7 * 86400)))  # 记录的有效期(秒)
+NODE_MEMO_MAX_MB = int(os.getenv("NODE_MEMO_MAX_MB", "512"))  # 缓存目录的大小上限，0表示不限制
+NODE_MEMO_SWEEP_INTERVAL = int(os.getenv("NODE_MEMO_SWEEP_INTERVAL", "3600"))  # 清理过期记录的间隔(秒)，0表示不清理
+
+# 股票搜索索引：数据管道刷新 company_info 后更新标记文件，索引检测到股票列表或标记文件变化时在后台重建
+STOCK_INDEX_MARKER = os.getenv("STOCK_INDEX_MARKER", "database/cache/company_info.updated")
+STOCK_INDEX_RELOAD_INTERVAL = float(os.getenv("STOCK_INDEX_RELOAD_INTERVAL", "30"))  # 检查数据源变化的最小间隔(秒)
+
+# 可视化：图表由内置模板绘制，只用LLM生成简短描述；关闭时使用根据指标数值生成的固定描述
+VISUALIZATION_LLM_DESCRIPTION = os.getenv("VISUALIZATION_LLM_DESCRIPTION", "true").lower() in ("1", "true", "yes")
+
+# 图表渲染进程池：工作进程预先导入 matplotlib(Agg)/pandas，数据通过共享内存传递，多个分支和任务并行使用多核
+CHART_POOL_ENABLED = os.getenv("CHART_POOL_ENABLED", "true").lower() in ("1", "true", "yes")
+CHART_POOL_WORKERS = int(os.getenv("CHART_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "120"))  # 单个数据文件的渲染超时(秒)
+
+# 可视化输出：每次运行写入按输入内容寻址的目录并生成清单，后台定期清理旧的运行目录
+VIS_KEEP_RUNS = int(os.getenv("VIS_KEEP_RUNS", "3"))  # 每只股票每种数据保留的运行数
+VIS_DISK_QUOTA_MB = int(os.getenv("VIS_DISK_QUOTA_MB", "1024"))  # 所有运行目录的磁盘配额，0表示不限制
+VIS_GC_INTERVAL = int(os.getenv("VIS_GC_INTERVAL", "3600"))  # 清理间隔(秒)
+VIS_GC_REMOVE_LEGACY = os.getenv("VIS_GC_REMOVE_LEGACY", "false").lower() in ("1", "true", "yes")  # 是否删除旧版本直接写在数据目录下的图表
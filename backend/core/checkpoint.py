@@ -0,0 +1,180 @@
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from config.settings import (
+    WORKFLOW_CHECKPOINT_DB, WORKFLOW_CHECKPOINTS_ENABLED, WORKFLOW_CHECKPOINT_TTL, WORKFLOW_CHECKPOINT_PRUNE_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PickleSerializer:
+    """检查点序列化器
+
+    工作流状态中包含 DataFrame 和 pydantic 对象，默认的JSON序列化器无法还原，统一使用pickle。
+    检查点文件只由本服务读写
+    """
+
+    def dumps(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return "pickle", self.dumps(obj)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        _, payload = data
+        return self.loads(payload)
+
+
+def create_checkpointer(db_path: str = WORKFLOW_CHECKPOINT_DB):
+    """创建SQLite检查点存储，未安装 langgraph-checkpoint-sqlite 时退回内存存储(服务重启后无法恢复)"""
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        from langgraph.checkpoint.memory import MemorySaver
+        logger.warning("未安装 langgraph-checkpoint-sqlite，工作流检查点只保存在内存中")
+        return MemorySaver(serde=PickleSerializer())
+
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return SqliteSaver(conn, serde=PickleSerializer())
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer():
+    """进程内共享的检查点存储，关闭检查点时返回None"""
+    global _checkpointer
+    if not WORKFLOW_CHECKPOINTS_ENABLED:
+        return None
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = create_checkpointer()
+    return _checkpointer
+
+
+def clear_thread(checkpointer, thread_id: str) -> None:
+    """删除任务的全部检查点，重新开始或成功结束后调用"""
+    if checkpointer is None:
+        return
+    try:
+        if hasattr(checkpointer, "delete_thread"):
+            checkpointer.delete_thread(thread_id)
+        elif hasattr(checkpointer, "conn"):
+            with checkpointer.lock, checkpointer.conn:
+                checkpointer.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                checkpointer.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+        elif hasattr(checkpointer, "storage"):
+            checkpointer.storage.pop(thread_id, None)
+    except Exception as e:
+        logger.error(f"删除任务 {thread_id} 的检查点失败: {str(e)}")
+
+
+def has_checkpoint(thread_id: str) -> bool:
+    """任务是否存在可恢复的检查点"""
+    checkpointer = get_checkpointer()
+    if checkpointer is None:
+        return False
+    try:
+        return checkpointer.get_tuple({"configurable": {"thread_id": thread_id}}) is not None
+    except Exception as e:
+        logger.error(f"读取任务 {thread_id} 的检查点失败: {str(e)}")
+        return False
+
+
+def list_threads(checkpointer) -> List[str]:
+    """列出存在检查点的全部 thread_id"""
+    if checkpointer is None:
+        return []
+    if hasattr(checkpointer, "conn"):
+        with checkpointer.lock:
+            rows = checkpointer.conn.execute("SELECT DISTINCT thread_id FROM checkpoints").fetchall()
+        return [row[0] for row in rows]
+    if hasattr(checkpointer, "storage"):
+        return list(checkpointer.storage)
+    return list({item.config["configurable"]["thread_id"] for item in checkpointer.list(None)})
+
+
+def checkpoint_age(checkpointer, thread_id: str) -> Optional[float]:
+    """最后一个检查点距今的秒数，没有检查点时返回None"""
+    checkpoint_tuple = checkpointer.get_tuple({"configurable": {"thread_id": thread_id}})
+    if checkpoint_tuple is None:
+        return None
+    try:
+        saved_at = datetime.fromisoformat(checkpoint_tuple.checkpoint["ts"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+    return time.time() - saved_at
+
+
+def prune_checkpoints(checkpointer, task_status: Callable[[str], Optional[str]], ttl: int = WORKFLOW_CHECKPOINT_TTL) -> int:
+    """删除不再需要的检查点
+
+    - 已完成的任务直接删除(正常情况下运行成功时已删除)
+    - 失败、已取消或注册表中已不存在的任务，最后一个检查点超过 ttl 秒后删除，
+      在此之前仍可以重新提交并从中断处继续
+    - 排队或运行中的任务保留
+
+    Args:
+        task_status: 按任务ID返回注册表中的任务状态，任务不存在时返回None
+
+    Returns:
+        int: 删除检查点的任务数量
+    """
+    removed = 0
+    for thread_id in list_threads(checkpointer):
+        try:
+            status = task_status(thread_id)
+            if status in ("pending", "processing"):
+                continue
+            if status != "completed":
+                age = checkpoint_age(checkpointer, thread_id)
+                if age is not None and age < ttl:
+                    continue
+        except Exception as e:
+            logger.error(f"检查任务 {thread_id} 的检查点失败: {str(e)}")
+            continue
+        clear_thread(checkpointer, thread_id)
+        removed += 1
+    return removed
+
+
+class CheckpointPruner:
+    """启动时和之后定期清理失败、已取消和已过期任务的检查点"""
+
+    def __init__(self, task_status: Callable[[str], Optional[str]], interval: int = WORKFLOW_CHECKPOINT_PRUNE_INTERVAL):
+        self.task_status = task_status
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                removed = prune_checkpoints(get_checkpointer(), self.task_status)
+                if removed:
+                    logger.info(f"清理了 {removed} 个任务的工作流检查点")
+            except Exception as e:
+                logger.error(f"清理工作流检查点失败: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None and self.interval > 0 and WORKFLOW_CHECKPOINTS_ENABLED:
+            self._thread = threading.Thread(target=self._run, name="checkpoint-pruner", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
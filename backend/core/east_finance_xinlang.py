@@ -14,7 +14,6 @@ from dotenv import load_dotenv
 # 加载环境变量（使用绝对路径确保在任何工作目录下都能正确加载）
 env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
 load_dotenv(dotenv_path=env_path)
-print(f"🔧 正在加载环境变量文件: {env_path}")
 
 # 获取Redis配置
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
@@ -24,14 +23,20 @@ REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
 REDIS_CACHE_TTL = int(os.getenv("REDIS_CACHE_TTL", 86400))
 
 
-# ✅ 初始化 Redis 客户端
-redis_client = redis.StrictRedis(
-    host=REDIS_HOST,
-    port=REDIS_PORT,
-    db=REDIS_DB,
-    password=REDIS_PASSWORD,
-    decode_responses=True  # 自动解码为字符串
-)
+# ✅ Redis 客户端在首次使用时创建，导入本模块时不建立连接
+_redis_client = None
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.StrictRedis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            password=REDIS_PASSWORD,
+            decode_responses=True  # 自动解码为字符串
+        )
+    return _redis_client
 
 
 # ✅ 强制设置 UTF-8 编码（防止 Windows 中文系统报错）
@@ -46,14 +51,18 @@ if sys.platform == "win32":
 
 # ✅ 获取 OpenAI API 密钥
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-print(f"🔑 API密钥状态: {'已设置' if OPENAI_API_KEY else '未设置'}")
-if not OPENAI_API_KEY:
-    print("❌ 错误: 未找到 OPENAI_API_KEY 环境变量，请在 .env 文件中设置")
-    # 显示可用的环境变量列表（仅显示部分关键字，不显示实际值）
-    print("可用的环境变量列表：")
-    for key in os.environ:
-        if "KEY" in key or "API" in key:
-            print(f"  - {key}")
+
+def print_env_diagnostics():
+    """打印环境变量加载情况，只在命令行运行时调用"""
+    print(f"🔧 正在加载环境变量文件: {env_path}")
+    print(f"🔑 API密钥状态: {'已设置' if OPENAI_API_KEY else '未设置'}")
+    if not OPENAI_API_KEY:
+        print("❌ 错误: 未找到 OPENAI_API_KEY 环境变量，请在 .env 文件中设置")
+        # 显示可用的环境变量列表（仅显示部分关键字，不显示实际值）
+        print("可用的环境变量列表：")
+        for key in os.environ:
+            if "KEY" in key or "API" in key:
+                print(f"  - {key}")
 
 # 设置 OpenAI 相关配置
 OPENAI_MODEL = "gpt-3.5-turbo" # 使用的是GPT3.5-turbo模型
@@ -290,6 +299,8 @@ Below is the financial news content:
 
     
 def main():
+    print_env_diagnostics()
+    redis_client = get_redis_client()
     print("📡 正在抓取财经新闻...")
     news_text = gather_news()
 
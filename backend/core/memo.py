@@ -0,0 +1,257 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config.settings import (
+    NODE_MEMO_DIR, NODE_MEMO_ENABLED, NODE_MEMO_MAX_AGE, NODE_MEMO_MAX_MB, NODE_MEMO_SWEEP_INTERVAL
+)
+from utils.metrics import NODE_MEMO
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式变化时递增，使旧的记录全部失效
+MEMO_FORMAT_VERSION = "1"
+
+
+def _feed(digest, value: Any) -> None:
+    """把值按类型写入哈希，DataFrame按内容而不是对象身份计算"""
+    if value is None:
+        digest.update(b"N")
+    elif isinstance(value, bytes):
+        digest.update(b"B%d:" % len(value))
+        digest.update(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        digest.update(b"S%d:" % len(data))
+        digest.update(data)
+    elif isinstance(value, (bool, int, float)):
+        digest.update(f"V{value!r};".encode())
+    elif isinstance(value, dict):
+        digest.update(b"{%d:" % len(value))
+        for key in sorted(value, key=str):
+            _feed(digest, str(key))
+            _feed(digest, value[key])
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[%d:" % len(value))
+        for item in value:
+            _feed(digest, item)
+        digest.update(b"]")
+    elif hasattr(value, "columns") and hasattr(value, "dtypes"):
+        import pandas as pd
+        digest.update(b"D")
+        _feed(digest, [str(column) for column in value.columns])
+        _feed(digest, [str(dtype) for dtype in value.dtypes])
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    else:
+        _feed(digest, repr(value))
+
+
+def fingerprint(*parts: Any) -> str:
+    """计算节点输入的内容哈希"""
+    digest = hashlib.sha256(MEMO_FORMAT_VERSION.encode())
+    for part in parts:
+        _feed(digest, part)
+    return digest.hexdigest()
+
+
+def memo_date() -> str:
+    """当天日期，计入依赖当天数据的节点指纹
+
+    技术面提示词包含当天的分析截止日期，基本面和情绪分析会实时搜索网络，
+    这些节点的输出只在同一天内复用
+    """
+    return datetime.now().strftime("%Y%m%d")
+
+
+def file_digest(path: str) -> Optional[str]:
+    """数据文件的内容哈希，文件不存在时返回None"""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class NodeMemo:
+    """按输入指纹保存节点输出的磁盘缓存
+
+    每条记录保存在 memo_dir/节点名/xx/指纹.pkl，超过 max_age 的记录视为失效，
+    由 sweep 删除过期记录并限制目录的总大小
+    """
+
+    def __init__(self, memo_dir: str, max_age: int, max_bytes: int = 0):
+        self.memo_dir = memo_dir
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, node: str, key: str) -> str:
+        return os.path.join(self.memo_dir, node, key[:2], f"{key}.pkl")
+
+    def get(self, node: str, key: str) -> Optional[Any]:
+        path = self._path(node, key)
+        try:
+            if self.max_age and time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"读取节点 {node} 的缓存记录失败: {str(e)}")
+            return None
+
+    def set(self, node: str, key: str, value: Any) -> None:
+        path = self._path(node, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"保存节点 {node} 的缓存记录失败: {str(e)}")
+
+    def sweep(self) -> Dict[str, int]:
+        """删除过期的记录和中断写入留下的临时文件，总大小超过 max_bytes 时从最旧的记录开始删除"""
+        stats = {"removed": 0, "bytes_removed": 0, "bytes_kept": 0}
+        now = time.time()
+        records = []  # (mtime, size, path)
+        for root, _, files in os.walk(self.memo_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                expired = self.max_age and now - stat.st_mtime > self.max_age
+                if expired or (name.endswith(".tmp") and now - stat.st_mtime > 3600):
+                    self._remove(path, stat.st_size, stats)
+                elif name.endswith(".pkl"):
+                    records.append((stat.st_mtime, stat.st_size, path))
+                    stats["bytes_kept"] += stat.st_size
+        if self.max_bytes > 0 and stats["bytes_kept"] > self.max_bytes:
+            for mtime, size, path in sorted(records):
+                if stats["bytes_kept"] <= self.max_bytes:
+                    break
+                self._remove(path, size, stats)
+                stats["bytes_kept"] -= size
+        return stats
+
+    @staticmethod
+    def _remove(path: str, size: int, stats: Dict[str, int]) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        stats["removed"] += 1
+        stats["bytes_removed"] += size
+
+    def wrap(
+        self,
+        name: str,
+        fn: Callable,
+        inputs: Callable[[Any], Tuple],
+        capture: Callable[[Any, Any], Any],
+        restore: Callable[[Any, Any], Any],
+    ) -> Callable:
+        """包装节点：输入指纹未变化时跳过执行，复用保存的输出
+
+        Args:
+            inputs: 从节点输入中取出影响输出的部分，用于计算指纹
+            capture: 节点执行后提取需要保存的输出，返回None时不保存(如执行失败)
+            restore: 把保存的输出写回状态并返回节点结果，输出已失效(如图表文件被删除)时返回None
+        """
+
+        @wraps(fn)
+        def wrapper(state):
+            try:
+                key = fingerprint(name, *inputs(state))
+            except Exception as e:
+                logger.error(f"计算节点 {name} 的输入指纹失败: {str(e)}")
+                return fn(state)
+
+            stored = self.get(name, key)
+            if stored is not None:
+                restored = restore(state, stored)
+                if restored is not None:
+                    NODE_MEMO.inc(node=name, result="hit")
+                    logger.info(f"节点 {name} 的输入未变化，复用已保存的输出 ({key[:12]})")
+                    return restored[0]
+
+            NODE_MEMO.inc(node=name, result="miss")
+            result = fn(state)
+            value = capture(state, result)
+            if value is not None:
+                self.set(name, key, value)
+            return result
+
+        return wrapper
+
+
+def report_memo(report_key: str) -> Tuple[Callable, Callable]:
+    """分析师节点的 capture/restore：节点直接把报告写入 state.report_state"""
+
+    def capture(state, result):
+        return state.report_state.text_reports.get(report_key) or None
+
+    def restore(state, report):
+        return (state.add_report(report_key, report),)
+
+    return capture, restore
+
+
+_node_memo: Optional[NodeMemo] = None
+_node_memo_lock = threading.Lock()
+
+
+def get_node_memo() -> Optional[NodeMemo]:
+    """进程内共享的节点缓存，关闭时返回None"""
+    global _node_memo
+    if not NODE_MEMO_ENABLED:
+        return None
+    if _node_memo is None:
+        with _node_memo_lock:
+            if _node_memo is None:
+                _node_memo = NodeMemo(NODE_MEMO_DIR, NODE_MEMO_MAX_AGE, NODE_MEMO_MAX_MB * 1024 * 1024)
+    return _node_memo
+
+
+class NodeMemoSweeper:
+    """后台定期清理节点输出缓存目录的线程"""
+
+    def __init__(self, interval: int = NODE_MEMO_SWEEP_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                memo = get_node_memo()
+                stats = memo.sweep() if memo is not None else None
+                if stats and stats["removed"]:
+                    logger.info(
+                        f"清理了 {stats['removed']} 条节点缓存记录，释放 {stats['bytes_removed'] / 1024 / 1024:.1f}MB，"
+                        f"剩余 {stats['bytes_kept'] / 1024 / 1024:.1f}MB"
+                    )
+            except Exception as e:
+                logger.error(f"清理节点缓存失败: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None and self.interval > 0 and NODE_MEMO_ENABLED:
+            self._thread = threading.Thread(target=self._run, name="node-memo-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -1,11 +1,70 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from helpers.logger import setup_logger
+from core.runtime import CancellableNetworkBackend
+from utils.metrics import LLM_DURATION, LLM_TOKENS
+from config.settings import LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_MAX_KEEPALIVE, LLM_HTTP_KEEPALIVE_EXPIRY, LLM_HTTP_TIMEOUT
+
+
+def _token_usage(response) -> Tuple[int, int]:
+    """从LLM响应中提取 (prompt, completion) token数，兼容OpenAI和Gemini的返回格式"""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0)
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += int(metadata.get("input_tokens") or 0)
+            completion_tokens += int(metadata.get("output_tokens") or 0)
+    return prompt_tokens, completion_tokens
+
+
+class LLMMetricsCallbackHandler(BaseCallbackHandler):
+    """按模型角色记录LLM调用耗时和token用量"""
+
+    def __init__(self, role: str):
+        self.role = role
+        self._started: Dict[UUID, float] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        started_at = self._started.pop(run_id, None)
+        if started_at is not None:
+            LLM_DURATION.observe(time.perf_counter() - started_at, role=self.role, status="success")
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, role=self.role, type="prompt")
+        if completion_tokens:
+            LLM_TOKENS.inc(completion_tokens, role=self.role, type="completion")
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        started_at = self._started.pop(run_id, None)
+        if started_at is not None:
+            LLM_DURATION.observe(time.perf_counter() - started_at, role=self.role, status="error")
+
 
 class LanguageModelManager:
-    def __init__(self):
-        """Initialize the language model manager"""
+    def __init__(self, http_client: Optional[httpx.Client] = None):
+        """Initialize the language model manager
+
+        Args:
+            http_client: 可选的共享HTTP客户端，所有OpenAI模型复用其连接池
+        """
         self.logger = setup_logger("model_manager.log")
+        self.http_client = http_client
         self.llm_oai_mini = None
         self.llm_oai_o3 = None
         self.llm_google_flash = None
@@ -16,21 +75,32 @@ class LanguageModelManager:
     def initialize_llms(self):
         """Initialize language models"""
         try:
-            self.llm_oai_mini = ChatOpenAI(model="gpt-4o-mini", temperature=0.6)
-            self.llm_oai_o3 = ChatOpenAI(model="o3-mini-2025-01-31")
-            self.llm_google_flash = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0)
-            self.llm_oai_4o = ChatOpenAI(model="gpt-4o", temperature=0.5)
+            self.llm_oai_mini = ChatOpenAI(model="gpt-4o-mini", temperature=0.6, **self._openai_kwargs("llm_oai_mini"))
+            self.llm_oai_o3 = ChatOpenAI(model="o3-mini-2025-01-31", **self._openai_kwargs("llm_oai_o3"))
+            self.llm_google_flash = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0, callbacks=self._metrics("llm_google_flash"))
+            self.llm_oai_4o = ChatOpenAI(model="gpt-4o", temperature=0.5, **self._openai_kwargs("llm_oai_4o"))
             self.json_oai_llm = ChatOpenAI(
                 model="gpt-4o",
                 model_kwargs={"response_format": {"type": "json_object"}},
                 temperature=0,
-                max_tokens=4096
+                max_tokens=4096,
+                **self._openai_kwargs("json_oai_llm")
             )
             self.logger.info("Language models initialized successfully.")
         except Exception as e:
             self.logger.error(f"Error initializing language models: {str(e)}")
             raise
 
+    @staticmethod
+    def _metrics(role: str):
+        return [LLMMetricsCallbackHandler(role)]
+
+    def _openai_kwargs(self, role: str) -> Dict:
+        kwargs = {"callbacks": self._metrics(role)}
+        if self.http_client is not None:
+            kwargs["http_client"] = self.http_client
+        return kwargs
+
     def get_models(self):
         """Return all initialized language models"""
         return {
@@ -39,4 +109,38 @@ class LanguageModelManager:
             "llm_google_flash": self.llm_google_flash,
             "llm_oai_4o": self.llm_oai_4o,
             "json_oai_llm": self.json_oai_llm
-        }
\ No newline at end of file
+        }
+
+_model_manager: Optional[LanguageModelManager] = None
+_model_manager_lock = threading.Lock()
+
+
+def create_http_client() -> httpx.Client:
+    """创建带长连接池的HTTP客户端，连接在多次LLM调用之间复用，避免重复TLS握手
+
+    连接使用 CancellableNetworkBackend，任务取消时正在进行的请求立即中断
+    """
+    transport = httpx.HTTPTransport(
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+    # HTTPTransport 不支持传入网络后端，替换其连接池使用的后端
+    transport._pool._network_backend = CancellableNetworkBackend(transport._pool._network_backend)
+    return httpx.Client(transport=transport, timeout=LLM_HTTP_TIMEOUT)
+
+
+def get_model_manager() -> LanguageModelManager:
+    """进程内共享的模型管理器，首次调用时创建
+
+    各智能体复用同一组模型客户端和HTTP连接池。异步调用仍使用每个模型自带的客户端，
+    因为异步连接池绑定在事件循环上，而数据获取节点每次都会新建事件循环
+    """
+    global _model_manager
+    if _model_manager is None:
+        with _model_manager_lock:
+            if _model_manager is None:
+                _model_manager = LanguageModelManager(http_client=create_http_client())
+    return _model_manager
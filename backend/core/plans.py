@@ -0,0 +1,37 @@
+from typing import NamedTuple, Tuple
+
+
+class AnalysisPlan(NamedTuple):
+    """一种分析类型需要运行的节点和获取的数据集"""
+    analysts: Tuple[str, ...]  # 并行运行的分析师节点
+    visualization: bool  # 是否生成图表
+    datasets: Tuple[str, ...]  # data_acquisition 节点获取的数据集
+
+
+DEFAULT_ANALYSIS_TYPE = "综合分析"
+
+# 数据集: news, sector, trade, financial, indicators, analyst, technical
+ANALYSIS_PLANS = {
+    "综合分析": AnalysisPlan(
+        analysts=("fundamentals", "technical", "sentiment"),
+        visualization=True,
+        datasets=("news", "sector", "trade", "financial", "indicators", "analyst", "technical"),
+    ),
+    # 技术面分析不获取财务、分析师和新闻数据，不运行基本面和情绪分析
+    "技术面分析": AnalysisPlan(
+        analysts=("technical",),
+        visualization=True,
+        datasets=("sector", "trade", "technical"),
+    ),
+    # 基本面分析不生成图表，也不需要行情和技术指标数据
+    "基本面分析": AnalysisPlan(
+        analysts=("fundamentals",),
+        visualization=False,
+        datasets=("news", "financial", "indicators", "analyst"),
+    ),
+}
+
+
+def get_analysis_plan(analysis_type: str) -> AnalysisPlan:
+    """获取分析类型对应的执行计划，未知类型按综合分析处理"""
+    return ANALYSIS_PLANS.get(analysis_type) or ANALYSIS_PLANS[DEFAULT_ANALYSIS_TYPE]
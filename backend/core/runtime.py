@@ -0,0 +1,370 @@
+import socket
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpcore
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
+
+from utils.metrics import NODE_DURATION
+
+
+class TaskCancelled(Exception):
+    """分析任务已被取消"""
+
+
+class RunContext:
+    """单次工作流运行的上下文：取消信号和节点耗时
+
+    运行期间按 thread_id 登记(见 activate_run_context)，
+    节点之间、LLM调用和工具调用开始前检查取消信号；
+    正在阻塞的网络读写通过 abort_on_cancel 登记中止回调，取消时立即中断
+    """
+
+    def __init__(self, task_id: str, external_check: Optional[Callable[[], bool]] = None, check_interval: float = 1.0):
+        self.task_id = task_id
+        self.started_at = time.time()
+        self.timings: List[Dict[str, Any]] = []
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        # 其他进程发起的取消请求(如共享注册表中的取消标记)，按间隔轮询
+        self._external_check = external_check
+        self._check_interval = check_interval
+        self._last_external_check = 0.0
+        self._abort_callbacks: Dict[int, Callable[[], None]] = {}
+        self._next_abort_id = 0
+
+    @property
+    def cancelled(self) -> bool:
+        if self._cancel_event.is_set():
+            return True
+        if self._external_check is not None:
+            now = time.monotonic()
+            if now - self._last_external_check >= self._check_interval:
+                self._last_external_check = now
+                try:
+                    if self._external_check():
+                        self.cancel()
+                except Exception:
+                    pass
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> None:
+        """设置取消信号并调用所有已登记的中止回调"""
+        self._cancel_event.set()
+        with self._lock:
+            callbacks = list(self._abort_callbacks.values())
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    @contextmanager
+    def abort_on_cancel(self, callback: Callable[[], None]):
+        """在代码块执行期间登记中止回调(如关闭正在读取的套接字)，已取消时直接抛出 TaskCancelled"""
+        with self._lock:
+            abort_id = self._next_abort_id
+            self._next_abort_id += 1
+            self._abort_callbacks[abort_id] = callback
+        try:
+            # 先登记再检查，避免检查之后、登记之前发生的取消被遗漏
+            self.check()
+            yield
+        finally:
+            with self._lock:
+                self._abort_callbacks.pop(abort_id, None)
+
+    def check(self) -> None:
+        """已取消时抛出 TaskCancelled"""
+        if self.cancelled:
+            raise TaskCancelled(f"任务 {self.task_id} 已取消")
+
+    def record(self, node: str, started_at: float, finished_at: float, status: str, branch: Optional[str] = None) -> None:
+        item = {
+            "node": node,
+            "started_at": round(started_at - self.started_at, 3),
+            "duration": round(finished_at - started_at, 3),
+            "status": status,
+        }
+        if branch:
+            item["branch"] = branch
+        with self._lock:
+            self.timings.append(item)
+
+    def timing_summary(self) -> Dict[str, Any]:
+        """按节点汇总耗时(并行分支累加)，取消时只包含已执行的部分"""
+        with self._lock:
+            timings = list(self.timings)
+        nodes: Dict[str, float] = {}
+        for item in timings:
+            nodes[item["node"]] = round(nodes.get(item["node"], 0.0) + item["duration"], 3)
+        return {
+            "total": round(time.time() - self.started_at, 3),
+            "nodes": nodes,
+            "steps": timings,
+        }
+
+
+# 正在运行的工作流: thread_id -> RunContext
+# 运行上下文不放入 config["configurable"]，避免被写入检查点元数据
+_active_runs: Dict[str, RunContext] = {}
+_active_runs_lock = threading.Lock()
+
+# 当前节点所属的运行上下文，供不经过 config 的底层代码(如共享HTTP客户端)登记中止回调
+_current_run: ContextVar[Optional[RunContext]] = ContextVar("current_run", default=None)
+
+
+def current_run_context() -> Optional[RunContext]:
+    return _current_run.get()
+
+
+@contextmanager
+def activate_run_context(thread_id: str, run_context: RunContext):
+    """在工作流运行期间登记运行上下文，节点通过 config 中的 thread_id 查找"""
+    with _active_runs_lock:
+        _active_runs[thread_id] = run_context
+    try:
+        yield run_context
+    finally:
+        with _active_runs_lock:
+            _active_runs.pop(thread_id, None)
+
+
+def get_run_context(config: Optional[RunnableConfig]) -> Optional[RunContext]:
+    if not config:
+        return None
+    thread_id = (config.get("configurable") or {}).get("thread_id")
+    if thread_id is None:
+        return None
+    with _active_runs_lock:
+        return _active_runs.get(thread_id)
+
+
+def cancellable_node(name: str, fn: Callable) -> Callable:
+    """包装工作流节点：执行前检查取消信号，并记录节点耗时指标
+
+    每次运行的节点时间线由 NodeEventTracker 根据流式事件记录
+    """
+
+    @wraps(fn)
+    def wrapper(state, config: RunnableConfig = None):
+        run_context = get_run_context(config)
+        if run_context is not None:
+            run_context.check()
+        token = _current_run.set(run_context)
+        started_at = time.time()
+        status = "failed"
+        try:
+            result = fn(state)
+            status = "completed"
+            return result
+        except TaskCancelled:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            # 取消时被中断的HTTP请求以连接错误的形式抛出，统一按取消处理
+            if run_context is not None and run_context.cancelled:
+                status = "cancelled"
+                raise TaskCancelled(f"任务 {run_context.task_id} 已取消") from e
+            raise
+        finally:
+            _current_run.reset(token)
+            NODE_DURATION.observe(time.time() - started_at, node=name, status=status)
+
+    return wrapper
+
+
+# 节点开始时的进度(0-1)、提示信息和阶段
+NODE_PROGRESS: Dict[str, Tuple[float, str, str]] = {
+    "company_info": (0.05, "获取公司基本信息...", "数据收集"),
+    "data_acquisition": (0.15, "正在获取市场数据...", "数据收集"),
+    "visualization": (0.3, "正在生成可视化图表...", "数据分析"),
+    "collect_viz": (0.5, "处理可视化结果...", "数据分析"),
+    "fundamentals": (0.55, "分析基本面数据...", "深度分析"),
+    "technical": (0.55, "分析技术面数据...", "深度分析"),
+    "sentiment": (0.55, "分析市场情绪数据...", "深度分析"),
+    "wait": (0.85, "等待分析结果...", "深度分析"),
+    "adversarial": (0.9, "综合最终分析结果...", "结果整理"),
+}
+
+# 并行执行的节点：进度按已完成的分支数在区间内推进
+PARALLEL_PROGRESS: Dict[str, Tuple[float, float]] = {
+    "visualization": (0.3, 0.5),
+    "fundamentals": (0.55, 0.85),
+    "technical": (0.55, 0.85),
+    "sentiment": (0.55, 0.85),
+}
+ANALYST_NODES = ("fundamentals", "technical", "sentiment")
+
+
+class NodeEventTracker:
+    """把 stream_mode="debug" 的任务事件转换为带时间的节点开始/结束事件
+
+    每个 Send 分支(如各个 visualization 数据文件)是独立的任务，分别计时。
+    事件写入 RunContext 的耗时记录，并通过 progress_callback(stage, progress, message, event) 通知调用方
+    """
+
+    def __init__(self, run_context: RunContext, progress_callback: Optional[Callable] = None):
+        self.run_context = run_context
+        self.progress_callback = progress_callback
+        self.progress = 0.0
+        self._running: Dict[str, Tuple[str, Optional[str], float]] = {}
+        self._started: Dict[str, int] = {}
+        self._finished: Dict[str, int] = {}
+
+    @staticmethod
+    def _branch(node: str, node_input: Any) -> Optional[str]:
+        if isinstance(node_input, dict) and node_input.get("file_type"):
+            return str(node_input["file_type"])
+        return None
+
+    def handle(self, event: Dict[str, Any]) -> None:
+        payload = event.get("payload") or {}
+        task_id, node = payload.get("id"), payload.get("name")
+        if not task_id or node not in NODE_PROGRESS:
+            return
+        if event.get("type") == "task":
+            self._on_start(task_id, node, self._branch(node, payload.get("input")))
+        elif event.get("type") == "task_result":
+            self._on_finish(task_id, "failed" if payload.get("error") else "completed")
+
+    def close(self, status: str) -> None:
+        """运行中断时，把仍在执行的节点按给定状态记录"""
+        now = time.time()
+        for task_id in list(self._running):
+            node, branch, started_at = self._running.pop(task_id)
+            self.run_context.record(node, started_at, now, status, branch)
+
+    def active(self) -> List[str]:
+        return [f"{node}:{branch}" if branch else node for node, branch, _ in self._running.values()]
+
+    def _on_start(self, task_id: str, node: str, branch: Optional[str]) -> None:
+        now = time.time()
+        self._running[task_id] = (node, branch, now)
+        self._started[node] = self._started.get(node, 0) + 1
+        progress, message, stage = NODE_PROGRESS[node]
+        if branch:
+            message = f"{message.rstrip('.')} ({branch})"
+        self._emit(stage, progress, message, {
+            "node": node, "branch": branch, "phase": "start",
+            "at": round(now - self.run_context.started_at, 3),
+        })
+
+    def _on_finish(self, task_id: str, status: str) -> None:
+        entry = self._running.pop(task_id, None)
+        if entry is None:
+            return
+        node, branch, started_at = entry
+        now = time.time()
+        duration = now - started_at
+        self.run_context.record(node, started_at, now, status, branch)
+        self._finished[node] = self._finished.get(node, 0) + 1
+
+        progress, _, stage = NODE_PROGRESS[node]
+        if node in PARALLEL_PROGRESS:
+            low, high = PARALLEL_PROGRESS[node]
+            if node in ANALYST_NODES:
+                # 按分析类型裁剪后运行的分析师数量不同
+                done = sum(self._finished.get(n, 0) for n in ANALYST_NODES)
+                total = max(sum(self._started.get(n, 0) for n in ANALYST_NODES), 1)
+            else:
+                done, total = self._finished[node], max(self._started[node], 1)
+            progress = low + (high - low) * min(done / total, 1.0)
+        elif node == "adversarial":
+            progress = 1.0
+        label = f"{node}:{branch}" if branch else node
+        self._emit(stage, progress, f"{label} 完成，耗时 {duration:.1f}s", {
+            "node": node, "branch": branch, "phase": "finish", "status": status,
+            "at": round(now - self.run_context.started_at, 3), "duration": round(duration, 3),
+        })
+
+    def _emit(self, stage: str, progress: float, message: str, event: Dict[str, Any]) -> None:
+        # 并行分支的完成顺序不确定，进度只增不减
+        self.progress = max(self.progress, progress)
+        event["active"] = self.active()
+        if self.progress_callback is not None:
+            self.progress_callback(stage, self.progress, message, event)
+
+
+class CancellationCallbackHandler(BaseCallbackHandler):
+    """在LLM和工具调用开始前检查取消信号，流式输出时逐个token检查
+
+    raise_error=True 使异常从回调传播出去，中止当前的智能体循环
+    """
+
+    raise_error = True
+
+    def __init__(self, run_context: RunContext):
+        self.run_context = run_context
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        self.run_context.check()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.run_context.check()
+
+    def on_llm_new_token(self, token, **kwargs) -> None:
+        self.run_context.check()
+
+    def on_tool_start(self, serialized, input_str, **kwargs) -> None:
+        self.run_context.check()
+
+
+class _CancellableStream(httpcore.NetworkStream):
+    """网络连接包装：读写期间向当前运行上下文登记中止回调
+
+    任务取消时关闭套接字，阻塞在等待响应的请求立即以连接错误失败，不必等到LLM返回
+    """
+
+    def __init__(self, stream: httpcore.NetworkStream):
+        self._stream = stream
+
+    def _abort(self) -> None:
+        sock = self._stream.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _guard(self):
+        run_context = current_run_context()
+        return run_context.abort_on_cancel(self._abort) if run_context is not None else nullcontext()
+
+    def read(self, max_bytes: int, timeout: Optional[float] = None) -> bytes:
+        with self._guard():
+            return self._stream.read(max_bytes, timeout)
+
+    def write(self, buffer: bytes, timeout: Optional[float] = None) -> None:
+        with self._guard():
+            self._stream.write(buffer, timeout)
+
+    def close(self) -> None:
+        self._stream.close()
+
+    def start_tls(self, ssl_context, server_hostname: Optional[str] = None, timeout: Optional[float] = None) -> "_CancellableStream":
+        return _CancellableStream(self._stream.start_tls(ssl_context, server_hostname, timeout))
+
+    def get_extra_info(self, info: str) -> Any:
+        return self._stream.get_extra_info(info)
+
+
+class CancellableNetworkBackend(httpcore.NetworkBackend):
+    """httpcore 网络后端包装，新建的连接都可以被所属任务的取消信号中断"""
+
+    def __init__(self, backend: Optional[httpcore.NetworkBackend] = None):
+        self._backend = backend or httpcore.SyncBackend()
+
+    def connect_tcp(self, *args, **kwargs) -> httpcore.NetworkStream:
+        return _CancellableStream(self._backend.connect_tcp(*args, **kwargs))
+
+    def connect_unix_socket(self, *args, **kwargs) -> httpcore.NetworkStream:
+        return _CancellableStream(self._backend.connect_unix_socket(*args, **kwargs))
+
+    def sleep(self, seconds: float) -> None:
+        self._backend.sleep(seconds)
@@ -57,6 +57,7 @@ class StockAnalysisState(BaseModel):
     
     # 工作流控制
     current_step: str = Field(default="init", description="当前执行步骤")
+    analysis_type: str = Field(default="综合分析", description="分析类型，决定运行的节点和获取的数据")
     completed_steps: List[str] = Field(default_factory=list, description="已完成步骤")
     messages: List[Any] = Field(default_factory=list, description="消息历史")
     
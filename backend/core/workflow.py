@@ -1,84 +1,160 @@
-from langgraph.graph import StateGraph, END
-from typing import Dict, Any
-from langchain_core.messages import HumanMessage
+import uuid
+import logging
+import threading
+from typing import Dict, Any, TYPE_CHECKING
 
-from core.state import StockAnalysisState
-from node.start_node import process_company_node
-from node.data_acquire_node import data_acquire_node
-from node.graph_node_new import process_visualization_node
-from node.sentiment_node import sentiment_node
-from node.technical_node import technical_node
-from node.fundamentals_node import fundamentals_node
-from node.adversarial_node import adversarial_node
+# 节点、智能体和工具依赖 akshare、talib、matplotlib 等重量级库，
+# 在首次构建工作流时才导入，导入本模块本身几乎没有开销
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+    from core.state import StockAnalysisState
 
-from core.route import continue_to_graph
+logger = logging.getLogger(__name__)
 
 # 创建一个汇集节点，用于在visualization完成后启动并行分析
-def start_parallel_analysis(state: StockAnalysisState):
-    """Send tasks to parallel analysis nodes"""
+def start_parallel_analysis(state: "StockAnalysisState"):
+    """Send tasks to parallel analysis nodes，只启动当前分析类型需要的分析师"""
     from langgraph.types import Send
-    return [
-        Send("fundamentals", state),
-        Send("technical", state),
-        Send("sentiment", state)
-    ]
+    from core.plans import get_analysis_plan
+    return [Send(analyst, state) for analyst in get_analysis_plan(state.analysis_type).analysts]
 
-def check_parallel_completion(state: StockAnalysisState):
+def check_parallel_completion(state: "StockAnalysisState"):
     """Check if all parallel nodes have completed"""
-    # 检查所有分析报告是否已生成
-    if (state.report_state.text_reports.get("fundamentals_report") and 
-        state.report_state.text_reports.get("technical_report") and 
-        state.report_state.text_reports.get("sentiment_report")):
-        # 添加一个标记来确保只触发一次
+    from core.plans import get_analysis_plan
+    # 检查当前分析类型的所有分析报告是否已生成
+    analysts = get_analysis_plan(state.analysis_type).analysts
+    if all(state.report_state.text_reports.get(f"{analyst}_report") for analyst in analysts):
         return "adversarial"
     # 如果还有报告未完成，保持等待
     return "wait"
 
-def create_stock_analysis_workflow() -> StateGraph:
+def memoize_nodes(fundamentals, technical, sentiment, adversarial):
+    """按各节点实际依赖的状态切片计算指纹，返回包装后的节点函数
+
+    - fundamentals: 财务数据、交易指标、新闻和当天日期(会实时搜索网络)
+    - technical: 技术指标数据和当天日期(提示词包含当天的分析截止日期)
+    - sentiment: 新闻数据和当天日期(会实时搜索网络)
+    - adversarial: 三份分析报告
+    提示词也计入指纹，修改提示词后自动重新生成。
+    可视化分支不在这里缓存，图表运行目录按数据文件内容寻址，由节点自己复用
+    """
+    from core.memo import get_node_memo, memo_date, report_memo
+    from helpers.prompt import fundamentals_prompt, technical_prompt, sentiment_prompt, adversarial_prompt
+    
+    memo = get_node_memo()
+    if memo is None:
+        return fundamentals, technical, sentiment, adversarial
+    
+    def stock_identity(state):
+        return (state.basic_info.stock_code, state.basic_info.stock_name, state.basic_info.industry)
+    
+    fundamentals = memo.wrap(
+        "fundamentals", fundamentals,
+        lambda state: (fundamentals_prompt, memo_date(), stock_identity(state), state.financial_data.financial_data,
+                       state.financial_data.indicator_data, state.research_data.news_data),
+        *report_memo("fundamentals_report")
+    )
+    technical = memo.wrap(
+        "technical", technical,
+        lambda state: (technical_prompt, memo_date(), stock_identity(state), state.market_data.technical_data),
+        *report_memo("technical_report")
+    )
+    sentiment = memo.wrap(
+        "sentiment", sentiment,
+        lambda state: (sentiment_prompt, memo_date(), stock_identity(state), state.research_data.news_data),
+        *report_memo("sentiment_report")
+    )
+    adversarial = memo.wrap(
+        "adversarial", adversarial,
+        lambda state: (adversarial_prompt,) + tuple(
+            state.report_state.text_reports.get(key) for key in ("fundamentals_report", "technical_report", "sentiment_report")
+        ),
+        *report_memo("adversarial_report")
+    )
+    return fundamentals, technical, sentiment, adversarial
+
+def create_stock_analysis_workflow(checkpointer=None, analysis_type: str = "综合分析") -> "StateGraph":
     """
     Create a workflow for stock analysis that connects different processing nodes
     
+    按分析类型裁剪图：只添加该类型需要的分析师节点，不需要图表时跳过可视化节点
+    
+    Args:
+        checkpointer: 可选的检查点存储，按 thread_id 保存每个节点完成后的状态
+        analysis_type: 分析类型，见 core.plans.ANALYSIS_PLANS
+    
     Returns:
         StateGraph: Compiled workflow graph
     """
+    from langgraph.graph import StateGraph, END
+    from core.state import StockAnalysisState
+    from core.route import continue_to_graph
+    from node.start_node import process_company_node
+    from node.data_acquire_node import data_acquire_node
+    from node.graph_node_new import process_visualization_node
+    from node.sentiment_node import sentiment_node
+    from node.technical_node import technical_node
+    from node.fundamentals_node import fundamentals_node
+    from node.adversarial_node import adversarial_node
+    from core.runtime import cancellable_node
+    from core.plans import get_analysis_plan
+    
+    plan = get_analysis_plan(analysis_type)
+    
     # Initialize the graph with our state type
     workflow = StateGraph(StockAnalysisState)
     
+    # 输入指纹未变化的分析节点直接复用已保存的输出
+    fundamentals_node, technical_node, sentiment_node, adversarial_node = memoize_nodes(
+        fundamentals_node, technical_node, sentiment_node, adversarial_node
+    )
+    
+    analyst_nodes = {
+        "fundamentals": fundamentals_node,
+        "technical": technical_node,
+        "sentiment": sentiment_node,
+    }
+    
     # Add nodes to the graph
-    workflow.add_node("company_info", process_company_node)
-    workflow.add_node("data_acquisition", data_acquire_node)
-    workflow.add_node("visualization", process_visualization_node)
-    workflow.add_node("collect_viz", lambda x: None)  # 汇集所有visualization结果的节点
-    workflow.add_node("fundamentals", fundamentals_node)
-    workflow.add_node("technical", technical_node)
-    workflow.add_node("sentiment", sentiment_node)
-    workflow.add_node("adversarial", adversarial_node)
-    workflow.add_node("wait", lambda x: None)  # 空节点，用于等待并行任务完成
+    # 每个节点执行前检查取消信号并记录耗时
+    workflow.add_node("company_info", cancellable_node("company_info", process_company_node))
+    workflow.add_node("data_acquisition", cancellable_node("data_acquisition", data_acquire_node))
+    if plan.visualization:
+        workflow.add_node("visualization", cancellable_node("visualization", process_visualization_node))
+        workflow.add_node("collect_viz", cancellable_node("collect_viz", lambda x: None))  # 汇集所有visualization结果的节点
+    for analyst in plan.analysts:
+        workflow.add_node(analyst, cancellable_node(analyst, analyst_nodes[analyst]))
+    workflow.add_node("adversarial", cancellable_node("adversarial", adversarial_node))
+    workflow.add_node("wait", cancellable_node("wait", lambda x: None))  # 空节点，用于等待并行任务完成
     
     # Set the entry point
     workflow.set_entry_point("company_info")
     
     # Define edges between nodes
     workflow.add_edge("company_info", "data_acquisition")
-    workflow.add_conditional_edges("data_acquisition", continue_to_graph)
-    
-    # 所有visualization节点连接到汇集节点
-    workflow.add_edge("visualization", "collect_viz")
-    
-    # 从汇集节点开始并行分析
-    workflow.add_conditional_edges(
-        "collect_viz",
-        start_parallel_analysis
-    )
-    
- 
+    if plan.visualization:
+        workflow.add_conditional_edges("data_acquisition", continue_to_graph)
+        
+        # 所有visualization节点连接到汇集节点
+        workflow.add_edge("visualization", "collect_viz")
+        
+        # 从汇集节点开始并行分析
+        workflow.add_conditional_edges(
+            "collect_viz",
+            start_parallel_analysis
+        )
+    else:
+        # 不生成图表时数据获取完成后直接开始分析
+        workflow.add_conditional_edges(
+            "data_acquisition",
+            start_parallel_analysis
+        )
     
     # 所有并行节点都连接到wait节点
-    workflow.add_edge("fundamentals", "wait")
-    workflow.add_edge("technical", "wait")
-    workflow.add_edge("sentiment", "wait")
+    for analyst in plan.analysts:
+        workflow.add_edge(analyst, "wait")
     
-       # 修改汇合节点检查的边缘定义
+    # 修改汇合节点检查的边缘定义
     workflow.add_conditional_edges(
         "wait",
         check_parallel_completion,
@@ -91,86 +167,117 @@ def create_stock_analysis_workflow() -> StateGraph:
     workflow.add_edge("adversarial", END)
     
     # Compile the graph
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
+
+# 分析类型 -> 已编译的工作流
+_compiled_workflows: Dict[str, Any] = {}
+_compile_lock = threading.Lock()
 
-def run_stock_analysis(company_name: str, recursion_limit: int = 50, progress_callback=None) -> Dict[str, Any]:
+def get_compiled_workflow(analysis_type: str = "综合分析"):
+    """进程内共享的已编译工作流，每种分析类型首次调用时编译
+
+    运行状态按 thread_id 保存在检查点中，多个任务可以并发调用同一个实例
+    """
+    from core.plans import ANALYSIS_PLANS, DEFAULT_ANALYSIS_TYPE
+    if analysis_type not in ANALYSIS_PLANS:
+        analysis_type = DEFAULT_ANALYSIS_TYPE
+    workflow = _compiled_workflows.get(analysis_type)
+    if workflow is None:
+        with _compile_lock:
+            workflow = _compiled_workflows.get(analysis_type)
+            if workflow is None:
+                from core.checkpoint import get_checkpointer
+                workflow = create_stock_analysis_workflow(checkpointer=get_checkpointer(), analysis_type=analysis_type)
+                _compiled_workflows[analysis_type] = workflow
+    return workflow
+
+def run_stock_analysis(company_name: str, recursion_limit: int = 50, progress_callback=None, run_context=None, thread_id: str = None, resume: bool = True, analysis_type: str = "综合分析") -> Dict[str, Any]:
     """
     Run the stock analysis workflow
     
+    以流式模式执行工作流，每个节点(包括各 visualization 分支和三个分析师节点)开始和结束时
+    调用 progress_callback(stage, progress, message, event)，event 中包含节点名、分支、阶段和耗时
+    
+    启用检查点时每个节点完成后按 thread_id 保存状态。同一 thread_id 存在未完成的运行时，
+    从最后完成的节点继续，已完成的报告和图表直接复用；运行成功后删除检查点
+    
     Args:
         company_name (str): Name of the company to analyze (e.g., "新炬网络")
         recursion_limit (int): 递归限制，用于处理复杂分析，默认为50
         progress_callback: 可选的进度回调函数，用于报告分析进度
+        run_context: 可选的 core.runtime.RunContext，用于取消运行和记录节点耗时
+        thread_id: 检查点的线程ID，默认使用 run_context 的任务ID
+        resume: 存在未完成的检查点时是否继续运行，False 时丢弃旧检查点重新开始
+        analysis_type: 分析类型，决定运行哪些节点和获取哪些数据
         
     Returns:
-        Dict[str, Any]: Final state after workflow completion
+        Dict[str, Any]: Final state after workflow completion，"timings" 为本次运行的节点耗时
     """
-    # Initialize state with company name
-    state = StockAnalysisState()
-    state.messages.append(HumanMessage(content=company_name))
-    
-    # Create and run workflow
-    workflow = create_stock_analysis_workflow()
-    
-    # 如果提供了进度回调函数，创建一个运行监控器
-    if progress_callback:
-        def node_observer(event_data):
-            # 根据当前节点和状态更新进度
-            node_name = event_data.get("node_name", "")
-            progress_value = 0
-            message = f"正在执行 {node_name} 节点..."
-            stage = "数据分析"
-            
-            if node_name == "company_info":
-                progress_value = 0.1
-                message = "获取公司基本信息..."
-                stage = "数据收集"
-            elif node_name == "data_acquisition":
-                progress_value = 0.2
-                message = "正在获取市场数据..."
-                stage = "数据收集"
-            elif node_name == "visualization":
-                progress_value = 0.4
-                message = "正在生成可视化图表..."
-                stage = "数据分析"
-            elif node_name == "collect_viz":
-                progress_value = 0.5
-                message = "处理可视化结果..."
-                stage = "数据分析"
-            elif node_name == "fundamentals":
-                progress_value = 0.6
-                message = "分析基本面数据..."
-                stage = "深度分析"
-            elif node_name == "technical":
-                progress_value = 0.7
-                message = "分析技术面数据..."
-                stage = "深度分析"
-            elif node_name == "sentiment":
-                progress_value = 0.8
-                message = "分析市场情绪数据..."
-                stage = "深度分析"
-            elif node_name == "wait":
-                progress_value = 0.85
-                message = "等待分析结果..."
-                stage = "深度分析"
-            elif node_name == "adversarial":
-                progress_value = 0.9
-                message = "综合最终分析结果..."
-                stage = "结果整理"
-                
-            # 调用回调函数
-            progress_callback(stage, progress_value, message)
-        
-        # 添加观察者
-        # workflow.add_observer(node_observer)  # 如果LangGraph支持观察者模式，取消注释此行
+    from langchain_core.messages import HumanMessage
+    from core.state import StockAnalysisState
+    from core.runtime import RunContext, NodeEventTracker, TaskCancelled, activate_run_context
+    from core.checkpoint import clear_thread
+    
+    # 复用该分析类型已编译的工作流
+    workflow = get_compiled_workflow(analysis_type)
+    
+    owns_context = run_context is None
+    if owns_context:
+        run_context = RunContext(company_name)
+    thread_id = thread_id or (str(uuid.uuid4()) if owns_context else run_context.task_id)
+    tracker = NodeEventTracker(run_context, progress_callback)
     
     # 创建配置字典
-    config_dict = {}
+    config_dict = {"configurable": {"thread_id": thread_id}}
     if recursion_limit > 0:
         config_dict["recursion_limit"] = recursion_limit
-        
-    # 只有在有配置时才传递配置
-    if config_dict:
-        return workflow.invoke(state, config=config_dict)
+    if not owns_context:
+        from core.runtime import CancellationCallbackHandler
+        config_dict["callbacks"] = [CancellationCallbackHandler(run_context)]
+    
+    # 有未完成的检查点时从中断处继续(输入为None)，否则丢弃旧检查点并从初始状态开始
+    graph_input = None
+    resumed_from = []
+    if workflow.checkpointer is not None and resume:
+        resumed_from = list(workflow.get_state(config_dict).next)
+    if resumed_from:
+        logger.info(f"从检查点继续运行 {thread_id}，待执行节点: {resumed_from}")
     else:
-        return workflow.invoke(state)
+        clear_thread(workflow.checkpointer, thread_id)
+        graph_input = StockAnalysisState(analysis_type=analysis_type)
+        graph_input.messages.append(HumanMessage(content=company_name))
+    
+    # debug 事件提供每个任务的开始和结果，values 事件的最后一个即最终状态
+    final_state = None
+    with activate_run_context(thread_id, run_context):
+        try:
+            for mode, chunk in workflow.stream(graph_input, config=config_dict, stream_mode=["debug", "values"]):
+                if mode == "debug":
+                    tracker.handle(chunk)
+                else:
+                    final_state = chunk
+        except TaskCancelled:
+            tracker.close("cancelled")
+            raise
+        except BaseException:
+            tracker.close("failed")
+            raise
+    
+    # 运行成功后不再需要检查点
+    clear_thread(workflow.checkpointer, thread_id)
+    timings = run_context.timing_summary()
+    if resumed_from:
+        timings["resumed_from"] = resumed_from
+    final_state["timings"] = timings
+    return final_state
+
+def __getattr__(name: str):
+    """langgraph.json 引用的 graph 在首次访问时才构建
+
+    LangGraph 服务自行管理检查点，这里编译不带检查点存储的图
+    """
+    if name == "graph":
+        graph = create_stock_analysis_workflow()
+        globals()["graph"] = graph
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -210,6 +210,16 @@ def download_sector_data(connection):
     except Exception as e:
         logger.error(f"下载行业数据时出错: {e}")
 
+def touch_stock_index_marker():
+    """更新股票搜索索引的标记文件，API服务检测到后重新加载索引"""
+    marker = os.path.join(project_root, os.getenv("STOCK_INDEX_MARKER", "database/cache/company_info.updated"))
+    try:
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, "w") as f:
+            f.write(datetime.now().isoformat())
+    except OSError as e:
+        logger.error(f"更新股票索引标记文件时出错: {e}")
+
 def download_company_info(connection, symbols=None):
     """下载公司信息并存储到数据库"""
     logger.info("开始下载公司信息...")
@@ -217,6 +227,7 @@ def download_company_info(connection, symbols=None):
         company_data = invoke_tool(company_info_tools, "get_company_info", symbols=symbols)
         if isinstance(company_data, pd.DataFrame) and not company_data.empty:
             dataframe_to_sql(connection, company_data, 'company_info')
+            touch_stock_index_marker()
             logger.info("公司信息下载完成")
         else:
             logger.warning("没有获取到公司信息数据")
@@ -0,0 +1,263 @@
+import os
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+logger = logging.getLogger(__name__)
+
+# 模板或样式变化时递增，使缓存的图表失效
+CHART_TEMPLATE_VERSION = "1"
+
+MA_WINDOWS = (5, 20, 60)
+RSI_PERIOD = 14
+BOLLINGER_WINDOW = 20
+FIGSIZE = (12, 6)
+DPI = 100
+
+# 深色主题，颜色对色觉障碍友好
+THEME = {
+    "background": "#0f1116",
+    "panel": "#161a22",
+    "grid": "#2a2f3a",
+    "text": "#d0d4dc",
+    "price": "#e6e6e6",
+    "up": "#ef5350",  # A股红涨绿跌
+    "down": "#26a69a",
+    "lines": ("#4fc3f7", "#ffb74d", "#ba68c8", "#81c784"),
+    "band": "#4fc3f7",
+}
+
+# 相关性矩阵使用的列
+CORRELATION_COLUMNS = ("close", "volume", "ma5", "ma20", "ma60", "rsi", "macd", "signal_line", "macd_hist")
+
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """统一列名为小写，按日期升序排列并以日期为索引
+
+    trade_data 和 technical_data 的列名大小写不同(Date/date、Close/close)，
+    CSV 中保存的旧索引列(Unnamed: 0)直接丢弃
+    """
+    frame = df.loc[:, [column for column in df.columns if not str(column).startswith("Unnamed")]].copy()
+    frame.columns = [str(column).strip().lower() for column in frame.columns]
+    if "date" not in frame.columns or "close" not in frame.columns:
+        raise ValueError("数据缺少 date 或 close 列，无法绘制图表")
+    frame["date"] = pd.to_datetime(frame["date"], errors="coerce")
+    frame = frame.dropna(subset=["date"]).drop_duplicates("date").sort_values("date").set_index("date")
+    for column in frame.columns:
+        if frame[column].dtype == object:
+            converted = pd.to_numeric(frame[column], errors="coerce")
+            if converted.notna().any():
+                frame[column] = converted
+    return frame
+
+
+def add_indicators(frame: pd.DataFrame) -> pd.DataFrame:
+    """补齐均线、RSI、MACD和布林带，数据中已有的指标直接使用"""
+    close = frame["close"].astype("float64")
+    for window in MA_WINDOWS:
+        if f"ma{window}" not in frame:
+            frame[f"ma{window}"] = close.rolling(window).mean()
+    if "rsi" not in frame:
+        delta = close.diff()
+        gain = delta.clip(lower=0).ewm(alpha=1 / RSI_PERIOD, adjust=False, min_periods=RSI_PERIOD).mean()
+        loss = (-delta.clip(upper=0)).ewm(alpha=1 / RSI_PERIOD, adjust=False, min_periods=RSI_PERIOD).mean()
+        frame["rsi"] = 100 - 100 / (1 + gain / loss.replace(0, np.nan))
+    if "macd" not in frame or "signal_line" not in frame:
+        frame["macd"] = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        frame["signal_line"] = frame["macd"].ewm(span=9, adjust=False).mean()
+    if "macd_hist" not in frame:
+        frame["macd_hist"] = frame["macd"] - frame["signal_line"]
+    if not {"bb_upper", "bb_middle", "bb_lower"} <= set(frame.columns):
+        middle = close.rolling(BOLLINGER_WINDOW).mean()
+        std = close.rolling(BOLLINGER_WINDOW).std()
+        frame["bb_middle"] = middle
+        frame["bb_upper"] = middle + 2 * std
+        frame["bb_lower"] = middle - 2 * std
+    return frame
+
+
+def build_chart_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """绘图和生成描述使用的数据：统一格式并补齐指标"""
+    return add_indicators(prepare_frame(df))
+
+
+def _figure(rows: int = 1, height_ratios: Tuple[int, ...] = None) -> Tuple[Figure, List[Any]]:
+    """创建独立的 Figure(不经过 pyplot 全局状态)并设置深色样式"""
+    fig = Figure(figsize=FIGSIZE, dpi=DPI, facecolor=THEME["background"])
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(rows, 1, sharex=True, squeeze=False,
+                        gridspec_kw={"height_ratios": height_ratios} if height_ratios else None)[:, 0]
+    for ax in axes:
+        ax.set_facecolor(THEME["panel"])
+        ax.grid(True, color=THEME["grid"], linewidth=0.6)
+        ax.tick_params(colors=THEME["text"], labelsize=9)
+        for side, spine in ax.spines.items():
+            spine.set_visible(side in ("left", "bottom"))
+            spine.set_color(THEME["grid"])
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    return fig, list(axes)
+
+
+def _title(ax, file_type: str, title: str) -> None:
+    ax.set_title(f"{file_type}:{title}", color=THEME["text"], fontsize=12, loc="left")
+
+
+def _legend(ax) -> None:
+    legend = ax.legend(loc="upper left", fontsize=8, frameon=False)
+    for text in legend.get_texts():
+        text.set_color(THEME["text"])
+
+
+def _updown_colors(frame: pd.DataFrame) -> np.ndarray:
+    reference = frame["open"] if "open" in frame else frame["close"].shift(1)
+    return np.where(frame["close"].to_numpy() >= reference.to_numpy(), THEME["up"], THEME["down"])
+
+
+def draw_price_ma_volume(frame: pd.DataFrame, file_type: str) -> Figure:
+    has_volume = "volume" in frame
+    fig, axes = _figure(2, (3, 1)) if has_volume else _figure()
+    price_ax = axes[0]
+    price_ax.plot(frame.index, frame["close"], color=THEME["price"], linewidth=1.4, label="Close")
+    for color, window in zip(THEME["lines"], MA_WINDOWS):
+        price_ax.plot(frame.index, frame[f"ma{window}"], color=color, linewidth=1, label=f"MA{window}")
+    _title(price_ax, file_type, "Price with Moving Averages and Volume")
+    _legend(price_ax)
+    if has_volume:
+        axes[1].bar(frame.index, frame["volume"], color=_updown_colors(frame), width=0.8)
+        axes[1].set_ylabel("Volume", color=THEME["text"], fontsize=9)
+    return fig
+
+
+def draw_rsi(frame: pd.DataFrame, file_type: str) -> Figure:
+    fig, (ax,) = _figure()
+    ax.plot(frame.index, frame["rsi"], color=THEME["lines"][0], linewidth=1.2, label=f"RSI({RSI_PERIOD})")
+    ax.axhline(70, color=THEME["up"], linestyle="--", linewidth=0.8)
+    ax.axhline(30, color=THEME["down"], linestyle="--", linewidth=0.8)
+    ax.fill_between(frame.index, 70, frame["rsi"], where=frame["rsi"] >= 70, color=THEME["up"], alpha=0.25)
+    ax.fill_between(frame.index, 30, frame["rsi"], where=frame["rsi"] <= 30, color=THEME["down"], alpha=0.25)
+    ax.set_ylim(0, 100)
+    _title(ax, file_type, "Relative Strength Index")
+    _legend(ax)
+    return fig
+
+
+def draw_macd(frame: pd.DataFrame, file_type: str) -> Figure:
+    fig, (ax,) = _figure()
+    hist = frame["macd_hist"]
+    ax.bar(frame.index, hist, color=np.where(hist.to_numpy() >= 0, THEME["up"], THEME["down"]), width=0.8, alpha=0.6, label="Histogram")
+    ax.plot(frame.index, frame["macd"], color=THEME["lines"][0], linewidth=1.2, label="MACD")
+    ax.plot(frame.index, frame["signal_line"], color=THEME["lines"][1], linewidth=1.2, label="Signal")
+    ax.axhline(0, color=THEME["grid"], linewidth=0.8)
+    _title(ax, file_type, "MACD")
+    _legend(ax)
+    return fig
+
+
+def draw_bollinger(frame: pd.DataFrame, file_type: str) -> Figure:
+    fig, (ax,) = _figure()
+    ax.fill_between(frame.index, frame["bb_lower"], frame["bb_upper"], color=THEME["band"], alpha=0.12)
+    ax.plot(frame.index, frame["bb_upper"], color=THEME["band"], linewidth=0.8, label="Upper")
+    ax.plot(frame.index, frame["bb_middle"], color=THEME["lines"][1], linewidth=0.8, label="Middle")
+    ax.plot(frame.index, frame["bb_lower"], color=THEME["band"], linewidth=0.8, label="Lower")
+    ax.plot(frame.index, frame["close"], color=THEME["price"], linewidth=1.2, label="Close")
+    _title(ax, file_type, "Bollinger Bands")
+    _legend(ax)
+    return fig
+
+
+def draw_correlation(frame: pd.DataFrame, file_type: str) -> Figure:
+    columns = [column for column in CORRELATION_COLUMNS if column in frame]
+    corr = frame[columns].astype("float64").corr().to_numpy()
+    fig = Figure(figsize=(8, 7), dpi=DPI, facecolor=THEME["background"])
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    image = ax.imshow(corr, cmap="coolwarm", vmin=-1, vmax=1)
+    ax.set_xticks(range(len(columns)), labels=columns, rotation=45, ha="right", color=THEME["text"], fontsize=9)
+    ax.set_yticks(range(len(columns)), labels=columns, color=THEME["text"], fontsize=9)
+    for i in range(len(columns)):
+        for j in range(len(columns)):
+            if not np.isnan(corr[i, j]):
+                ax.text(j, i, f"{corr[i, j]:.2f}", ha="center", va="center", fontsize=7, color="black")
+    colorbar = fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04)
+    colorbar.ax.tick_params(colors=THEME["text"], labelsize=8)
+    _title(ax, file_type, "Correlation Matrix")
+    return fig
+
+
+# 模板名 -> 绘制函数，模板名即输出文件名的一部分
+CHART_TEMPLATES: Dict[str, Callable[[pd.DataFrame, str], Figure]] = {
+    "price_ma_volume": draw_price_ma_volume,
+    "rsi": draw_rsi,
+    "macd": draw_macd,
+    "bollinger": draw_bollinger,
+    "correlation": draw_correlation,
+}
+
+
+def save_figure(fig: Figure, path: str) -> None:
+    """保存为PNG，去掉版本等元数据使相同数据生成相同的文件"""
+    fig.savefig(path, facecolor=fig.get_facecolor(), bbox_inches="tight", metadata={"Software": None})
+
+
+def render_charts(frame: pd.DataFrame, file_type: str, out_dir: str) -> List[str]:
+    """按固定模板绘制全部图表，文件名为 {file_type}_{模板名}.png
+
+    frame 为 build_chart_frame 的结果。单个模板失败只记录日志，不影响其他图表
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, draw in CHART_TEMPLATES.items():
+        path = os.path.join(out_dir, f"{file_type}_{name}.png")
+        try:
+            save_figure(draw(frame, file_type), path)
+            paths.append(path)
+        except Exception as e:
+            logger.error(f"绘制 {file_type} 的 {name} 图表失败: {str(e)}")
+    return paths
+
+
+def _last(series: pd.Series) -> float:
+    series = series.dropna()
+    return float(series.iloc[-1]) if not series.empty else float("nan")
+
+
+def summarize_frame(frame: pd.DataFrame) -> Dict[str, Any]:
+    """图表对应的关键数值，用于生成图表描述"""
+    close = frame["close"].dropna()
+    above_signal = (frame["macd"] > frame["signal_line"]).dropna()
+    crossings = above_signal.ne(above_signal.shift()).iloc[1:]
+    last_cross = crossings[crossings].index.max() if crossings.any() else None
+    return {
+        "start": frame.index.min().strftime("%Y-%m-%d"),
+        "end": frame.index.max().strftime("%Y-%m-%d"),
+        "close": _last(close),
+        "change_pct": float((close.iloc[-1] / close.iloc[0] - 1) * 100) if len(close) > 1 else 0.0,
+        "ma20": _last(frame["ma20"]),
+        "ma60": _last(frame["ma60"]),
+        "rsi": _last(frame["rsi"]),
+        "macd_above_signal": bool(above_signal.iloc[-1]) if not above_signal.empty else None,
+        "last_macd_cross": last_cross.strftime("%Y-%m-%d") if last_cross is not None else None,
+        "bb_upper": _last(frame["bb_upper"]),
+        "bb_lower": _last(frame["bb_lower"]),
+    }
+
+
+def describe_summary(summary: Dict[str, Any]) -> str:
+    """不调用LLM时的两句话图表描述"""
+    trend = "above" if summary["close"] >= summary["ma20"] else "below"
+    rsi = summary["rsi"]
+    rsi_state = "overbought" if rsi > 70 else "oversold" if rsi < 30 else "neutral"
+    momentum = "bullish" if summary["macd_above_signal"] else "bearish"
+    return (
+        f"From {summary['start']} to {summary['end']} the close moved {summary['change_pct']:+.1f}% to {summary['close']:.2f}, "
+        f"trading {trend} its 20-day average ({summary['ma20']:.2f}). "
+        f"RSI is {rsi:.1f} ({rsi_state}) and MACD is {momentum} relative to its signal line"
+        + (f" since {summary['last_macd_cross']}." if summary["last_macd_cross"] else ".")
+    )
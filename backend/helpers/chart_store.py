@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from config.settings import VIS_KEEP_RUNS, VIS_DISK_QUOTA_MB, VIS_GC_INTERVAL, VIS_GC_REMOVE_LEGACY
+
+logger = logging.getLogger(__name__)
+
+DATA_ROOT = "database/data"
+MANIFEST_NAME = "manifest.json"
+STAGING_MARKER = ".staging-"
+# 超过该时间仍未提交的暂存目录视为中断的渲染
+STAGING_MAX_AGE = 3600
+# 任务结果中的图表地址: /static/data/{stock_code}/visualizations/{file_type}/{run_id}/{name}
+RUN_URL_PATTERN = re.compile(rb'/static/data/([^/"\\]+)/visualizations/([^/"\\]+)/([^/"\\]+)/')
+
+_manifest_lock = threading.Lock()
+
+
+def visualization_root(stock_code: str) -> str:
+    return os.path.join(DATA_ROOT, stock_code, "visualizations")
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_run(run_dir: str) -> Optional[Dict[str, Any]]:
+    """读取运行目录的清单，清单缺失或有文件被删除时返回None"""
+    try:
+        with open(os.path.join(run_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not all(os.path.exists(os.path.join(run_dir, item["name"])) for item in manifest.get("files", [])):
+        return None
+    return manifest
+
+
+def run_paths(run_dir: str, manifest: Dict[str, Any]) -> List[str]:
+    return [os.path.join(run_dir, item["name"]) for item in manifest.get("files", [])]
+
+
+def staging_dir(run_dir: str) -> str:
+    """渲染用的临时目录，提交时整体改名为运行目录"""
+    return f"{run_dir}{STAGING_MARKER}{os.getpid()}-{threading.get_ident()}"
+
+
+def commit_run(staging: str, run_dir: str, run_id: str, file_type: str, description: str) -> Dict[str, Any]:
+    """为暂存目录生成清单并原子地改名为运行目录
+
+    同一输入的运行已被其他任务提交时丢弃本次结果，使用已有的运行
+    """
+    files = []
+    for name in sorted(os.listdir(staging)):
+        path = os.path.join(staging, name)
+        if os.path.isfile(path):
+            files.append({"name": name, "sha256": _sha256(path), "bytes": os.path.getsize(path)})
+    manifest = {
+        "run_id": run_id,
+        "file_type": file_type,
+        "created_at": datetime.now().isoformat(),
+        "description": description,
+        "files": files,
+    }
+    _write_json(os.path.join(staging, MANIFEST_NAME), manifest)
+    try:
+        os.rename(staging, run_dir)
+    except OSError:
+        existing = load_run(run_dir)
+        if existing is None:
+            raise
+        shutil.rmtree(staging, ignore_errors=True)
+        return existing
+    return manifest
+
+
+def touch_run(run_dir: str) -> None:
+    """复用运行目录时更新清单的修改时间，清理时按该时间判断新旧"""
+    try:
+        os.utime(os.path.join(run_dir, MANIFEST_NAME))
+    except OSError:
+        pass
+
+
+def record_latest(stock_code: str, file_type: str, run_dir: str, manifest: Dict[str, Any]) -> None:
+    """更新股票级清单 visualizations/manifest.json 中该数据类型的最新运行"""
+    path = os.path.join(visualization_root(stock_code), MANIFEST_NAME)
+    with _manifest_lock:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                latest = json.load(f)
+        except (OSError, ValueError):
+            latest = {}
+        latest[file_type] = {
+            "run_id": manifest["run_id"],
+            "updated_at": datetime.now().isoformat(),
+            "paths": run_paths(run_dir, manifest),
+        }
+        _write_json(path, latest)
+
+
+def referenced_runs(bodies: Iterable[bytes], data_root: str = DATA_ROOT) -> Set[str]:
+    """从结果模块的JSON字节中找出仍被引用的运行目录"""
+    runs = set()
+    for body in bodies:
+        for stock_code, file_type, run_id in RUN_URL_PATTERN.findall(body):
+            runs.add(os.path.normpath(os.path.join(
+                data_root, stock_code.decode("utf-8"), "visualizations", file_type.decode("utf-8"), run_id.decode("utf-8")
+            )))
+    return runs
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def collect_garbage(data_root: str = DATA_ROOT, keep_runs: int = VIS_KEEP_RUNS,
+                    quota_bytes: int = VIS_DISK_QUOTA_MB * 1024 * 1024, remove_legacy: bool = VIS_GC_REMOVE_LEGACY,
+                    pinned: Optional[Set[str]] = None) -> Dict[str, int]:
+    """清理可视化输出
+
+    - 每只股票每种数据只保留最近使用的 keep_runs 个运行目录
+    - 总大小超过 quota_bytes 时从最旧的运行开始删除，每组最新的运行始终保留
+    - pinned 中的运行目录仍被保存的任务结果引用，不计入 keep_runs 也不按配额删除
+    - 删除超时未提交的暂存目录；remove_legacy 时删除旧版本直接写在数据目录下的图表
+    """
+    stats = {"runs_removed": 0, "runs_pinned": 0, "bytes_removed": 0, "bytes_kept": 0}
+    pinned = {os.path.normpath(path) for path in pinned or ()}
+    candidates = []  # 配额不足时可以删除的运行 (mtime, size, path)
+    now = time.time()
+
+    def remove(path: str, size: int) -> None:
+        shutil.rmtree(path, ignore_errors=True)
+        stats["runs_removed"] += 1
+        stats["bytes_removed"] += size
+
+    if not os.path.isdir(data_root):
+        return stats
+    for stock_code in os.listdir(data_root):
+        root = os.path.join(data_root, stock_code, "visualizations")
+        if not os.path.isdir(root):
+            continue
+        for file_type in os.listdir(root):
+            group = os.path.join(root, file_type)
+            if not os.path.isdir(group):
+                continue
+            runs = []
+            for entry in os.scandir(group):
+                if entry.is_file():
+                    if remove_legacy:
+                        os.remove(entry.path)
+                    continue
+                if STAGING_MARKER in entry.name:
+                    if now - entry.stat().st_mtime > STAGING_MAX_AGE:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    continue
+                try:
+                    runs.append((os.path.getmtime(os.path.join(entry.path, MANIFEST_NAME)), _dir_size(entry.path), entry.path))
+                except OSError:
+                    continue
+            runs.sort(reverse=True)
+            kept = 0
+            for mtime, size, path in runs:
+                if os.path.normpath(path) in pinned:
+                    stats["runs_pinned"] += 1
+                    stats["bytes_kept"] += size
+                    continue
+                if kept >= keep_runs:
+                    remove(path, size)
+                    continue
+                stats["bytes_kept"] += size
+                if kept > 0:
+                    candidates.append((mtime, size, path))
+                kept += 1
+
+    if quota_bytes > 0 and stats["bytes_kept"] > quota_bytes:
+        for mtime, size, path in sorted(candidates):
+            if stats["bytes_kept"] <= quota_bytes:
+                break
+            remove(path, size)
+            stats["bytes_kept"] -= size
+    return stats
+
+
+class VisualizationGC:
+    """后台定期清理可视化输出的线程
+
+    pinned_runs 返回仍被引用的运行目录，获取失败时跳过本轮清理
+    """
+
+    def __init__(self, interval: int = VIS_GC_INTERVAL, pinned_runs: Optional[Callable[[], Set[str]]] = None):
+        self.interval = interval
+        self.pinned_runs = pinned_runs
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                stats = collect_garbage(pinned=self.pinned_runs() if self.pinned_runs else None)
+                if stats["runs_removed"]:
+                    logger.info(
+                        f"清理了 {stats['runs_removed']} 个可视化运行目录，释放 {stats['bytes_removed'] / 1024 / 1024:.1f}MB，"
+                        f"剩余 {stats['bytes_kept'] / 1024 / 1024:.1f}MB"
+                    )
+            except Exception as e:
+                logger.error(f"清理可视化输出失败: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="visualization-gc", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,209 @@
+import csv
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, replace
+from typing import Dict, FrozenSet, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+A_SHARES_CSV = os.path.join(BACKEND_DIR, "all_a_shares.csv")
+
+# 匹配 600519 / sh600519 / 600519.SH 等形式的A股代码
+CODE_PATTERN = re.compile(r"^(?:SH|SZ|BJ)?(\d{6})(?:\.(?:SH|SZ|BJ))?$")
+# 风险警示前缀，如 *ST、ST、SST
+RISK_PREFIX = re.compile(r"^(?:\*ST|S\*ST|SST|ST|S)(?=[^A-Z])")
+# 同一公司的A/B股简称后缀，如 万科A、深振业A
+SHARE_CLASS_SUFFIX = re.compile(r"(?<=[^A-Z])[AB]$")
+# 全称中常见的公司后缀，从长到短依次去除
+COMPANY_SUFFIXES = ("股份有限公司", "有限责任公司", "有限公司", "股份公司", "集团公司", "公司", "股份", "集团", "控股")
+PUNCTUATION = re.compile(r"[()（）\[\]【】·・.,，、\-_\s]")
+PINYIN_QUERY = re.compile(r"^[A-Z]{2,}$")
+# 模糊匹配的最低相似度(二元组 Dice 系数)
+FUZZY_THRESHOLD = 0.5
+# 模糊匹配的最优结果至少领先第二名的相似度，否则视为无法确定
+# 如 '格力' 与 格力博(0.67)、格力电器(0.5) 都相近，不能因为简称短就选中格力博
+FUZZY_MARGIN = 0.2
+
+
+@dataclass(frozen=True)
+class StockMatch:
+    """股票名称解析结果"""
+    stock_code: str
+    stock_name: str
+    industry: Optional[str] = None
+    match_type: str = "exact"
+
+
+def normalize_name(text: str) -> str:
+    """统一全角/半角、去除空白并转为大写，如 '万  科Ａ' -> '万科A'"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return "".join(text.split()).upper()
+
+
+def strip_company_suffix(name: str) -> str:
+    """去除标点和公司后缀，如 '贵州茅台酒股份有限公司' -> '贵州茅台酒'"""
+    name = PUNCTUATION.sub("", name)
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in COMPANY_SUFFIXES:
+            if name.endswith(suffix) and len(name) > len(suffix) + 1:
+                name = name[:-len(suffix)]
+                stripped = True
+                break
+    return name
+
+
+def name_aliases(name: str) -> Set[str]:
+    """股票简称的常用简写：去掉风险警示前缀、A/B股后缀和公司后缀"""
+    aliases = set()
+    base = RISK_PREFIX.sub("", name)
+    base = SHARE_CLASS_SUFFIX.sub("", base)
+    aliases.add(base)
+    aliases.add(strip_company_suffix(base))
+    aliases.discard(name)
+    return {alias for alias in aliases if len(alias) >= 2}
+
+
+def bigrams(text: str) -> FrozenSet[str]:
+    """文本的二元组集合，用于模糊匹配"""
+    if len(text) < 2:
+        return frozenset((text,)) if text else frozenset()
+    return frozenset(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def pinyin_initials(name: str) -> Optional[str]:
+    """名称的拼音首字母，如 '贵州茅台' -> 'GZMT'，结果不是纯字母(如含数字)时返回None"""
+    # 加载拼音词典较慢，构建索引时才导入，不拖慢服务启动
+    from pypinyin import Style, lazy_pinyin
+    letters = lazy_pinyin(name, style=Style.FIRST_LETTER, errors=lambda chars: list(chars))
+    initials = "".join(letters).upper()
+    return initials if PINYIN_QUERY.match(initials) else None
+
+
+class StockResolver:
+    """本地股票名称/代码索引，启动时从 all_a_shares.csv 加载一次
+
+    依次尝试：股票代码、完整简称、简写(去掉 ST、A/B 股后缀和公司后缀)、拼音首字母、
+    二元组模糊匹配。简写和拼音首字母对应多只股票、模糊匹配无法区分最优结果时视为未命中：
+    模糊匹配要求查询是唯一一只股票简称的前缀，或最优结果明显领先第二名
+    """
+
+    def __init__(self, csv_path: str = A_SHARES_CSV):
+        self.csv_path = csv_path
+        self.by_code: Dict[str, StockMatch] = {}
+        self.by_name: Dict[str, StockMatch] = {}
+        self.by_alias: Dict[str, Set[str]] = {}
+        self.by_initials: Dict[str, Set[str]] = {}
+        # 二元组 -> 股票代码，以及每只股票简称的二元组
+        self.gram_index: Dict[str, Set[str]] = {}
+        self.name_grams: Dict[str, FrozenSet[str]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.csv_path):
+            logger.warning(f"股票列表文件不存在: {self.csv_path}")
+            return
+        with open(self.csv_path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                code = (row.get("code") or "").strip().zfill(6)
+                name = normalize_name(row.get("name"))
+                if not code or not name:
+                    continue
+                match = StockMatch(stock_code=code, stock_name=name)
+                self.by_code[code] = match
+                self.by_name.setdefault(name, match)
+        for code, match in self.by_code.items():
+            self._index(code, match.stock_name)
+        logger.info(f"加载了 {len(self.by_code)} 只股票到本地索引")
+
+    def _index(self, code: str, name: str) -> None:
+        for alias in name_aliases(name):
+            self.by_alias.setdefault(alias, set()).add(code)
+        initials = pinyin_initials(RISK_PREFIX.sub("", name))
+        if initials:
+            self.by_initials.setdefault(initials, set()).add(code)
+        grams = bigrams(strip_company_suffix(RISK_PREFIX.sub("", name)))
+        self.name_grams[code] = grams
+        for gram in grams:
+            self.gram_index.setdefault(gram, set()).add(code)
+
+    def _unique(self, codes: Optional[Set[str]], match_type: str) -> Optional[StockMatch]:
+        if not codes or len(codes) != 1:
+            return None
+        return replace(self.by_code[next(iter(codes))], match_type=match_type)
+
+    def fuzzy_candidates(self, key: str, limit: Optional[int] = 10) -> List[tuple]:
+        """按二元组 Dice 系数排序的候选 [(相似度, StockMatch)]，limit 为None时返回全部"""
+        grams = bigrams(key)
+        shared = Counter(code for gram in grams for code in self.gram_index.get(gram, ()))
+        scored = []
+        for code, count in shared.items():
+            score = 2 * count / (len(grams) + len(self.name_grams[code]))
+            scored.append((score, self.by_code[code]))
+        scored.sort(key=lambda item: (-item[0], len(item[1].stock_name), item[1].stock_code))
+        return scored[:limit] if limit is not None else scored
+
+    def _fuzzy(self, key: str) -> Optional[StockMatch]:
+        # 简称以查询开头的股票一定共享查询的第一个二元组，都在候选中
+        candidates = self.fuzzy_candidates(key, limit=None)
+        prefixed = [match for _, match in candidates
+                    if strip_company_suffix(RISK_PREFIX.sub("", match.stock_name)).startswith(key)]
+        if len(prefixed) == 1:
+            return replace(prefixed[0], match_type="fuzzy")
+        if not candidates or candidates[0][0] < FUZZY_THRESHOLD:
+            return None
+        if len(candidates) > 1 and candidates[0][0] - candidates[1][0] < FUZZY_MARGIN:
+            return None
+        return replace(candidates[0][1], match_type="fuzzy")
+
+    def resolve(self, query: str, allow_fuzzy: bool = True) -> Optional[StockMatch]:
+        """按股票代码、名称、简写、拼音首字母或模糊匹配解析，未命中或无法确定时返回None
+
+        Args:
+            allow_fuzzy: 是否尝试模糊匹配，需要确定结果的场景(如直接返回缓存的分析结果)传入False
+        """
+        key = normalize_name(query)
+        if not key:
+            return None
+        code_match = CODE_PATTERN.match(key)
+        if code_match:
+            match = self.by_code.get(code_match.group(1))
+            return replace(match, match_type="code") if match else None
+        if key in self.by_name:
+            return self.by_name[key]
+        stripped = strip_company_suffix(RISK_PREFIX.sub("", key))
+        for alias in (key, stripped):
+            if alias in self.by_name:
+                return replace(self.by_name[alias], match_type="alias")
+            match = self._unique(self.by_alias.get(alias), "alias")
+            if match:
+                return match
+        if PINYIN_QUERY.match(key):
+            return self._unique(self.by_initials.get(key), "pinyin")
+        return self._fuzzy(stripped) if allow_fuzzy else None
+
+
+_resolver: Optional[StockResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_stock_resolver() -> StockResolver:
+    """获取进程内共享的股票解析器"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = StockResolver()
+    return _resolver
+
+
+def resolve_stock_code(query: str, allow_fuzzy: bool = True) -> Optional[str]:
+    """将公司名称或代码解析为6位股票代码，allow_fuzzy 为False时只接受确定的匹配"""
+    match = get_stock_resolver().resolve(query, allow_fuzzy=allow_fuzzy)
+    return match.stock_code if match else None
@@ -0,0 +1,247 @@
+import csv
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import STOCK_INDEX_MARKER, STOCK_INDEX_RELOAD_INTERVAL
+from helpers.stock_resolver import (
+    A_SHARES_CSV, BACKEND_DIR, CODE_PATTERN, normalize_name, name_aliases, pinyin_initials,
+    RISK_PREFIX, strip_company_suffix, get_stock_resolver
+)
+
+logger = logging.getLogger(__name__)
+
+SECTORS_CSV = os.path.join(BACKEND_DIR, "all_sectors.csv")
+
+# 匹配方式的排序权重，越小越靠前
+RANK_NAME, RANK_CODE, RANK_ALIAS, RANK_PINYIN = 0, 1, 2, 3
+MATCH_TYPES = {RANK_NAME: "prefix", RANK_CODE: "code", RANK_ALIAS: "alias", RANK_PINYIN: "pinyin"}
+# 不超过该长度的前缀预先计算排序后的前 PREFIX_TOP_K 个结果，
+# 短查询(如 "6"、"中")的前缀区间很长，查询时不再扫描整个区间
+PRECOMPUTED_PREFIX_LEN = 2
+PREFIX_TOP_K = 50
+# 带交易所前缀的部分代码，如 sz0006、SH60
+EXCHANGE_CODE_PREFIX = re.compile(r"^(?:SH|SZ|BJ)(\d{1,6})$")
+# 前缀未命中时模糊匹配结果的最低相似度
+FUZZY_MIN_SCORE = 0.3
+
+
+def load_company_info() -> List[Dict[str, Any]]:
+    """从 company_info 表读取全部股票的名称和行业，数据库不可用时返回空列表"""
+    try:
+        import mysql.connector
+        from database.data_pipe.config import DB_CONFIG
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("select stock_code, stock_name, industry from company_info")
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        return rows
+    except Exception as e:
+        logger.warning(f"读取 company_info 表失败，搜索索引不包含行业信息: {str(e)}")
+        return []
+
+
+def source_signature() -> Tuple:
+    """数据源文件的修改时间，任一变化时需要重建索引"""
+    signature = []
+    for path in (A_SHARES_CSV, SECTORS_CSV, STOCK_INDEX_MARKER):
+        try:
+            signature.append(os.path.getmtime(path))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class StockSearchIndex:
+    """股票和行业板块的前缀索引，构建后只读
+
+    所有检索键(简称、简写、代码、拼音首字母)排序存放，查询时用二分查找定位前缀区间，
+    在整个区间内排序，不访问数据库。短前缀的结果在构建时预先计算
+    """
+
+    def __init__(self, stocks: Dict[str, Dict[str, Any]], sectors: Dict[str, Dict[str, Any]], signature: Tuple = ()):
+        self.stocks = stocks
+        self.sectors = sectors
+        self.signature = signature
+        entries = []
+        for code, stock in stocks.items():
+            ref = ("stock", code)
+            entries.append((code, RANK_CODE, ref))
+            entries.append((stock["name"], RANK_NAME, ref))
+            for alias in name_aliases(stock["name"]):
+                entries.append((alias, RANK_ALIAS, ref))
+            initials = pinyin_initials(RISK_PREFIX.sub("", stock["name"]))
+            if initials:
+                entries.append((initials, RANK_PINYIN, ref))
+        for code, sector in sectors.items():
+            ref = ("sector", code)
+            entries.append((sector["name"], RANK_NAME, ref))
+            entries.append((code, RANK_CODE, ref))
+            initials = pinyin_initials(sector["name"])
+            if initials:
+                entries.append((initials, RANK_PINYIN, ref))
+        entries.sort(key=lambda entry: entry[0])
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+        self.top_by_prefix = self._precompute_prefixes()
+
+    def _name_length(self, ref: Tuple[str, str]) -> int:
+        kind, code = ref
+        return len(self.stocks[code]["name"] if kind == "stock" else self.sectors[code]["name"])
+
+    def _score(self, key: str, entry_key: str, rank: int, ref: Tuple[str, str]) -> Tuple:
+        """排序键：完全匹配优先，其次按匹配方式；代码前缀按代码顺序排列，其余按名称长度"""
+        length = 0 if rank == RANK_CODE else self._name_length(ref)
+        return (entry_key != key, rank, length, ref[1])
+
+    @staticmethod
+    def _merge(best: Dict[Tuple[str, str], Tuple], ref: Tuple[str, str], score: Tuple) -> None:
+        # 同一股票有多个检索键命中时取最优的匹配方式
+        if ref not in best or score < best[ref]:
+            best[ref] = score
+
+    def _precompute_prefixes(self) -> Dict[str, List[Tuple[Tuple, Tuple[str, str]]]]:
+        """为所有短前缀计算排序后的前 PREFIX_TOP_K 个 (排序键, ref)"""
+        groups: Dict[str, Dict[Tuple[str, str], Tuple]] = {}
+        for entry_key, rank, ref in self.entries:
+            for length in range(1, min(PRECOMPUTED_PREFIX_LEN, len(entry_key)) + 1):
+                prefix = entry_key[:length]
+                self._merge(groups.setdefault(prefix, {}), ref, self._score(prefix, entry_key, rank, ref))
+        return {
+            prefix: heapq.nsmallest(PREFIX_TOP_K, ((score, ref) for ref, score in best.items()))
+            for prefix, best in groups.items()
+        }
+
+    def _rank_prefix(self, key: str, limit: int) -> List[Tuple[Tuple, Tuple[str, str]]]:
+        """前缀区间内排序后的前 limit 个 (排序键, ref)"""
+        if len(key) <= PRECOMPUTED_PREFIX_LEN and limit <= PREFIX_TOP_K:
+            return self.top_by_prefix.get(key, [])[:limit]
+        best: Dict[Tuple[str, str], Tuple] = {}
+        for position in range(bisect_left(self.keys, key), len(self.keys)):
+            entry_key, rank, ref = self.entries[position]
+            if not entry_key.startswith(key):
+                break
+            self._merge(best, ref, self._score(key, entry_key, rank, ref))
+        return heapq.nsmallest(limit, ((score, ref) for ref, score in best.items()))
+
+    @classmethod
+    def build(cls) -> "StockSearchIndex":
+        """从 all_a_shares.csv、all_sectors.csv 和 company_info 表构建索引"""
+        started = time.perf_counter()
+        signature = source_signature()
+        stocks: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(A_SHARES_CSV):
+            with open(A_SHARES_CSV, "r", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    code = (row.get("code") or "").strip().zfill(6)
+                    name = normalize_name(row.get("name"))
+                    if code and name:
+                        stocks[code] = {"code": code, "name": name, "industry": None}
+        for row in load_company_info():
+            code = str(row.get("stock_code") or "").strip().zfill(6)
+            if not code:
+                continue
+            stock = stocks.setdefault(code, {"code": code, "name": normalize_name(row.get("stock_name")), "industry": None})
+            stock["industry"] = row.get("industry") or stock["industry"]
+
+        sectors: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(SECTORS_CSV):
+            with open(SECTORS_CSV, "r", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    code = (row.get("板块代码") or "").strip().upper()
+                    name = normalize_name(row.get("板块名称"))
+                    if code and name:
+                        sectors[code] = {"code": code, "name": name}
+
+        index = cls(stocks, sectors, signature)
+        logger.info(
+            f"股票搜索索引构建完成: {len(stocks)} 只股票, {len(sectors)} 个板块, "
+            f"{len(index.keys)} 个检索键, 耗时 {time.perf_counter() - started:.2f}s"
+        )
+        return index
+
+    def _result(self, ref: Tuple[str, str], match_type: str) -> Dict[str, Any]:
+        kind, code = ref
+        if kind == "stock":
+            stock = self.stocks[code]
+            return {"type": "stock", "code": code, "name": stock["name"], "industry": stock["industry"], "match_type": match_type}
+        sector = self.sectors[code]
+        return {"type": "sector", "code": code, "name": sector["name"], "match_type": match_type}
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """按前缀检索股票和板块
+
+        排序：完全匹配优先，其次按匹配方式(简称 > 代码 > 简写 > 拼音)、名称长度和代码排序。
+        前缀没有结果时退回二元组模糊匹配，用于纠正错别字
+        """
+        key = normalize_name(query)
+        if not key or limit <= 0:
+            return []
+        # 交易所前缀只用于区分市场，检索键中的代码不带前缀
+        code_match = CODE_PATTERN.match(key) or EXCHANGE_CODE_PREFIX.match(key)
+        if code_match:
+            key = code_match.group(1)
+
+        ranked = self._rank_prefix(key, limit)
+        if ranked:
+            return [self._result(ref, MATCH_TYPES[score[1]]) for score, ref in ranked]
+
+        results = []
+        for score, match in get_stock_resolver().fuzzy_candidates(strip_company_suffix(key), limit=limit):
+            if score >= FUZZY_MIN_SCORE and match.stock_code in self.stocks:
+                results.append(self._result(("stock", match.stock_code), "fuzzy"))
+        return results
+
+
+_index: Optional[StockSearchIndex] = None
+_index_lock = threading.Lock()
+_last_check = 0.0
+_reloading = False
+
+
+def _reload() -> None:
+    global _index, _reloading
+    try:
+        _index = StockSearchIndex.build()
+    except Exception as e:
+        logger.error(f"重建股票搜索索引失败: {str(e)}")
+    finally:
+        _reloading = False
+
+
+def get_stock_search_index() -> StockSearchIndex:
+    """进程内共享的搜索索引
+
+    首次调用时构建。之后每隔 STOCK_INDEX_RELOAD_INTERVAL 秒检查一次数据源，
+    变化时在后台线程重建并整体替换，重建期间继续使用旧索引
+    """
+    global _index, _last_check, _reloading
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = StockSearchIndex.build()
+                _last_check = time.monotonic()
+        return _index
+
+    now = time.monotonic()
+    if now - _last_check >= STOCK_INDEX_RELOAD_INTERVAL:
+        with _index_lock:
+            if now - _last_check >= STOCK_INDEX_RELOAD_INTERVAL and not _reloading:
+                _last_check = now
+                if source_signature() != _index.signature:
+                    logger.info("检测到股票数据源变化，后台重建搜索索引")
+                    _reloading = True
+                    threading.Thread(target=_reload, name="reload-stock-index", daemon=True).start()
+    return _index
+
+
+def search_stocks(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """股票/板块联想搜索"""
+    return get_stock_search_index().search(query, limit)
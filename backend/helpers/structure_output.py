@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from core.model import LanguageModelManager
+from core.model import get_model_manager
 # from helpers.hotspot_search import get_market_hotspots
 
 from typing import List
@@ -47,7 +47,7 @@ class MarketHotspotAnalysis(BaseModel):
         description="List containing at least two market hotspot sectors or themes for analysis"
     )
 
-llm = LanguageModelManager().get_models()["llm_oai_o3"]
+llm = get_model_manager().get_models()["llm_oai_o3"]
 
 structured_llm = llm.with_structured_output(MarketHotspotAnalysis)
 
@@ -4,16 +4,23 @@ from typing import Dict
 from typing import Any
 import numpy as np
 import math
-from langchain_core.messages import  ToolMessage
+from decimal import Decimal
 import pandas as pd
 from helpers.logger import setup_logger
 
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时使用标准库json
+    orjson = None
+
 logger = setup_logger("data_keep")
 
 def extract_specific_tool_message(messages, tool_name=None, tool_call_id=None):
     """
     从messages中提取指定工具的消息
     """
+    from langchain_core.messages import ToolMessage
+    
     for message in messages:
         if isinstance(message, ToolMessage):
             if tool_name and message.name == tool_name:
@@ -84,69 +91,133 @@ def convert_numpy_types(obj):
         return obj
     return obj
 
-def dataframe_to_json_friendly(df):
+def _json_default(obj):
+    """JSON序列化的兜底转换：日期、Decimal、NumPy标量等"""
+    if type(obj).__name__ == "NaTType":
+        return None
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        value = float(obj)
+        return value if math.isfinite(value) else None
+    if isinstance(obj, (np.generic, np.ndarray)):
+        return convert_numpy_types(obj)
+    if isinstance(obj, pd.DataFrame):
+        return dataframe_to_json_friendly(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps_json(obj) -> bytes:
+    """
+    将对象序列化为UTF-8编码的JSON字节
+    
+    优先使用orjson(原生支持NumPy数组/标量，NaN和Inf输出为null)，
+    未安装时退回标准库json，并先递归转换NumPy类型
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            default=_json_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(convert_numpy_types(obj), ensure_ascii=False, default=_json_default).encode("utf-8")
+
+def loads_json(data):
+    """解析JSON字节或字符串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _to_json_scalar(value):
+    """转换object列中的单个值"""
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if type(value).__name__ == "NaTType":
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        value = float(value)
+        return value if math.isfinite(value) else None
+    if isinstance(value, (np.generic, np.ndarray)):
+        return convert_numpy_types(value)
+    return value
+
+def _column_to_list(values) -> list:
+    """
+    将一列(Series或Index)转换为JSON友好的Python列表
+    
+    数值列和日期列按整列向量化转换，只有object列才逐个检查元素
+    """
+    dtype = values.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        mask = values.isna()
+        result = values.astype(str).tolist()
+        if mask.any():
+            for i in np.flatnonzero(np.asarray(mask)):
+                result[i] = None
+        return result
+    if pd.api.types.is_bool_dtype(dtype) and dtype == np.bool_:
+        return values.tolist()
+    if pd.api.types.is_float_dtype(dtype) and isinstance(dtype, np.dtype):
+        array = values.to_numpy(dtype=np.float64)
+        result = array.tolist()
+        invalid = ~np.isfinite(array)
+        if invalid.any():
+            for i in np.flatnonzero(invalid):
+                result[i] = None
+        return result
+    if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        return values.tolist()
+    # object列、分类列以及可空扩展类型
+    return [_to_json_scalar(value) for value in values.astype(object).tolist()]
+
+def _frame_columns(df: pd.DataFrame):
+    """返回 reset_index() 之后的列名和各列数据，避免复制整个DataFrame"""
+    if isinstance(df.index, pd.MultiIndex):
+        frame = df.reset_index()
+        return [str(col) for col in frame.columns], [_column_to_list(frame[col]) for col in frame.columns]
+    
+    index_name = df.index.name
+    if index_name is None:
+        index_name = "index" if "index" not in df.columns else "level_0"
+    names = [str(index_name)] + [str(col) for col in df.columns]
+    columns = [_column_to_list(df.index)]
+    columns.extend(_column_to_list(df.iloc[:, i]) for i in range(df.shape[1]))
+    return names, columns
+
+def dataframe_to_json_friendly(df, orient: str = "records"):
     """
     将Pandas DataFrame转换为适合JSON序列化的格式
     
+    按列向量化处理NaN/Inf(转为None)、日期(转为字符串)和NumPy类型
+    
     Args:
         df: Pandas DataFrame对象
+        orient: "records" 返回 {columns, data: [每行一个字典], index}；
+                "columnar" 返回紧凑的按列格式 {format, columns, data: [每列一个列表], length}
         
     Returns:
         dict: 转换后的字典，适合JSON序列化
     """
     if df is None:
         return None
-        
-    # 检查如果索引是Timestamp类型，先将其转换为字符串
-    if hasattr(df.index, 'dtype') and 'datetime' in str(df.index.dtype):
-        df = df.copy()
-        df.index = df.index.astype(str)
     
-    # 转换为记录列表格式，而非默认的拆分格式
-    # 使用orient='records'而不是直接调用to_dict可能会更安全
-    try:
-        # 先尝试转换日期列为字符串，避免Timestamp序列化问题
-        df_copy = df.copy()
-        for col in df_copy.select_dtypes(include=['datetime64[ns]', 'datetime']).columns:
-            df_copy[col] = df_copy[col].astype(str)
-        
-        # 调用reset_index()前确保索引可序列化
-        records = df_copy.reset_index().to_dict(orient='records')
-    except Exception as e:
-        # 如果上述方法失败，尝试使用更严格的方法
-        import pandas as pd
-        records = []
-        df_reset = df.reset_index()
-        
-        for i in range(len(df_reset)):
-            row = {}
-            for col in df_reset.columns:
-                val = df_reset.iloc[i][col]
-                # 处理Timestamp和日期类型
-                if pd.api.types.is_datetime64_any_dtype(val) or hasattr(val, 'isoformat'):
-                    row[col] = val.isoformat() if hasattr(val, 'isoformat') else str(val)
-                else:
-                    row[col] = val
-            records.append(row)
+    names, columns = _frame_columns(df)
+    length = len(df)
     
-    # 处理Timestamp对象和NumPy类型
-    processed_records = []
-    for record in records:
-        processed_record = {}
-        for key, value in record.items():
-            # 处理Timestamp和日期类型
-            if hasattr(value, 'isoformat'):
-                processed_record[key] = value.isoformat()
-            # pandas Timestamp
-            elif hasattr(value, '_typ') and value._typ == 'timestamp':
-                processed_record[key] = str(value)
-            # 处理NumPy类型
-            else:
-                processed_record[key] = convert_numpy_types(value)
-        processed_records.append(processed_record)
+    if orient == "columnar":
+        return {
+            "format": "columnar",
+            "columns": names,
+            "data": columns,
+            "length": length
+        }
     
+    records = [dict(zip(names, row)) for row in zip(*columns)] if columns else []
     return {
-        "columns": [str(col) for col in df.reset_index().columns],  # 确保列名是字符串
-        "data": processed_records,
-        "index": list(range(len(processed_records)))
+        "columns": names,  # 确保列名是字符串
+        "data": records,
+        "index": list(range(length))
     }
@@ -0,0 +1,349 @@
+import gzip
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from helpers.utility import dumps_json, loads_json
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只支持gzip
+    brotli = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow为可选依赖，未安装时不提供Arrow IPC格式
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# 响应格式
+FORMAT_JSON = "json"
+FORMAT_COMPACT = "compact"
+FORMAT_ARROW = "arrow"
+
+COMPACT_MEDIA_TYPE = "application/vnd.stockagent.compact+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# 预编码紧凑格式的模块，存储键为 "{module}@compact"
+COMPACT_MODULES = ("basic_info", "market_data", "financial_data", "research_data")
+COMPACT_SUFFIX = "@compact"
+
+# 小于该大小的响应不压缩
+MIN_COMPRESS_SIZE = 1024
+
+# reset_index() 生成的默认索引列名
+DEFAULT_INDEX_COLUMNS = ("index", "level_0")
+
+# 按日期筛选时识别的日期列，按顺序取第一个存在的列
+DATE_COLUMNS = ("date", "Date", "trade_date", "日期", "report_date", "end_date")
+
+
+def compact_key(module_type: str) -> str:
+    return f"{module_type}{COMPACT_SUFFIX}"
+
+
+def is_frame(value: Any) -> bool:
+    """判断是否为 dataframe_to_json_friendly 生成的表格(行记录或按列格式)"""
+    return (
+        isinstance(value, dict)
+        and isinstance(value.get("columns"), list)
+        and isinstance(value.get("data"), list)
+        and (value.get("format") == "columnar" or "index" in value)
+    )
+
+
+def _dictionary_encode(values: List[Any]) -> Optional[Tuple[List[Any], List[Optional[int]]]]:
+    """对重复度高的字符串列做字典编码，返回(字典, 编码)，不适合编码时返回None"""
+    dictionary: Dict[str, int] = {}
+    codes: List[Optional[int]] = []
+    limit = max(1, len(values) // 2)
+    for value in values:
+        if value is None:
+            codes.append(None)
+            continue
+        if not isinstance(value, str):
+            return None
+        code = dictionary.get(value)
+        if code is None:
+            if len(dictionary) >= limit:
+                return None
+            code = dictionary[value] = len(dictionary)
+        codes.append(code)
+    if not dictionary:
+        return None
+    return list(dictionary), codes
+
+
+def _is_default_index(name: str, values: List[Any]) -> bool:
+    """reset_index() 产生的默认索引列(0..n-1)，不携带任何信息"""
+    return name in DEFAULT_INDEX_COLUMNS and values == list(range(len(values)))
+
+
+def to_columnar(frame: Dict[str, Any], dictionary_encode: bool = True, drop_index: bool = True) -> Dict[str, Any]:
+    """
+    将表格转换为紧凑的按列格式
+
+    {format: "columnar", columns, length, data: [每列一个列表], dictionaries: {列名: 取值列表}}
+    在 dictionaries 中出现的列，data 中对应的是取值在字典中的下标；
+    drop_index 时去掉 reset_index() 产生的默认索引列
+    """
+    columns = [str(col) for col in frame["columns"]]
+    if frame.get("format") == "columnar":
+        data = [list(col) for col in frame["data"]]
+        length = frame.get("length", len(data[0]) if data else 0)
+    else:
+        records = frame["data"]
+        data = [[record.get(col) for record in records] for col in columns]
+        length = len(records)
+
+    if drop_index:
+        keep = [i for i, col in enumerate(columns) if not _is_default_index(col, data[i])]
+        if len(keep) < len(columns):
+            columns = [columns[i] for i in keep]
+            data = [data[i] for i in keep]
+
+    dictionaries = dict(frame.get("dictionaries") or {})
+    if dictionary_encode:
+        for i, col in enumerate(columns):
+            if col in dictionaries:
+                continue
+            encoded = _dictionary_encode(data[i])
+            if encoded is not None:
+                dictionaries[col], data[i] = encoded
+
+    result = {
+        "format": "columnar",
+        "columns": columns,
+        "length": length,
+        "data": data,
+        "dictionaries": dictionaries,
+    }
+    if "total" in frame:
+        result["total"] = frame["total"]
+    return result
+
+
+def decode_columnar(frame: Dict[str, Any]) -> Dict[str, Any]:
+    """还原字典编码的列，返回不含 dictionaries 的按列格式"""
+    dictionaries = frame.get("dictionaries") or {}
+    data = []
+    for col, values in zip(frame["columns"], frame["data"]):
+        dictionary = dictionaries.get(col)
+        if dictionary is not None:
+            values = [dictionary[code] if code is not None else None for code in values]
+        data.append(values)
+    return {
+        "format": "columnar",
+        "columns": list(frame["columns"]),
+        "length": frame.get("length", len(data[0]) if data else 0),
+        "data": data,
+    }
+
+
+def compact_value(value: Any) -> Any:
+    """递归地将模块中的所有表格转换为紧凑格式"""
+    if is_frame(value):
+        return to_columnar(value)
+    if isinstance(value, dict):
+        return {key: compact_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [compact_value(item) for item in value]
+    return value
+
+
+def encode_compact_module(body: bytes) -> bytes:
+    """由预编码的模块JSON生成紧凑格式的字节"""
+    return dumps_json(compact_value(loads_json(body)))
+
+
+def find_frames(value: Any, prefix: str = "") -> Dict[str, Dict[str, Any]]:
+    """找出模块中的所有表格，键为以点分隔的路径，如 analyst_data、market_data.trade_data"""
+    frames = {}
+    if is_frame(value):
+        frames[prefix] = value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            frames.update(find_frames(item, f"{prefix}.{key}" if prefix else str(key)))
+    return frames
+
+
+def to_records(frame: Dict[str, Any]) -> Dict[str, Any]:
+    """将表格转换回 dataframe_to_json_friendly 的行记录格式"""
+    columnar = decode_columnar(to_columnar(frame, dictionary_encode=False, drop_index=False))
+    columns = columnar["columns"]
+    records = [dict(zip(columns, row)) for row in zip(*columnar["data"])] if columns else []
+    result = {"columns": columns, "data": records, "index": list(range(len(records)))}
+    if "total" in frame:
+        result["total"] = frame["total"]
+    return result
+
+
+def records_value(value: Any) -> Any:
+    """递归地将模块中的所有表格转换为行记录格式"""
+    if is_frame(value):
+        return to_records(value)
+    if isinstance(value, dict):
+        return {key: records_value(item) for key, item in value.items()}
+    return value
+
+
+def _normalize_date(value: Optional[str]) -> Optional[str]:
+    """将 20240101 / 2024-01-01 / 2024/01/01 统一为 2024-01-01"""
+    if not value:
+        return None
+    digits = "".join(ch for ch in str(value) if ch.isdigit())
+    if len(digits) < 8:
+        raise ValueError(f"无效的日期: {value}")
+    return f"{digits[:4]}-{digits[4:6]}-{digits[6:8]}"
+
+
+def slice_frame(
+    frame: Dict[str, Any],
+    columns: Optional[List[str]] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    drop_index: bool = False,
+) -> Dict[str, Any]:
+    """
+    对单个表格做日期筛选、列投影和分页，返回按列格式(不含字典编码)
+
+    日期列始终保留；列名不区分大小写，不存在的列被忽略；
+    结果中的 total 为分页前的行数。drop_index 时在筛选前去掉默认索引列
+    """
+    columnar = decode_columnar(to_columnar(frame, dictionary_encode=False, drop_index=drop_index))
+    names = columnar["columns"]
+    data = columnar["data"]
+    date_col = next((col for col in DATE_COLUMNS if col in names), None)
+
+    rows = range(columnar["length"])
+    start, end = _normalize_date(start_date), _normalize_date(end_date)
+    if date_col is not None and (start or end):
+        dates = data[names.index(date_col)]
+        rows = [
+            i for i in rows
+            if dates[i] is not None
+            and (start is None or str(dates[i])[:10] >= start)
+            and (end is None or str(dates[i])[:10] <= end)
+        ]
+    rows = list(rows)
+    total = len(rows)
+    rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+
+    if columns:
+        wanted = {col.lower() for col in columns}
+        keep = [i for i, col in enumerate(names) if col.lower() in wanted or col == date_col]
+    else:
+        keep = list(range(len(names)))
+
+    return {
+        "format": "columnar",
+        "columns": [names[i] for i in keep],
+        "length": len(rows),
+        "total": total,
+        "data": [[data[i][row] for row in rows] for i in keep],
+    }
+
+
+def slice_module(
+    module: Any,
+    series: Optional[List[str]] = None,
+    **slice_args,
+) -> Any:
+    """
+    对模块中的表格应用切片参数
+
+    series 为要保留的表格路径(相对模块，如 trade_data、technical_data)，
+    指定后只返回这些表格；未指定时保留模块中的所有内容，只切片其中的表格
+    """
+    if series:
+        frames = find_frames(module)
+        missing = [name for name in series if name not in frames]
+        if missing:
+            raise KeyError(f"表格不存在: {', '.join(missing)}，可选: {', '.join(frames)}")
+        return {name: slice_frame(frames[name], **slice_args) for name in series}
+
+    def _walk(value):
+        if is_frame(value):
+            return slice_frame(value, **slice_args)
+        if isinstance(value, dict):
+            return {key: _walk(item) for key, item in value.items()}
+        return value
+
+    return _walk(module)
+
+
+def encode_arrow(frame: Dict[str, Any]) -> bytes:
+    """将单个表格编码为Arrow IPC流，字典编码的列使用Arrow字典类型"""
+    if pa is None:
+        raise RuntimeError("未安装pyarrow，不支持Arrow格式")
+    columnar = to_columnar(frame)
+    dictionaries = columnar["dictionaries"]
+    arrays = []
+    for col, values in zip(columnar["columns"], columnar["data"]):
+        if col in dictionaries:
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(values, type=pa.int32()), pa.array(dictionaries[col], type=pa.string())
+            ))
+        else:
+            arrays.append(pa.array(values))
+    table = pa.Table.from_arrays(arrays, names=columnar["columns"])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def negotiate_format(format_param: Optional[str], accept: Optional[str]) -> str:
+    """根据查询参数 format 或 Accept 头选择响应格式，查询参数优先"""
+    if format_param:
+        fmt = format_param.lower()
+        if fmt not in (FORMAT_JSON, FORMAT_COMPACT, FORMAT_ARROW):
+            raise ValueError(f"不支持的响应格式: {format_param}")
+        return fmt
+    accept = (accept or "").lower()
+    if ARROW_MEDIA_TYPE in accept and pa is not None:
+        return FORMAT_ARROW
+    if COMPACT_MEDIA_TYPE in accept:
+        return FORMAT_COMPACT
+    return FORMAT_JSON
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """根据 Accept-Encoding 选择压缩算法，优先brotli"""
+    accepted = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    # 不缓存压缩结果：模块字节可能很大，缓存会绕过 TaskCache 的字节上限常驻内存
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def compress_body(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """按客户端支持的算法压缩响应体，返回(响应体, Content-Encoding)"""
+    if len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return _compress(body, encoding), encoding
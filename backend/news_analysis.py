@@ -1,11 +1,13 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
-from core.east_finance_xinlang import gather_news, call_openai_with_tools
 
 router = APIRouter()
 
 @router.get("/news-analysis")
 def get_news_analysis():
+    # 新闻抓取依赖 requests/bs4 等库，首次请求时才导入
+    from core.east_finance_xinlang import gather_news, call_openai_with_tools
+
     try:
         news_text = gather_news()
         prompt = f"请根据以下财经新闻内容生成结构化 JSON 分析：{news_text}"
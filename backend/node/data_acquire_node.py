@@ -2,6 +2,7 @@ import asyncio
 from datetime import datetime
 
 from core.state import StockAnalysisState
+from core.plans import get_analysis_plan
 from tools.stock_news_tools import get_stock_news
 from tools.stock_news_tools_db import get_stock_news_from_db_tool
 from tools.sector_tools import get_stock_sector_data
@@ -49,33 +50,38 @@ async def data_acquire_node_async(state: StockAnalysisState) -> StockAnalysisSta
     stock_name = state.basic_info.stock_name
     industry = state.basic_info.industry
 
+    # 只获取当前分析类型需要的数据集
+    datasets = get_analysis_plan(state.analysis_type).datasets
+    fetchers = {
+        "news": lambda: get_news_async(stock_code),
+        "sector": lambda: get_sector_async(industry, start_date, end_date),
+        "trade": lambda: get_trade_async(stock_code, start_date, end_date),
+        "financial": lambda: get_financial_async(stock_code, start_date, end_date),
+        "indicators": lambda: get_indicators_async(stock_code, start_date, end_date),
+        "analyst": lambda: get_analyst_async(stock_code, start_date),
+        "technical": lambda: get_technical_async(stock_code, start_date, end_date),
+    }
+    updaters = {
+        "news": state.update_news_data,
+        "sector": state.update_sector_data,
+        "trade": state.update_trade_data,
+        "financial": state.update_financial_data,
+        "indicators": state.update_indicator_data,
+        "analyst": state.update_analyst_data,
+        "technical": state.update_technical_data,
+    }
+
     try:
-        # 并行执行所有数据获取任务
-        news_task = get_news_async(stock_code)
-        sector_task = get_sector_async(industry, start_date, end_date)
-        trade_task = get_trade_async(stock_code, start_date, end_date)
-        financial_task = get_financial_async(stock_code, start_date, end_date)
-        indicators_task = get_indicators_async(stock_code, start_date, end_date)
-        analyst_task = get_analyst_async(stock_code, start_date)
-        technical_task = get_technical_async(stock_code, start_date, end_date)
-
-        # 等待所有任务完成
+        # 并行执行所需的数据获取任务
+        logger.info(f"{state.analysis_type}: 获取数据集 {', '.join(datasets)}")
         results = await asyncio.gather(
-            news_task, sector_task, trade_task,
-            financial_task, indicators_task ,analyst_task, technical_task,
+            *(fetchers[name]() for name in datasets),
             return_exceptions=True
         )
 
         # 更新状态
-        news_data, sector_data, trade_data, financial_data, indicator_data, analyst_data, technical_data = results
-
-        state.update_news_data(news_data)
-        state.update_sector_data(sector_data)
-        state.update_trade_data(trade_data)
-        state.update_financial_data(financial_data)
-        state.update_indicator_data(indicator_data)
-        state.update_analyst_data(analyst_data)
-        state.update_technical_data(technical_data)
+        for name, result in zip(datasets, results):
+            updaters[name](result)
 
         logger.info("data_acquire_node异步获取数据完成")
         
@@ -1,17 +1,53 @@
 import os
-from PIL import Image
+import json
+import shutil
 from core.state import StockAnalysisState
-from agents.graph_agent_new import agent_coder
+from core.model import get_model_manager
+from config.settings import VISUALIZATION_LLM_DESCRIPTION
 from helpers.logger import setup_logger
-from langchain_core.messages import HumanMessage
+from core.memo import fingerprint, file_digest
+from helpers.chart_engine import CHART_TEMPLATE_VERSION, describe_summary
+from helpers.chart_store import load_run, run_paths, staging_dir, commit_run, touch_run, record_latest
+from utils.chart_pool import render_data_file
 
 from helpers.data_loader import DataLoader
 
 data_loader = DataLoader()
+
+DESCRIPTION_PROMPT = """You are a stock chart analyst. The charts below were drawn from {file_type} of stock {stock_code}:
+price with MA5/MA20/MA60 and volume, RSI(14), MACD(12,26,9), Bollinger Bands(20,2) and a correlation matrix.
+Key figures:
+{summary}
+Describe the analysis result in exactly two sentences of plain English markdown. Do not repeat the chart list."""
+
+def describe_charts(stock_code: str, file_type: str, summary: dict, logger) -> str:
+    """生成图表描述：只调用一次LLM，失败或关闭时使用固定模板"""
+    fallback = describe_summary(summary)
+    if not VISUALIZATION_LLM_DESCRIPTION:
+        return fallback
+    try:
+        llm = get_model_manager().get_models()["llm_oai_mini"]
+        response = llm.invoke(DESCRIPTION_PROMPT.format(
+            file_type=file_type,
+            stock_code=stock_code,
+            summary=json.dumps(summary, ensure_ascii=False, default=str),
+        ))
+        return (response.content or "").strip() or fallback
+    except Exception as e:
+        logger.error(f"生成{file_type}图表描述失败，使用默认描述: {str(e)}")
+        return fallback
+
 def process_visualization_node(state: StockAnalysisState) -> StockAnalysisState:
     """
     Process visualization node that generates plots from DataFrame
     
+    使用 helpers.chart_engine 的固定模板绘制价格/均线/成交量、RSI、MACD、布林带和相关性图表，
+    文件名固定，不再由LLM编写绘图代码；LLM只用于生成两句话的描述。
+    绘图在 utils.chart_pool 的工作进程中进行，并行的分支和任务不共享 matplotlib 状态。
+    
+    输出写入 visualizations/{file_type}/{run_id}/，run_id 由模板版本和数据文件内容计算，
+    目录中的 manifest.json 记录图表和描述；相同输入的运行直接复用，旧的运行由 helpers.chart_store 清理
+    
     Args:
         state (StockAnalysisState): State object containing DataFrame and messages
         
@@ -29,112 +65,35 @@ def process_visualization_node(state: StockAnalysisState) -> StockAnalysisState:
     file_list = []
     
     try:
-        # 确保目录存在
-        os.makedirs(vis_dir, exist_ok=True)
+        run_id = fingerprint(CHART_TEMPLATE_VERSION, DESCRIPTION_PROMPT, file_type, file_digest(file_path))[:16]
+        run_dir = os.path.join(vis_dir, run_id)
+        manifest = load_run(run_dir)
         
-        # data info
-        df = data_loader.load_data(file_path)[0]
-        data_description = data_loader.generate_data_description(df)
-        data_info = data_loader.get_data_info(df)
-        
-        # task
-        task = """
-    Step 1: Data Loading and Cleaning
-• Import the stock market data (e.g., CSV) using libraries like pandas (Python) or dplyr in R.
-• Convert the 'Date' column to datetime format and set it as the index for time series analysis.
-• Check for missing values and duplicates, and clean or handle them appropriately.
-
-Step 2: Data Preprocessing & Transformation
-• Verify and convert data types for price (Open, Close, High, Low) and Volume columns, ensuring they are numeric.
-• Sort the dataset chronologically by date.
-• (Optional) Rename ambiguous or unwanted columns for clarity.
-
-Step 3: Calculate Technical Indicators
-• Moving Averages: Calculate short-term (e.g., 5-day) and long-term (e.g., 20-day) simple moving averages (SMA) over the 'Close' price.
-• Relative Strength Index (RSI): Compute the RSI for a period (commonly 14 days) by calculating the average gains and losses, then applying the RSI formula; consider using libraries or custom code.
-• Moving Average Convergence Divergence (MACD): Calculate the MACD line by subtracting the 26-day EMA from the 12-day EMA, then generate the signal line using a 9-day EMA of the MACD.
-
-Step 4: Exploratory Data Analysis (EDA)
-• Generate summary statistics (mean, median, standard deviation) for price, volume, and indicator columns.
-• Create a correlation matrix to explore relationships between 'Close', Volume, and technical indicators.
-• Plot the time series of the 'Close' price to identify trends, volatility, or anomalies (e.g., sudden spikes). 
-
-Step 5: Visualization
-• Price Trends with Moving Averages: Produce a line chart of 'Close' price, overlaying the SMA curves. Optionally, create candlestick charts for detailed daily price movement.
-• RSI Chart: Plot the RSI values on a separate subplot, adding horizontal lines at 30 and 70 to highlight oversold and overbought regions.
-• MACD Chart: Create a chart displaying the MACD line, signal line, and a histogram of their differences to visualize momentum shifts.
-• Optional Volume Chart: Overlay or plot a bar chart of trading volume alongside price trends to confirm movements.
-
-Step 6: Interpretation of Results
-• Analyze how price interacts with moving averages to gauge trend strength (price above SMA indicates bullish sentiment, below indicates bearish).
-• Evaluate RSI readings to flag potential overbought (RSI > 70) or oversold (RSI < 30) scenarios.
-• Look for MACD crossovers (MACD crossing above signal line for bullish signals and vice versa for bearish signals) as validation of potential trend reversals.
-• Summarize findings, noting any coincidences where technical indicator signals align with significant price or volume changes.
-    """
-        logger.info(f"graph_node开始生成可视化{file_type}图表")
-        prompt = """
-    You are a helpful assistant that can help with coding tasks for data analysis.
-    Here is the data path:
-    {data_path};
-    Data description:
-    {data_description}
-    Data info:
-    {data_info}
-    Your task:
-    {task}
-    Notice:
-    - 设置后端为Agg（非交互式）
-    - Don't use jupyter notebook, just use python
-    - Don't print module name, just use it directly
-    - 注意日期格式，不要使用字符串
-    - 使用plt.savefig()保存图像
-        keep path: database/data/{stock_code}/visualizations/{file_type}/
-    - 不调用plt.show()
-    - 相同类型的图画在同一个图里
-    - 图片原则：
-        风格类型：极简主义/科技感/复古/高对比度/深色模式
-        核心参数：style.use(), set_palette(), rcParams, figsize, grid, despine
-        设计原则：信息优先（Data-Ink Ratio）、一致性、无障碍色觉设计
-        表标题命名：'{file_type}:table_title'
-    - Fianl output your analysis result as the markdown format.(do not need keep)
-        Just use two sentences to describe the analysis result
-        font size: normal
-        使用英语
-    """.format(
-            data_path=file_path, 
-            data_description=data_description, 
-            task=task,
-            stock_code=stock_code,
-            file_type=file_type,
-            data_info=data_info
-        )
-        messages = [{
-            "role": "user",
-            "content": prompt
-        }]
-        
-        # 创建agent
-        agent = agent_coder(state)
-        
-        try:
-            # 在invoke时传递递归限制配置，并捕获可能的异常
-            result = agent.invoke({"messages": messages}, config={"recursion_limit": 100})
-            description = result["messages"][-1].content
-        except Exception as e:
-            logger.error(f"可视化代理执行失败: {str(e)}")
-            description = f"可视化生成过程中出现错误: {str(e)}"
-            
-        # 即使代理执行失败，仍然尝试获取已生成的图片
-        if os.path.exists(vis_dir) and os.listdir(vis_dir):
-            file_list = [os.path.join(vis_dir, file) for file in os.listdir(vis_dir)]
-            logger.info(f"找到 {len(file_list)} 个可视化文件")
+        if manifest is not None:
+            logger.info(f"{file_type}数据未变化，复用可视化运行 {run_id}")
+            touch_run(run_dir)
         else:
-            logger.warning(f"未找到可视化文件，目录: {vis_dir}")
+            df, error = data_loader.load_data(file_path)
+            if df is None:
+                raise ValueError(error)
+            
+            logger.info(f"graph_node开始生成可视化{file_type}图表")
+            staging = staging_dir(run_dir)
+            try:
+                _, summary = render_data_file(df, file_type, staging)
+                description = describe_charts(stock_code, file_type, summary, logger)
+                manifest = commit_run(staging, run_dir, run_id, file_type, description)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        
+        record_latest(stock_code, file_type, run_dir, manifest)
+        file_list = run_paths(run_dir, manifest)
+        description = manifest["description"]
+        logger.info(f"{file_type}可视化运行 {run_id} 包含 {len(file_list)} 个图表")
             
     except Exception as e:
         logger.error(f"可视化节点执行失败: {str(e)}")
-        # 确保即使在错误情况下也能创建目录
-        os.makedirs(vis_dir, exist_ok=True)
+        description = f"可视化生成过程中出现错误: {str(e)}"
         
-    # 返回已找到的图片和描述，即使处理过程中出现错误
-    return {"visualization_paths": file_list, "graph_description": [description]}
\ No newline at end of file
+    # 返回本次生成的图片和描述，即使处理过程中出现错误
+    return {"visualization_paths": file_list, "graph_description": [description]}
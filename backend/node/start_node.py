@@ -6,6 +6,29 @@ from core.state import StockAnalysisState
 from agents.start_agent import create_stock_code_search_agent
 from helpers.utility import extract_specific_tool_message
 from helpers.logger import setup_logger
+from helpers.stock_resolver import get_stock_resolver
+from tools.company_info_tools_db import get_company_info_from_db_tool
+
+def resolve_company_locally(state: StockAnalysisState, company_name: str, logger) -> bool:
+    """用本地股票索引解析公司名称，命中时从 company_info 表补充行业和公司信息
+    
+    Returns:
+        bool: 是否命中，未命中时由搜索代理处理
+    """
+    match = get_stock_resolver().resolve(company_name)
+    if match is None:
+        return False
+    
+    company_info_df = get_company_info_from_db_tool.invoke({"stock_code": match.stock_code})
+    industry = match.industry
+    if company_info_df is not None and not company_info_df.empty:
+        if "industry" in company_info_df.columns:
+            industry = company_info_df["industry"].iloc[0] or industry
+        state.update_company_info(company_info_df)
+    
+    state.update_stock_info(match.stock_code, match.stock_name, industry)
+    logger.info(f"本地索引解析 {company_name} -> {match.stock_code} {match.stock_name} ({match.match_type})")
+    return True
 
 def process_company_node(state: StockAnalysisState) -> StockAnalysisState:
     """
@@ -19,6 +42,14 @@ def process_company_node(state: StockAnalysisState) -> StockAnalysisState:
     """
     logger = setup_logger("node.log")
     logger.info("start_node开始处理公司信息")
+    
+    # 优先使用本地索引，未命中时才调用搜索代理
+    company_name = state.messages[0].content if state.messages else ""
+    if resolve_company_locally(state, company_name, logger):
+        logger.info("start_node处理公司信息完成")
+        return state
+    
+    logger.info(f"本地索引未命中 {company_name}，使用搜索代理")
     agent = create_stock_code_search_agent(state)
     result = agent.invoke(state)
 
@@ -6,37 +6,55 @@ load_dotenv()
 print(f"OpenAI API密钥是否存在: {'是' if os.getenv('OPENAI_API_KEY') else '否'}")
 print(f"API密钥前缀: {os.getenv('OPENAI_API_KEY')[:5]}..." if os.getenv('OPENAI_API_KEY') else "无API密钥")
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Response
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any, Union
 from datetime import datetime, timedelta
-from core.workflow import run_stock_analysis
-from helpers.utility import convert_numpy_types, dataframe_to_json_friendly
+from helpers.utility import dataframe_to_json_friendly, dumps_json
 import asyncio
 import traceback
 from helpers.logger import setup_logger
 import uuid
+import hashlib
 import time
 import json
 import threading
 from pathlib import Path
-import mimetypes
-from PIL import Image
-import io
 from utils.cache import RedisCache, cached
-from config.settings import REDIS_CACHE_TTL
+from config.settings import (
+    REDIS_CACHE_TTL, TASK_STORE_DB, IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_AGE, IMAGE_CACHE_MAX_BYTES,
+    TASK_REGISTRY_BACKEND, TASK_REDIS_TTL, FAST_START,
+    TASK_CACHE_MAX_TASKS, TASK_CACHE_MAX_BYTES, TASK_CACHE_TTL_COMPLETED, TASK_CACHE_TTL_FAILED,
+    ANALYSIS_MAX_WORKERS, ANALYSIS_QUEUE_SIZE, ANALYSIS_BATCH_MAX_ACTIVE,
+    ANALYSIS_WORKER_LEASE, ANALYSIS_JOB_MAX_ATTEMPTS
+)
+from utils.task_store import TaskRegistry, RedisTaskRegistry
+from utils.task_cache import TaskCache
+from utils.scheduler import AnalysisScheduler, RedisAnalysisScheduler, QueueFullError, DuplicateJobError
+from utils.task_events import TaskEventBroker, TaskEvent, RedisEventRelay, TERMINAL_EVENTS
+from utils.image_cache import DerivedImageCache, resolve_image_path, etag_matches
+from utils.metrics import REGISTRY as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, CACHE_REQUESTS, ANALYSIS_TASKS, WORKERS, WORKER_UTILIZATION, QUEUE_DEPTH, TASKS_IN_MEMORY, TASK_MEMORY_BYTES
+from helpers.stock_resolver import resolve_stock_code, get_stock_resolver
+from helpers.stock_search import get_stock_search_index, search_stocks
+from utils.chart_pool import get_chart_pool, shutdown_chart_pool
+from helpers.chart_store import VisualizationGC, referenced_runs
+from core.checkpoint import CheckpointPruner, get_checkpointer, clear_thread
+from core.memo import NodeMemoSweeper
+from helpers.wire_format import (
+    COMPACT_MODULES, FORMAT_ARROW, FORMAT_COMPACT, COMPACT_MEDIA_TYPE, ARROW_MEDIA_TYPE,
+    compact_key, encode_compact_module, encode_arrow, find_frames, negotiate_format, compress_body, MIN_COMPRESS_SIZE,
+    compact_value, records_value, slice_module
+)
+from helpers.utility import loads_json
 
 # 设置日志记录器
 logger = setup_logger("api_server.log")
 
-# 初始化Redis缓存
+# 初始化Redis缓存，首次使用时才连接
 cache = RedisCache()
-if cache.available:
-    logger.info("成功连接到Redis服务器")
-else:
-    logger.warning("Redis缓存不可用，将不会使用缓存功能")
 
 app = FastAPI(title="Stock Analysis API")
 
@@ -68,6 +86,14 @@ def ensure_directories_exist():
 # 应用启动时执行
 ensure_directories_exist()
 
+@app.on_event("startup")
+def check_redis_cache():
+    """启动时测试Redis连接，导入服务模块时不访问网络"""
+    if cache.available:
+        logger.info("成功连接到Redis服务器")
+    else:
+        logger.warning("Redis缓存不可用，将不会使用缓存功能")
+
 class WorkflowRequest(BaseModel):
     stock_code: str
     start_date: str
@@ -83,30 +109,83 @@ class StockAnalysisRequest(BaseModel):
     stock_code: Optional[str] = None  # 可选股票代码
     analysis_type: str = "综合分析"  # 可选值: "技术面分析", "基本面分析", "综合分析"
     force_refresh: bool = False  # 是否强制刷新，忽略缓存
+    priority: str = "interactive"  # 调度通道: "interactive"(交互式) 或 "batch"(批量)
+
+LEGACY_TASK_STORE_FILE = "database/task_store.json"
+# 任务事件广播器，向SSE/WebSocket订阅者推送进度
+task_events = TaskEventBroker()
 
-# 修改task_store的定义，使用更持久的存储方案
-# 用于存储任务状态和结果的内存存储
-# 实际应用中可替换为Redis等分布式存储
-task_store = {}
-TASK_STORE_FILE = "database/task_store.json"
+# 任务注册表后端：redis 时任务状态、结果、队列和事件在所有进程间共享
+if TASK_REGISTRY_BACKEND == "redis" and cache.available:
+    task_registry = RedisTaskRegistry(cache.client, cache.raw_client, TASK_REDIS_TTL)
+    task_events.relay = RedisEventRelay(cache.client, task_events)
+    logger.info("使用Redis共享任务注册表")
+else:
+    if TASK_REGISTRY_BACKEND == "redis":
+        logger.warning("Redis不可用，任务注册表退回到本地SQLite，只能以单进程运行")
+    task_registry = TaskRegistry(TASK_STORE_DB)
+# 缩放/缩略图等派生图片的磁盘缓存
+image_cache = DerivedImageCache(IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES)
 
 # 首先定义TaskStatus类，然后再定义load_task_store函数
 class TaskStatus:
     """任务状态跟踪类"""
-    def __init__(self, company_name: str):
+    def __init__(self, company_name: str, task_id: str = None):
+        self.task_id = task_id
         self.company_name = company_name
-        self.status = "pending"  # pending, processing, completed, failed
+        self.status = "pending"  # pending, processing, completed, failed, cancelled
         self.progress = 0  # 0-100
         self.message = "任务已创建，等待处理"
-        self.result = None
+        self._result = None
+        self._result_persisted = False  # 结果是否已写入注册表(可懒加载)
+        self.modules: Dict[str, bytes] = {}  # 预编码的结果模块，按需从注册表加载
         self.error = None
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
         self.stage = "初始化"
         self.stock_code = None  # 添加股票代码字段，用于缓存查询
+        self.owned = False  # 是否由本进程执行，共享注册表下非本进程执行的任务从注册表刷新状态
+        self.active_nodes: List[str] = []  # 正在执行的工作流节点(并行分支为 "节点:分支")
+        self.analysis_type = "综合分析"  # 分析类型，重试和服务重启后按相同的类型继续
+
+    @property
+    def result(self):
+        """任务结果，未加载时从注册表懒加载"""
+        if self._result is None and self._result_persisted and self.task_id:
+            self._result = task_registry.load_result(self.task_id)
+        return self._result
+
+    @result.setter
+    def result(self, value):
+        self._result = value
+
+    def get_module(self, module_type: str) -> Optional[bytes]:
+        """获取预编码的结果模块，依次查找内存、注册表和旧版整体结果"""
+        body = self.modules.get(module_type)
+        if body is not None or not self.task_id:
+            return body
+        body = task_registry.load_module(self.task_id, module_type)
+        if body is not None:
+            self.modules[module_type] = body
+            return body
+        # 旧版结果没有预编码的紧凑格式，由完整模块转换后保留在内存中
+        base_type, _, variant = module_type.partition("@")
+        if variant:
+            base_body = self.get_module(base_type)
+            if base_body is None:
+                return None
+            self.modules[module_type] = encode_compact_module(base_body)
+            return self.modules[module_type]
+        # 旧版任务结果中包含完整的data，拆分后编码
+        result = self.result
+        if isinstance(result, dict) and isinstance(result.get("data"), dict):
+            self.modules = encode_result_modules(result["data"])
+            return self.modules.get(module_type)
+        return None
         
     def update(self, status=None, progress=None, message=None, result=None, error=None, stage=None, stock_code=None):
         """更新任务状态"""
+        previous_stage = self.stage
         if status:
             self.status = status
         if progress is not None:
@@ -122,7 +201,22 @@ class TaskStatus:
         if stock_code:
             self.stock_code = stock_code
         self.updated_at = datetime.now()
+        if (status or stock_code or result) and self.task_id in task_store:
+            # 状态、股票代码或结果变化后更新内存缓存的索引和大小
+            task_store.track(self.task_id)
+        if self.task_id and task_registry.shared:
+            # 共享注册表下每次更新都写入，其他进程的进度查询可以立即看到
+            try:
+                task_registry.save_status(self.task_id, self.to_dict())
+            except Exception as e:
+                logger.error(f"同步任务 {self.task_id} 状态失败: {str(e)}")
+        if self.task_id and task_events.should_publish(self.task_id):
+            publish_task_events(self, previous_stage)
         
+    def estimated_size(self) -> int:
+        """任务在内存中占用的大致字节数，主要是预编码的结果模块"""
+        return 1024 + sum(len(body) for body in self.modules.values())
+
     def to_dict(self):
         """转换为字典"""
         return {
@@ -134,74 +228,389 @@ class TaskStatus:
             "stage": self.stage,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
-            "error": self.error
+            "error": self.error,
+            "active_nodes": self.active_nodes,
+            "analysis_type": self.analysis_type
         }
 
+    @classmethod
+    def from_dict(cls, task_id: str, data: Dict[str, Any]) -> "TaskStatus":
+        """从注册表中的状态行还原任务对象(不加载结果)"""
+        task = cls(data.get("company_name"), task_id=task_id)
+        task.refresh(data)
+        return task
+
+    def refresh(self, data: Dict[str, Any]):
+        """用注册表中的状态行覆盖当前状态"""
+        self.company_name = data.get("company_name") or self.company_name
+        self.stock_code = data.get("stock_code")
+        self.status = data.get("status") or self.status
+        self.progress = data.get("progress") or 0
+        self.message = data.get("message") or self.message
+        self.stage = data.get("stage") or self.stage
+        self.error = data.get("error")
+        self.active_nodes = data.get("active_nodes") or []
+        self.analysis_type = data.get("analysis_type") or self.analysis_type
+        for field in ("created_at", "updated_at"):
+            value = data.get(field)
+            if value:
+                try:
+                    setattr(self, field, datetime.fromisoformat(value))
+                except ValueError:
+                    pass
+        self._result_persisted = self.status == "completed"
+
+def publish_task_events(task: TaskStatus, previous_stage: str):
+    """根据任务状态变化向订阅者推送事件
+
+    - stage: 阶段发生变化
+    - progress: 每次状态更新
+    - module: 任务完成时每个结果模块可获取
+    - completed / failed: 任务结束
+    """
+    snapshot = task.to_dict()
+    if task.stage != previous_stage:
+        task_events.publish(task.task_id, TaskEvent("stage", {"stage": task.stage, "previous_stage": previous_stage}))
+    task_events.publish(task.task_id, TaskEvent("progress", snapshot))
+    if task.status == "completed":
+        result = task.result if isinstance(task.result, dict) else {}
+        for module in result.get("modules", []):
+            task_events.publish(task.task_id, TaskEvent("module", module))
+        task_events.publish(task.task_id, TaskEvent("completed", snapshot))
+    elif task.status in ("failed", "cancelled"):
+        task_events.publish(task.task_id, TaskEvent(task.status, snapshot))
+
+def spill_evicted_task(task_id: str, task: TaskStatus):
+    """任务从内存淘汰前，将尚未持久化的结果写入注册表"""
+    if task.status == "completed" and task._result is not None and not task._result_persisted:
+        task_registry.save_status(task_id, task.to_dict())
+        task_registry.save_result(task_id, task._result)
+        if task.modules:
+            task_registry.save_modules(task_id, task.modules)
+
+# 用于存储任务状态的有界内存缓存，持久化由 task_registry 负责
+# 任务结果与状态分开存储，结果在首次访问时才从注册表加载
+task_store = TaskCache(
+    max_tasks=TASK_CACHE_MAX_TASKS,
+    max_bytes=TASK_CACHE_MAX_BYTES,
+    ttl_by_status={"completed": TASK_CACHE_TTL_COMPLETED, "failed": TASK_CACHE_TTL_FAILED, "cancelled": TASK_CACHE_TTL_FAILED},
+    size_of=TaskStatus.estimated_size,
+    on_evict=spill_evicted_task,
+)
+
 # 加载已有的任务数据
 def load_task_store():
-    """从本地文件加载任务存储"""
-    global task_store
+    """迁移旧版任务文件，任务状态在首次访问时从注册表加载"""
     try:
-        if os.path.exists(TASK_STORE_FILE):
-            with open(TASK_STORE_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # 转换回TaskStatus对象
-                for task_id, task_data in data.items():
-                    status = TaskStatus(task_data['company_name'])
-                    status.__dict__.update(task_data)
-                    task_store[task_id] = status
-            logger.info(f"从 {TASK_STORE_FILE} 加载了 {len(task_store)} 个任务")
+        # 首次启动时迁移旧版的整文件JSON存储
+        imported = task_registry.import_legacy_json(LEGACY_TASK_STORE_FILE)
+        if imported:
+            logger.info(f"从 {LEGACY_TASK_STORE_FILE} 迁移了 {imported} 个任务")
     except Exception as e:
         logger.error(f"加载任务存储失败: {str(e)}")
 
-# 保存任务数据到本地文件
-def save_task_store():
-    """保存任务存储到本地文件"""
+# 保存单个任务到注册表
+def save_task(task_id: str, with_result: bool = False):
+    """保存单个任务的状态，可选同时保存结果"""
+    task = task_store.get(task_id)
+    if task is None:
+        return
     try:
-        # 确保目录存在
-        os.makedirs(os.path.dirname(TASK_STORE_FILE), exist_ok=True)
-        
-        # 将TaskStatus对象转换为可序列化的字典
-        serializable_data = {}
-        for task_id, task in task_store.items():
-            task_dict = task.to_dict()
-            # 添加结果数据
-            if hasattr(task, 'result') and task.result:
-                task_dict['result'] = task.result
-            serializable_data[task_id] = task_dict
-            
-        with open(TASK_STORE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(serializable_data, f, ensure_ascii=False, indent=2)
-        logger.info(f"保存了 {len(task_store)} 个任务到 {TASK_STORE_FILE}")
+        task_registry.save_status(task_id, task.to_dict())
+        if with_result and task._result is not None:
+            task_registry.save_result(task_id, task._result)
+            if task.modules:
+                task_registry.save_modules(task_id, task.modules)
+            task._result_persisted = True
     except Exception as e:
-        logger.error(f"保存任务存储失败: {str(e)}")
+        logger.error(f"保存任务 {task_id} 失败: {str(e)}")
+
+def get_task(task_id: str) -> Optional[TaskStatus]:
+    """获取任务，内存中不存在时从注册表加载
+    
+    共享注册表下，由其他进程执行且尚未结束的任务每次从注册表刷新状态
+    """
+    task = task_store.get(task_id)
+    if task is None:
+        task_data = task_registry.load_status(task_id)
+        if task_data is not None:
+            task = TaskStatus.from_dict(task_id, task_data)
+            task_store[task_id] = task
+    elif task_registry.shared and not task.owned and task.status in ("pending", "processing"):
+        task_data = task_registry.load_status(task_id)
+        if task_data is not None:
+            task.refresh(task_data)
+    return task
 
 # 在应用启动时加载任务存储
 load_task_store()
 
+def run_analysis_job(task_id: str, company_name: str, analysis_type: str = "综合分析", force_refresh: bool = False):
+    """调度器工作线程的入口，记录排队等待时间后执行分析"""
+    queue_info = analysis_scheduler.queue_info(task_id)
+    if queue_info:
+        logger.info(f"任务 {task_id} 开始执行，排队等待 {queue_info['wait_seconds']}s")
+    try:
+        process_stock_analysis(task_id, company_name, analysis_type, force_refresh)
+    finally:
+        release_inflight_task(task_id)
+
+def fail_abandoned_job(job: Dict[str, Any]):
+    """共享队列中执行进程崩溃且重试次数用尽的任务：标记为失败并释放去重键"""
+    task_id = job["job_id"]
+    task = get_task(task_id)
+    if task is not None and task.status in ("pending", "processing"):
+        task.update(status="failed", message="执行任务的工作进程已退出", error="工作进程失去心跳", stage="错误")
+        save_task(task_id)
+    release_inflight_task(task_id)
+
+# 分析任务调度器：限制并发工作流数量，队列满时拒绝新任务
+# 共享注册表下使用Redis队列，任何进程的工作线程都可以领取任务
+if task_registry.shared:
+    analysis_scheduler = RedisAnalysisScheduler(
+        cache.client,
+        handlers={"run_analysis_job": run_analysis_job},
+        max_workers=ANALYSIS_MAX_WORKERS,
+        max_queue_size=ANALYSIS_QUEUE_SIZE,
+        batch_max_active=ANALYSIS_BATCH_MAX_ACTIVE,
+        lease_seconds=ANALYSIS_WORKER_LEASE,
+        max_attempts=ANALYSIS_JOB_MAX_ATTEMPTS,
+        on_abandoned=fail_abandoned_job,
+    )
+else:
+    analysis_scheduler = AnalysisScheduler(
+        max_workers=ANALYSIS_MAX_WORKERS,
+        max_queue_size=ANALYSIS_QUEUE_SIZE,
+        batch_max_active=ANALYSIS_BATCH_MAX_ACTIVE,
+    )
+
+def collect_runtime_metrics():
+    """抓取指标前刷新工作线程池、队列和内存任务缓存的状态"""
+    stats = analysis_scheduler.stats()
+    WORKERS.set(stats["active_workers"], state="active")
+    WORKERS.set(stats["max_workers"], state="max")
+    WORKER_UTILIZATION.set(stats["active_workers"] / stats["max_workers"] if stats["max_workers"] else 0.0)
+    for lane, depth in stats["queued_by_lane"].items():
+        QUEUE_DEPTH.set(depth, lane=lane)
+    cache_stats = task_store.stats()
+    TASKS_IN_MEMORY.set(cache_stats["tasks"])
+    TASK_MEMORY_BYTES.set(cache_stats["bytes"])
+
+metrics_registry.add_collector(collect_runtime_metrics)
+
+def enqueue_analysis_task(task_id: str, task: "TaskStatus", request: "StockAnalysisRequest"):
+    """登记任务并提交到调度器，队列已满时返回429"""
+    task.analysis_type = request.analysis_type
+    previous = task_store.get(task_id)
+    task_store[task_id] = task
+    try:
+        position = analysis_scheduler.submit(
+            task_id,
+            run_analysis_job,
+            task_id,
+            request.company_name,
+            request.analysis_type,
+            request.force_refresh,
+            lane=request.priority,
+        )
+    except QueueFullError as e:
+        task_store.pop(task_id, None)
+        release_inflight_task(task_id)
+        logger.warning(f"拒绝任务 {task_id}: {str(e)}")
+        raise HTTPException(status_code=429, detail="分析任务过多，请稍后重试", headers={"Retry-After": "30"})
+    except DuplicateJobError as e:
+        # 同一任务已在执行，保留原有的任务对象和去重键
+        if previous is None:
+            task_store.pop(task_id, None)
+        elif previous is not task:
+            task_store[task_id] = previous
+        logger.warning(f"拒绝重复提交的任务 {task_id}: {str(e)}")
+        raise HTTPException(status_code=409, detail="该任务已在队列中或正在运行")
+    except ValueError as e:
+        task_store.pop(task_id, None)
+        release_inflight_task(task_id)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    task.update(message=f"任务排队中，当前排队位置: {position}", stage="排队中")
+    save_task(task_id)
+    return position
+
+def resubmit_task(task_id: str, task: "TaskStatus", analysis_type: Optional[str] = None, priority: str = "interactive") -> str:
+    """重新提交失败、已取消或被中断的任务，工作流从检查点中最后完成的节点继续
+
+    相同股票的分析已在进行时不重新提交，返回进行中的任务ID。
+    分析类型改变时工作流的节点不同，丢弃旧的检查点从头运行
+    """
+    analysis_type = analysis_type or task.analysis_type
+    inflight_task_id = claim_inflight_task(task_id, task.company_name, task.stock_code, analysis_type)
+    if inflight_task_id and inflight_task_id != task_id:
+        return inflight_task_id
+    if analysis_type != task.analysis_type:
+        clear_thread(get_checkpointer(), task_id)
+    with run_contexts_lock:
+        pending_cancels.pop(task_id, None)
+    if task_registry.shared:
+        task_registry.clear_cancel(task_id)
+    task.error = None
+    task.analysis_type = analysis_type
+    task.update(status="pending", progress=0, message="任务已重新提交", stage="初始化")
+    request = StockAnalysisRequest(
+        company_name=task.company_name,
+        stock_code=task.stock_code,
+        analysis_type=analysis_type,
+        priority=priority,
+    )
+    enqueue_analysis_task(task_id, task, request)
+    return task_id
+
+def preload_workflow():
+    """在后台编译工作流、创建共享的模型客户端并启动图表渲染进程，避免首个分析任务承担导入和初始化开销"""
+    try:
+        from core.workflow import get_compiled_workflow
+        from core.model import get_model_manager
+        get_compiled_workflow()
+        get_model_manager()
+        chart_pool = get_chart_pool()
+        if chart_pool is not None:
+            chart_pool.warm()
+        logger.info("工作流模块预加载完成")
+    except Exception as e:
+        logger.error(f"预加载工作流失败: {str(e)}")
+
+@app.on_event("startup")
+def warm_stock_resolver():
+    """启动后在后台加载本地股票索引和工作流，不阻塞服务启动
+    
+    FAST_START 模式下不做任何预热，全部推迟到首次使用(用于测试和快速扩容)
+    """
+    if FAST_START:
+        logger.info("快速启动模式：跳过预热")
+        return
+    threading.Thread(target=get_stock_resolver, name="warm-stock-resolver", daemon=True).start()
+    threading.Thread(target=get_stock_search_index, name="warm-stock-search", daemon=True).start()
+    threading.Thread(target=preload_workflow, name="preload-workflow", daemon=True).start()
+
+@app.on_event("startup")
+def resume_interrupted_tasks():
+    """重新提交上次服务停止时排队或运行中的任务，有检查点的任务从中断处继续
+
+    共享注册表下排队的任务保存在Redis队列中，不需要重新提交；
+    崩溃的工作进程领取的任务由调度器的回收线程按心跳重新入队或标记失败
+    """
+    if task_registry.shared:
+        return
+    for task_id in task_registry.unfinished_tasks():
+        task = get_task(task_id)
+        if task is None:
+            continue
+        try:
+            resubmit_task(task_id, task, priority="batch")
+            logger.info(f"重新提交中断的任务 {task_id} - 公司: {task.company_name}")
+        except HTTPException as e:
+            task.update(status="failed", message=f"服务重启后无法重新提交: {e.detail}", error=str(e.detail), stage="错误")
+            save_task(task_id)
+
+VISUALIZATION_MODULES = ("visualizations", "report")
+
+def iter_saved_visualization_bodies():
+    """仍会被返回给前端的结果中包含图表地址的模块
+
+    只包括每个 (股票代码, 分析类型) 最近完成的任务、内存中的任务和本地结果缓存，
+    更早的任务结果不再固定其图表，由清理线程按保留数量和磁盘配额回收
+    """
+    for task_id in task_registry.latest_completed_tasks():
+        for module_type in VISUALIZATION_MODULES:
+            body = task_registry.load_module(task_id, module_type)
+            if body is not None:
+                yield body
+    for task_id, task in task_store.items():
+        for module_type in VISUALIZATION_MODULES:
+            # 只读取不放入任务对象，避免清理时增加内存缓存的占用
+            body = task.modules.get(module_type)
+            if body is None and task.status == "completed":
+                body = task_registry.load_module(task_id, module_type)
+            if body is not None:
+                yield body
+    cache_root = os.path.join("database", "cache")
+    if not os.path.isdir(cache_root):
+        return
+    for entry in os.scandir(cache_root):
+        # 每个模块单独一个文件的缓存目录，以及旧版的整体JSON缓存文件
+        paths = [os.path.join(entry.path, f"{module_type}.json") for module_type in VISUALIZATION_MODULES] if entry.is_dir() else [entry.path]
+        for path in paths:
+            if path.endswith(".json") and os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    yield f.read()
+
+def referenced_visualization_runs():
+    """仍被最近的结果引用的可视化运行目录，清理时保留"""
+    return referenced_runs(iter_saved_visualization_bodies())
+
+# 可视化输出清理线程：每只股票只保留最近的运行，并限制总磁盘占用，不删除仍被最近结果引用的运行
+visualization_gc = VisualizationGC(pinned_runs=referenced_visualization_runs)
+# 节点输出缓存清理线程：删除过期记录并限制缓存目录大小
+node_memo_sweeper = NodeMemoSweeper()
+
+@app.on_event("startup")
+def start_visualization_gc():
+    visualization_gc.start()
+    node_memo_sweeper.start()
+
+def task_status_of(task_id: str) -> Optional[str]:
+    status = task_registry.load_status(task_id)
+    return status.get("status") if status else None
+
+# 工作流检查点清理线程：失败、已取消的任务的检查点超过保留时间后删除
+checkpoint_pruner = CheckpointPruner(task_status_of)
+
+@app.on_event("startup")
+def start_checkpoint_pruner():
+    """在中断的任务重新提交之后启动，首次清理不会删除这些任务的检查点"""
+    checkpoint_pruner.start()
+
+@app.on_event("shutdown")
+def shutdown_analysis_scheduler():
+    """服务关闭时停止调度器接收新任务，并关闭图表渲染进程和清理线程"""
+    analysis_scheduler.shutdown()
+    shutdown_chart_pool()
+    visualization_gc.stop()
+    node_memo_sweeper.stop()
+    checkpoint_pruner.stop()
+    if task_events.relay is not None:
+        task_events.relay.stop()
+
+# 结果模块类型
+RESULT_MODULES = ("basic_info", "market_data", "financial_data", "research_data", "visualizations", "report")
+
 # 缓存辅助函数
 def generate_cache_key(stock_code: str, analysis_type: str = "综合分析") -> str:
     """根据股票代码和分析类型生成缓存键"""
     today = datetime.now().strftime("%Y%m%d")
     return f"stock_analysis:{stock_code}:{analysis_type}:{today}"
 
-def generate_task_id(company_name: str, stock_code: str = None) -> str:
-    """生成与公司名称和股票代码关联的任务ID
+# 任务ID中使用的分析类型标识，保证ID可以直接放在URL路径中
+ANALYSIS_TYPE_TAGS = {"综合分析": "full", "技术面分析": "technical", "基本面分析": "fundamental"}
+
+def analysis_type_tag(analysis_type: str) -> str:
+    return ANALYSIS_TYPE_TAGS.get(analysis_type) or hashlib.sha1(analysis_type.encode("utf-8")).hexdigest()[:8]
+
+def generate_task_id(company_name: str, stock_code: str = None, analysis_type: str = "综合分析") -> str:
+    """生成与公司名称、股票代码和分析类型关联的任务ID
     
-    如果存在相同公司的已完成任务，则返回该任务ID
+    如果存在相同公司、相同分析类型的已完成任务，则返回该任务ID
     否则创建新的任务ID
     """
-    # 查找已有的已完成任务
-    for task_id, task in task_store.items():
-        if (task.company_name == company_name or 
-            (stock_code and task.stock_code == stock_code)) and task.status == "completed":
-            logger.info(f"找到已有的任务: {task_id} 对应公司: {company_name}")
-            return task_id
+    # 查找已有的已完成任务：先查内存缓存的索引，再查注册表的索引
+    task_id = (task_store.find(company_name, stock_code, analysis_type=analysis_type)
+               or task_registry.find_completed_task(company_name, stock_code, analysis_type))
+    if task_id:
+        logger.info(f"找到已有的任务: {task_id} 对应公司: {company_name}")
+        return task_id
             
     # 没有找到已有任务，创建新ID
     if stock_code:
-        # 使用股票代码作为基础生成一个确定性但唯一的ID
-        task_id = f"task_{stock_code}_{int(time.time())}"
+        # 不同分析类型运行不同的工作流，检查点按任务ID保存，同一秒内的请求也不能共用ID
+        task_id = f"task_{stock_code}_{analysis_type_tag(analysis_type)}_{uuid.uuid4().hex[:8]}"
     else:
         # 否则使用UUID
         task_id = str(uuid.uuid4())
@@ -209,47 +618,262 @@ def generate_task_id(company_name: str, stock_code: str = None) -> str:
     logger.info(f"创建新任务ID: {task_id}")
     return task_id
 
-def get_cached_result(stock_code: str, analysis_type: str = "综合分析") -> Optional[Dict]:
-    """从缓存获取分析结果"""
+# 进行中任务的去重索引: (标识类型, 标识, 分析类型) -> task_id
+# 相同股票和分析类型的并发请求共享同一个正在运行的任务
+inflight_tasks: Dict[tuple, str] = {}
+inflight_keys_by_task: Dict[str, set] = {}
+inflight_lock = threading.Lock()
+
+def make_inflight_keys(company_name: str, stock_code: Optional[str], analysis_type: str) -> List[tuple]:
+    """生成进行中任务的去重键，股票代码优先于公司名称"""
+    keys = []
+    if stock_code:
+        keys.append(("code", stock_code.strip(), analysis_type))
+    if company_name:
+        keys.append(("name", company_name.strip(), analysis_type))
+    return keys
+
+def claim_inflight_task(task_id: str, company_name: str, stock_code: Optional[str], analysis_type: str) -> Optional[str]:
+    """原子地查找或登记进行中的任务
+
+    如果已有相同股票和分析类型的任务在排队或运行，返回该任务ID；
+    否则将 task_id 登记为该股票的进行中任务并返回None
+    """
+    keys = make_inflight_keys(company_name, stock_code, analysis_type)
+    if task_registry.shared:
+        return task_registry.claim_inflight(task_id, keys)
+    with inflight_lock:
+        for key in keys:
+            existing_id = inflight_tasks.get(key)
+            if existing_id is None:
+                continue
+            existing = get_task(existing_id)
+            # 任务对象尚未登记时说明另一请求正在创建该任务，同样视为进行中
+            if existing is None or existing.status in ("pending", "processing"):
+                return existing_id
+            # 索引中残留的已结束任务，直接清理
+            inflight_tasks.pop(key, None)
+        for key in keys:
+            inflight_tasks[key] = task_id
+        inflight_keys_by_task.setdefault(task_id, set()).update(keys)
+    return None
+
+def add_inflight_alias(task_id: str, stock_code: str, analysis_type: str):
+    """任务解析出股票代码后，追加按股票代码的去重键"""
+    key = ("code", stock_code.strip(), analysis_type)
+    if task_registry.shared:
+        task_registry.add_inflight_alias(task_id, key)
+        return
+    with inflight_lock:
+        if task_id in inflight_keys_by_task and key not in inflight_tasks:
+            inflight_tasks[key] = task_id
+            inflight_keys_by_task[task_id].add(key)
+
+def release_inflight_task(task_id: str):
+    """任务结束后移除其去重键"""
+    if task_registry.shared:
+        task_registry.release_inflight(task_id)
+        return
+    with inflight_lock:
+        for key in inflight_keys_by_task.pop(task_id, set()):
+            if inflight_tasks.get(key) == task_id:
+                inflight_tasks.pop(key, None)
+
+def split_result_modules(data: Dict[str, Any]) -> Dict[str, Any]:
+    """将完整的分析结果拆分为各个结果模块"""
+    return {
+        # 基本信息模块 - 公司基础信息
+        "basic_info": data.get("basic_info", {}),
+        # 市场数据模块 - 交易数据、板块数据、技术指标
+        "market_data": data.get("market_data", {}),
+        # 财务数据模块 - 各种财务指标
+        "financial_data": data.get("financial_data", {}),
+        # 研究数据模块 - 分析师报告、新闻
+        "research_data": data.get("research_data", {}),
+        # 可视化模块 - 各种图表的URL和描述信息
+        "visualizations": {
+            "visualization_paths": data.get("visualization_paths", []),
+            "graph_description": data.get("graph_description", [])
+        },
+        # 综合报告模块 - 包含所有报告文本和图表
+        "report": data.get("report_state", {}),
+    }
+
+def encode_result_modules(data: Dict[str, Any]) -> Dict[str, bytes]:
+    """拆分结果并将每个模块预编码为JSON字节，接口直接返回，无需再次序列化
+    
+    包含表格数据的模块同时预编码一份紧凑的按列格式，键为 "{module}@compact"
+    """
+    modules = {
+        module_type: dumps_json(module_data)
+        for module_type, module_data in split_result_modules(data).items()
+    }
+    for module_type in COMPACT_MODULES:
+        modules[compact_key(module_type)] = encode_compact_module(modules[module_type])
+    return modules
+
+def get_local_cache_dir(stock_code: str, analysis_type: str) -> str:
+    """本地文件缓存目录，每个模块单独一个文件"""
+    return os.path.join("database", "cache", f"{stock_code}_{analysis_type.replace(' ', '_')}")
+
+def get_cached_result(stock_code: str, analysis_type: str = "综合分析") -> Optional[Dict[str, bytes]]:
+    """从缓存获取分析结果，返回各模块预编码的JSON字节"""
     # 首先尝试从Redis缓存获取
     if cache.available:
         try:
             cache_key = generate_cache_key(stock_code, analysis_type)
-            cached_data = cache.get(cache_key)
+            cached_modules = cache.get_hash(cache_key)
             
-            if cached_data:
+            if cached_modules:
+                CACHE_REQUESTS.inc(tier="redis", result="hit")
                 logger.info(f"从Redis缓存获取到股票{stock_code}的数据")
-                return cached_data
+                return cached_modules
+            CACHE_REQUESTS.inc(tier="redis", result="miss")
         except Exception as e:
             logger.error(f"从Redis缓存获取数据失败: {str(e)}")
     
     # 如果Redis没有数据，尝试从本地文件加载
     try:
-        cache_dir = os.path.join("database", "cache")
-        cache_file = os.path.join(cache_dir, f"{stock_code}_{analysis_type.replace(' ', '_')}.json")
+        cache_dir = get_local_cache_dir(stock_code, analysis_type)
+        if os.path.isdir(cache_dir):
+            local_modules = {}
+            for module_type in RESULT_MODULES + tuple(compact_key(m) for m in COMPACT_MODULES):
+                module_file = os.path.join(cache_dir, f"{module_type}.json")
+                if os.path.exists(module_file):
+                    with open(module_file, 'rb') as f:
+                        local_modules[module_type] = f.read()
+            if local_modules:
+                CACHE_REQUESTS.inc(tier="local", result="hit")
+                logger.info(f"从本地文件缓存获取到股票{stock_code}的数据")
+                return local_modules
+        
+        # 兼容旧版的整体JSON缓存文件
+        cache_file = f"{cache_dir}.json"
         if os.path.exists(cache_file):
             with open(cache_file, 'r', encoding='utf-8') as f:
                 local_cached_data = json.load(f)
+                CACHE_REQUESTS.inc(tier="local", result="hit")
                 logger.info(f"从本地文件缓存获取到股票{stock_code}的数据")
-                return local_cached_data
+                return encode_result_modules(local_cached_data)
     except Exception as e:
         logger.error(f"从本地文件缓存获取数据失败: {str(e)}")
     
+    CACHE_REQUESTS.inc(tier="local", result="miss")
     # 两种缓存都没有找到
     return None
 
-def save_to_cache(stock_code: str, result_data: Dict, analysis_type: str = "综合分析", expire_time: int = REDIS_CACHE_TTL) -> bool:
-    """保存分析结果到缓存"""
-    if not cache.available:
-        return False
+def save_to_cache(stock_code: str, modules: Dict[str, bytes], analysis_type: str = "综合分析", expire_time: int = REDIS_CACHE_TTL) -> bool:
+    """保存各模块的预编码结果到Redis哈希和本地文件缓存"""
+    saved = False
+    if cache.available:
+        try:
+            cache_key = generate_cache_key(stock_code, analysis_type)
+            saved = cache.set_hash(cache_key, modules, expire_time)
+            logger.info(f"缓存保存{'成功' if saved else '失败'} - 股票: {stock_code}")
+        except Exception as e:
+            logger.error(f"保存数据到缓存失败: {str(e)}")
     
+    # 同时保存结果到本地文件
     try:
-        cache_key = generate_cache_key(stock_code, analysis_type)
-        # 直接使用cache.set，内部已经处理JSON序列化
-        return cache.set(cache_key, result_data, expire_time)
+        cache_dir = get_local_cache_dir(stock_code, analysis_type)
+        os.makedirs(cache_dir, exist_ok=True)
+        for module_type, body in modules.items():
+            with open(os.path.join(cache_dir, f"{module_type}.json"), 'wb') as f:
+                f.write(body)
+        logger.info(f"本地缓存保存成功: {cache_dir}")
+        saved = True
     except Exception as e:
-        logger.error(f"保存数据到缓存失败: {str(e)}")
-        return False
+        logger.error(f"保存本地缓存失败: {str(e)}")
+    return saved
+
+def build_modules_info(task_id: str) -> List[Dict[str, str]]:
+    """所有支持的结果模块及其接口地址 - 需要与前端组件相匹配"""
+    return [
+        {"type": module_type, "endpoint": f"/api/v1/stock-analysis/result/{task_id}/{module_type}"}
+        for module_type in RESULT_MODULES
+    ]
+
+def build_result_summary(task_id: str, cached: bool, timings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """任务结果摘要，模块数据单独存储；实际运行的任务附带节点耗时"""
+    summary = {
+        "success": True,
+        "task_id": task_id,
+        "status": "completed",
+        "cached": cached,
+        "modules": build_modules_info(task_id)
+    }
+    if timings is not None:
+        summary["timings"] = timings
+    return summary
+
+def complete_task_from_cache(task_id: str, task: TaskStatus, cached_modules: Dict[str, bytes]):
+    """使用缓存结果直接完成任务"""
+    task.modules = dict(cached_modules)
+    task.update(
+        status="completed",
+        progress=100,
+        message="从缓存获取分析完成",
+        result=build_result_summary(task_id, cached=True),
+        stage="完成(缓存)"
+    )
+    save_task(task_id, with_result=True)
+
+# 正在本进程中运行的任务的运行上下文(core.runtime.RunContext)，用于取消
+run_contexts: Dict[str, Any] = {}
+# 已请求取消、但运行上下文尚未创建的任务(刚从队列取出时的竞态): task_id -> 请求时间
+pending_cancels: Dict[str, float] = {}
+run_contexts_lock = threading.Lock()
+# 取消请求的保留时间，任务由其他进程执行时本进程不会创建其运行上下文
+PENDING_CANCEL_TTL = 600
+
+def prune_pending_cancels():
+    """清理过期的取消请求，以及注册表中已结束的任务的取消请求"""
+    now = time.time()
+    with run_contexts_lock:
+        candidates = list(pending_cancels.items())
+    for task_id, requested_at in candidates:
+        if now - requested_at < PENDING_CANCEL_TTL:
+            status = task_registry.load_status(task_id)
+            if status is not None and status.get("status") in ("pending", "processing"):
+                continue
+        with run_contexts_lock:
+            pending_cancels.pop(task_id, None)
+
+def create_run_context(task_id: str):
+    """创建并登记任务的运行上下文"""
+    from core.runtime import RunContext
+    external_check = (lambda: task_registry.cancel_requested(task_id)) if task_registry.shared else None
+    run_context = RunContext(task_id, external_check=external_check)
+    with run_contexts_lock:
+        run_contexts[task_id] = run_context
+        if pending_cancels.pop(task_id, None) is not None:
+            run_context.cancel()
+    return run_context
+
+def run_workflow_cancellable(company_name: str, progress_callback, run_context, analysis_type: str = "综合分析"):
+    """在调度器的工作线程中运行工作流，取消时中断正在进行的LLM请求并在当前节点结束
+
+    节点和LLM/工具调用开始前检查取消信号；共享HTTP客户端的连接登记在运行上下文中，
+    取消时关闭连接使阻塞的请求立即失败。其他进程发起的取消由监视线程轮询共享注册表
+    """
+    from core.workflow import run_stock_analysis
+    stop_watch = threading.Event()
+
+    def watch():
+        # cancelled 属性会轮询共享注册表，发现取消请求时触发中止回调
+        while not stop_watch.wait(1.0):
+            if run_context.cancelled:
+                return
+
+    watcher = threading.Thread(target=watch, name=f"cancel-watch-{run_context.task_id}", daemon=True)
+    watcher.start()
+    try:
+        return run_stock_analysis(
+            company_name, recursion_limit=100, progress_callback=progress_callback, run_context=run_context,
+            analysis_type=analysis_type
+        )
+    finally:
+        stop_watch.set()
 
 def process_stock_analysis(task_id: str, company_name: str, analysis_type: str = "综合分析", force_refresh: bool = False):
     """
@@ -261,7 +885,14 @@ def process_stock_analysis(task_id: str, company_name: str, analysis_type: str =
         analysis_type: 分析类型
         force_refresh: 是否强制刷新
     """
-    task = task_store[task_id]
+    task = get_task(task_id)
+    if task is None:
+        task = TaskStatus(company_name, task_id=task_id)
+        task_store[task_id] = task
+    task.owned = True
+    task.analysis_type = analysis_type
+    from core.runtime import TaskCancelled
+    run_context = create_run_context(task_id)
     logger.info(f"开始处理任务 {task_id} - 公司: {company_name}")
     # 更新初始状态
     task.update(
@@ -270,67 +901,22 @@ def process_stock_analysis(task_id: str, company_name: str, analysis_type: str =
         message="正在初始化...",
         stage="准备中"
     )
+    save_task(task_id)
     
     try:
-        # 从公司名称获取股票代码
-        stock_code = None
-        try:
-            from tools.stock_info_tools import get_stock_code_by_name
-            task.update(progress=8, message="正在获取股票代码...", stage="数据收集")
-            stock_code = get_stock_code_by_name(company_name)
-            if stock_code:
-                task.update(stock_code=stock_code, progress=12, message=f"成功获取股票代码: {stock_code}", stage="数据收集")
-                logger.info(f"获取到股票代码: {stock_code}")
-        except Exception as e:
-            logger.warning(f"获取股票代码失败: {str(e)}")
+        # 从本地索引解析股票代码
+        stock_code = task.stock_code or resolve_stock_code(company_name)
+        if stock_code:
+            task.update(stock_code=stock_code, progress=12, message=f"成功获取股票代码: {stock_code}", stage="数据收集")
+            add_inflight_alias(task_id, stock_code, analysis_type)
+            logger.info(f"获取到股票代码: {stock_code}")
             
-        # 如果启用了缓存且不是强制刷新，尝试从缓存获取
-        if not force_refresh and cache.available:
-            task.update(progress=15, message="检查缓存数据...", stage="数据收集")
-            cache_key = generate_cache_key(stock_code, analysis_type)
-            cached_result = cache.get(cache_key)
+        # 如果不是强制刷新，尝试从缓存获取
+        if not force_refresh and stock_code:
+            cached_result = get_cached_result(stock_code, analysis_type)
             if cached_result:
                 logger.info(f"从缓存获取到分析结果 - 股票: {stock_code}")
-                task.update(progress=20, message="从缓存获取数据...", stage="数据收集")
-                
-                # 定义所有支持的模块 - 需要与前端组件相匹配
-                modules_info = [
-                    {"type": "basic_info", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/basic_info"},
-                    {"type": "market_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/market_data"},
-                    {"type": "financial_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/financial_data"},
-                    {"type": "research_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/research_data"},
-                    {"type": "visualizations", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/visualizations"},
-                    {"type": "report", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/report"}
-                ]
-                
-                # 模拟加载过程更新进度
-                for progress in range(30, 101, 10):
-                    task.update(
-                        progress=progress,
-                        message=f"从缓存加载数据 ({progress}%)...",
-                        stage="数据加载"
-                    )
-                    time.sleep(0.2)  # 短暂停顿，模拟加载过程
-                
-                # 更新任务为缓存获取完成
-                task.update(
-                    status="completed",
-                    progress=100,
-                    message="从缓存获取分析完成",
-                    result={
-                        "success": True,
-                        "task_id": task_id,
-                        "status": "completed",
-                        "cached": True,
-                        "modules": modules_info,
-                        "data": cached_result
-                    },
-                    stage="完成(缓存)"
-                )
-                
-                # 保存任务状态到本地文件
-                save_task_store()
-                
+                complete_task_from_cache(task_id, task, cached_result)
                 return
                 
         # 执行分析前确保创建存储目录
@@ -347,57 +933,32 @@ def process_stock_analysis(task_id: str, company_name: str, analysis_type: str =
         
         # 执行分析 - 使用更低的递归限制
         # 创建一个进度更新函数，用于在分析过程中更新进度
-        def progress_callback(stage, progress_value, message):
+        def progress_callback(stage, progress_value, message, event=None):
+            if run_context.cancelled:
+                return
             # 将stage和progress调整到适当的范围
             adjusted_progress = 20 + int(progress_value * 0.7)  # 将进度调整到20%-90%之间
+            if event is not None:
+                task.active_nodes = event["active"]
+                # 节点开始/结束事件单独推送，订阅方可以展示并行分支的时间线
+                if task_events.should_publish(task_id):
+                    task_events.publish(task_id, TaskEvent("node", event))
             task.update(progress=adjusted_progress, message=message, stage=stage)
-            # 确保立即写入到响应流中
             logger.info(f"Progress update: {stage} - {adjusted_progress}% - {message}")
             
         # 开始分析前更新进度
         task.update(progress=20, message="开始深度分析...", stage="数据分析")
         
-        # 执行分析
-        results = run_stock_analysis(company_name, recursion_limit=100, progress_callback=progress_callback)
-        
-        # 数据收集阶段完成
-        task.update(progress=65, message="基础数据收集完成，开始分析...", stage="数据分析")
+        # 执行分析(工作流及其依赖在首次使用时导入)，取消时抛出 TaskCancelled
+        # 工作流以流式模式运行，每个节点开始和结束时通过 progress_callback 更新进度
+        run_context.check()
+        results = run_workflow_cancellable(company_name, progress_callback, run_context, analysis_type)
+        timings = results.get("timings") or run_context.timing_summary()
+        logger.info(f"任务 {task_id} 工作流耗时 {timings['total']}s，各节点: {timings['nodes']}")
         
         # 处理结果数据，准备响应格式
-        task.update(progress=75, message="处理分析结果...", stage="结果整理")
-        
-        # 添加一个监听函数来检查特定的完成事件
-        def check_analysis_progress():
-            # 检查报告是否已经生成
-            if "report_state" in results and hasattr(results["report_state"], "text_reports"):
-                reports = results["report_state"].text_reports
-                
-                # 更新进度基于已完成的报告数量
-                completed_reports = 0
-                total_reports = 4  # 基本面、技术面、情感和对抗性分析
-                
-                if "fundamentals_report" in reports:
-                    completed_reports += 1
-                    task.update(progress=65, message="基本面分析已完成", stage="深度分析")
-                
-                if "technical_report" in reports:
-                    completed_reports += 1
-                    task.update(progress=70, message="技术面分析已完成", stage="深度分析")
-                
-                if "sentiment_report" in reports:
-                    completed_reports += 1
-                    task.update(progress=75, message="情感分析已完成", stage="深度分析")
-                
-                if "adversarial_report" in reports:
-                    completed_reports += 1
-                    task.update(progress=85, message="对抗性分析已完成", stage="结果整理")
-                
-                # 如果所有报告都完成了，更新总体进度
-                if completed_reports == total_reports:
-                    task.update(progress=90, message="所有分析已完成，正在生成综合报告...", stage="结果整理")
-        
-        # 检查分析进度
-        check_analysis_progress()
+        task.active_nodes = []
+        task.update(progress=90, message="处理分析结果...", stage="结果整理")
         
         response_data = {
             # 基本信息模块
@@ -430,7 +991,7 @@ def process_stock_analysis(task_id: str, company_name: str, analysis_type: str =
         }
         
         # 安全处理财务数据 - 检查是否为ConnectTimeout
-        task.update(progress=82, message="处理财务数据...", stage="结果整理")
+        task.update(progress=91, message="处理财务数据...", stage="结果整理")
         try:
             if results["financial_data"] is not None:
                 # 检查类型，避免处理非法类型
@@ -442,7 +1003,7 @@ def process_stock_analysis(task_id: str, company_name: str, analysis_type: str =
             logger.error(f"处理财务数据时出错: {str(err)}")
         
         # 转换所有 NumPy 数据类型
-        task.update(progress=90, message="处理数据类型...", stage="结果整理")
+        task.update(progress=92, message="处理数据类型...", stage="结果整理")
         
         # 确保所有数据都能被正确序列化
         # 特别处理研究数据中的日期和Timestamp
@@ -454,59 +1015,40 @@ def process_stock_analysis(task_id: str, company_name: str, analysis_type: str =
                         response_data["research_data"]["analyst_data"]
                     )
         
-        # 应用全局NumPy类型转换
-        converted_response = convert_numpy_types(response_data)
-        
-        # 定义所有支持的模块 - 需要与前端组件相匹配
-        modules_info = [
-            {"type": "basic_info", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/basic_info"},
-            {"type": "market_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/market_data"},
-            {"type": "financial_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/financial_data"},
-            {"type": "research_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/research_data"},
-            {"type": "visualizations", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/visualizations"},
-            {"type": "report", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/report"}
-        ]
+        # 每个模块只编码一次(NumPy类型、日期和NaN在编码时处理)，任务、缓存和接口共用同一份字节
+        modules = encode_result_modules(response_data)
         
         # 保存到缓存
         task.update(progress=95, message="保存分析结果到缓存...", stage="结果整理")
-        if cache.available and results["basic_info"].stock_code:
-            real_stock_code = results["basic_info"].stock_code
-            cache_key = generate_cache_key(real_stock_code, analysis_type)
-            save_success = cache.set(cache_key, converted_response, REDIS_CACHE_TTL)
-            logger.info(f"缓存保存{'成功' if save_success else '失败'} - 股票: {real_stock_code}")
-            
-            # 同时保存结果到本地文件
-            try:
-                cache_dir = os.path.join("database", "cache")
-                os.makedirs(cache_dir, exist_ok=True)
-                cache_file = os.path.join(cache_dir, f"{real_stock_code}_{analysis_type.replace(' ', '_')}.json")
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(converted_response, f, ensure_ascii=False, indent=2)
-                logger.info(f"本地缓存保存成功: {cache_file}")
-            except Exception as e:
-                logger.error(f"保存本地缓存失败: {str(e)}")
+        if results["basic_info"].stock_code:
+            save_to_cache(results["basic_info"].stock_code, modules, analysis_type)
         
         # 更新任务完成状态
+        task.modules = modules
         task.update(
             status="completed", 
             progress=100, 
             message="分析完成", 
-            result={
-                "success": True, 
-                "task_id": task_id,
-                "status": "completed",
-                "cached": False,
-                "modules": modules_info,
-                "data": converted_response
-            },
+            result=build_result_summary(task_id, cached=False, timings=timings),
             stage="完成"
         )
         
-        # 保存任务状态到本地文件
-        save_task_store()
+        # 保存任务状态和结果到注册表
+        save_task(task_id, with_result=True)
         
         logger.info(f"任务 {task_id} 成功完成")
         
+    except TaskCancelled:
+        timings = run_context.timing_summary()
+        logger.info(f"任务 {task_id} 已取消，已执行节点耗时: {timings['nodes']}")
+        task.update(
+            status="cancelled",
+            message="任务已取消",
+            result={"success": False, "task_id": task_id, "status": "cancelled", "timings": timings},
+            stage="已取消"
+        )
+        save_task(task_id, with_result=True)
+        
     except Exception as e:
         error_stack = traceback.format_exc()
         logger.error(f"任务 {task_id} 处理失败: {str(e)}\n{error_stack}")
@@ -519,7 +1061,13 @@ def process_stock_analysis(task_id: str, company_name: str, analysis_type: str =
         )
         
         # 即使失败也保存任务状态
-        save_task_store()
+        save_task(task_id)
+    
+    finally:
+        with run_contexts_lock:
+            run_contexts.pop(task_id, None)
+        if task.status in TERMINAL_EVENTS:
+            ANALYSIS_TASKS.inc(status=task.status)
 
 @app.post("/api/v1/stock-analysis/task")
 async def create_analysis_task(request: StockAnalysisRequest):
@@ -527,45 +1075,24 @@ async def create_analysis_task(request: StockAnalysisRequest):
     创建股票分析任务并立即返回任务ID
     """
     try:
-        # 如果提供了股票代码，先尝试从缓存获取结果
-        if request.stock_code and not request.force_refresh:
-            cached_result = get_cached_result(request.stock_code, request.analysis_type)
+        # 快速路径：通过本地索引解析股票代码，缓存命中时同步完成任务
+        # 模糊匹配的结果可能不是用户想要的股票，不用于直接返回缓存结果，交给工作流确认
+        stock_code = request.stock_code or resolve_stock_code(request.company_name, allow_fuzzy=False)
+        if stock_code and not request.force_refresh:
+            cached_result = get_cached_result(stock_code, request.analysis_type)
             if cached_result:
-                logger.info(f"找到股票 {request.stock_code} 的缓存结果")
+                logger.info(f"找到股票 {stock_code} 的缓存结果")
                 
                 # 使用已有的任务ID或创建新ID
-                task_id = generate_task_id(request.company_name, request.stock_code)
+                task_id = generate_task_id(request.company_name, stock_code, request.analysis_type)
                 
                 # 如果是新任务，初始化并填充结果
-                if task_id not in task_store:
-                    task = TaskStatus(request.company_name)
-                    task.stock_code = request.stock_code
-                    task.status = "completed"
-                    task.progress = 100
-                    task.message = "从缓存加载数据完成"
-                    task.stage = "完成(缓存)"
-                    
-                    # 定义所有支持的模块
-                    modules_info = [
-                        {"type": "basic_info", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/basic_info"},
-                        {"type": "market_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/market_data"},
-                        {"type": "financial_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/financial_data"},
-                        {"type": "research_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/research_data"},
-                        {"type": "visualizations", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/visualizations"},
-                        {"type": "report", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/report"}
-                    ]
-                    
-                    task.result = {
-                        "success": True,
-                        "task_id": task_id,
-                        "status": "completed",
-                        "cached": True,
-                        "modules": modules_info,
-                        "data": cached_result
-                    }
-                    
+                if get_task(task_id) is None:
+                    task = TaskStatus(request.company_name, task_id=task_id)
+                    task.stock_code = stock_code
+                    task.analysis_type = request.analysis_type
                     task_store[task_id] = task
-                    save_task_store()
+                    complete_task_from_cache(task_id, task, cached_result)
                 
                 return {
                     "success": True, 
@@ -574,10 +1101,12 @@ async def create_analysis_task(request: StockAnalysisRequest):
                 }
         
         # 创建任务ID，可能复用已有任务
-        task_id = generate_task_id(request.company_name, request.stock_code)
+        task_id = generate_task_id(request.company_name, stock_code, request.analysis_type)
         
-        # 如果是已完成的任务且不需要强制刷新，直接返回
-        if task_id in task_store and task_store[task_id].status == "completed" and not request.force_refresh:
+        # 如果是相同分析类型的已完成任务且不需要强制刷新，直接返回
+        existing_task = get_task(task_id)
+        if (existing_task is not None and existing_task.status == "completed" and not request.force_refresh
+                and existing_task.analysis_type == request.analysis_type):
             logger.info(f"复用已完成的任务 {task_id}")
             return {
                 "success": True, 
@@ -585,44 +1114,138 @@ async def create_analysis_task(request: StockAnalysisRequest):
                 "message": "任务已创建，使用已有结果"
             }
         
+        # 相同股票和分析类型的任务正在进行时，附加到该任务并共享结果
+        inflight_task_id = claim_inflight_task(task_id, request.company_name, stock_code, request.analysis_type)
+        if inflight_task_id:
+            logger.info(f"请求附加到进行中的任务 {inflight_task_id} - 公司: {request.company_name}")
+            return {
+                "success": True,
+                "task_id": inflight_task_id,
+                "message": "相同的分析正在进行中，已关联到该任务"
+            }
+        
         # 否则初始化新任务或重置旧任务
-        task = TaskStatus(request.company_name)
-        if request.stock_code:
-            task.stock_code = request.stock_code
-        task_store[task_id] = task
+        task = TaskStatus(request.company_name, task_id=task_id)
+        if stock_code:
+            task.stock_code = stock_code
         
+        # 提交到调度器，由有界工作线程池处理
+        enqueue_analysis_task(task_id, task, request)
         logger.info(f"创建任务 {task_id} - 公司: {request.company_name}")
         
-        # 启动后台线程处理任务
-        thread = threading.Thread(
-            target=process_stock_analysis,
-            args=(task_id, request.company_name, request.analysis_type, request.force_refresh)
-        )
-        thread.daemon = True
-        thread.start()
-        
         return {
             "success": True, 
             "task_id": task_id, 
             "message": "任务已创建，请使用任务ID查询进度"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         error_stack = traceback.format_exc()
         logger.error(f"创建任务失败: {str(e)}\n{error_stack}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.delete("/api/v1/stock-analysis/task/{task_id}")
+async def cancel_analysis_task(task_id: str):
+    """
+    取消分析任务
+    
+    - 排队中的任务直接从队列移除
+    - 运行中的任务中断正在进行的LLM请求，在当前节点停止
+    """
+    try:
+        task = get_task(task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        if task.status not in ("pending", "processing"):
+            raise HTTPException(status_code=409, detail=f"任务已结束，状态: {task.status}")
+        
+        # 尚未开始运行的任务：从队列中移除后直接标记为已取消
+        if analysis_scheduler.cancel(task_id):
+            task.update(status="cancelled", message="任务已取消", stage="已取消")
+            save_task(task_id)
+            release_inflight_task(task_id)
+            return {"success": True, "task_id": task_id, "status": "cancelled"}
+        
+        prune_pending_cancels()
+        with run_contexts_lock:
+            run_context = run_contexts.get(task_id)
+            if run_context is None:
+                # 任务刚从队列取出，运行上下文创建时会看到取消请求
+                pending_cancels[task_id] = time.time()
+        if run_context is not None:
+            run_context.cancel()
+        elif task_registry.shared:
+            # 任务可能由其他进程执行，通过共享注册表通知
+            task_registry.request_cancel(task_id)
+        
+        task.update(message="正在取消任务...")
+        return {"success": True, "task_id": task_id, "status": "cancelling"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_stack = traceback.format_exc()
+        logger.error(f"取消任务失败: {str(e)}\n{error_stack}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/stock-analysis/task/{task_id}/retry")
+async def retry_analysis_task(task_id: str, analysis_type: Optional[str] = None, priority: str = "interactive"):
+    """
+    重试失败或已取消的任务
+    
+    工作流从检查点中最后完成的节点继续，已生成的报告和图表不会重新生成
+    """
+    try:
+        task = get_task(task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        if task.status not in ("failed", "cancelled"):
+            raise HTTPException(status_code=409, detail=f"只能重试失败或已取消的任务，当前状态: {task.status}")
+        
+        from core.checkpoint import has_checkpoint
+        resumable = await asyncio.to_thread(has_checkpoint, task_id)
+        submitted_id = resubmit_task(task_id, task, analysis_type, priority)
+        if submitted_id != task_id:
+            return {
+                "success": True,
+                "task_id": submitted_id,
+                "message": "相同的分析正在进行中，已关联到该任务"
+            }
+        logger.info(f"重试任务 {task_id}，{'从检查点继续' if resumable else '从头开始'}")
+        return {
+            "success": True,
+            "task_id": task_id,
+            "resumed": resumable,
+            "message": "任务已重新提交，将从上次完成的节点继续" if resumable else "任务已重新提交"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_stack = traceback.format_exc()
+        logger.error(f"重试任务失败: {str(e)}\n{error_stack}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/v1/stock-analysis/progress/{task_id}")
 async def get_task_progress(task_id: str):
     """
     获取任务进度
     """
     try:
-        if task_id not in task_store:
+        task = get_task(task_id)
+        if task is None:
             raise HTTPException(status_code=404, detail="任务不存在")
-        
-        task = task_store[task_id]
-        return task.to_dict()
+        progress = task.to_dict()
+        # 附加排队信息：通道、排队位置、队列深度和等待时间
+        queue_info = analysis_scheduler.queue_info(task_id)
+        if queue_info:
+            progress["queue"] = queue_info
+        # 已结束的任务附带节点耗时，已取消的任务只包含已执行的部分
+        if task.status in ("completed", "cancelled") and isinstance(task.result, dict) and task.result.get("timings"):
+            progress["timings"] = task.result["timings"]
+        return progress
         
     except HTTPException:
         raise
@@ -631,42 +1254,98 @@ async def get_task_progress(task_id: str):
         logger.error(f"获取任务进度失败: {str(e)}\n{error_stack}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# 推送通道心跳间隔(秒)
+STREAM_HEARTBEAT_INTERVAL = 15
+
+def initial_task_event(task: TaskStatus) -> TaskEvent:
+    """订阅时首先发送的事件：已结束的任务直接发送结束事件"""
+    snapshot = task.to_dict()
+    if task.status in TERMINAL_EVENTS:
+        return TaskEvent(task.status, snapshot)
+    return TaskEvent("progress", snapshot)
+
+@app.get("/api/v1/stock-analysis/stream/{task_id}")
+async def stream_task_progress(task_id: str, request: Request):
+    """
+    以Server-Sent Events推送任务进度，替代轮询progress接口
+
+    事件类型: progress, stage, node, module, completed, failed, cancelled
+    """
+    task = get_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    async def event_generator():
+        subscription = task_events.subscribe(task_id)
+        try:
+            event = initial_task_event(task)
+            yield event.sse()
+            if event.terminal:
+                return
+            while True:
+                event = await subscription.get(timeout=STREAM_HEARTBEAT_INTERVAL)
+                if event is None:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event.sse()
+                if event.terminal:
+                    return
+        finally:
+            task_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/v1/stock-analysis/ws/{task_id}")
+async def websocket_task_progress(websocket: WebSocket, task_id: str):
+    """
+    以WebSocket推送任务进度，消息格式: {"event": 事件类型, "data": 事件数据}
+    """
+    task = get_task(task_id)
+    if task is None:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    subscription = task_events.subscribe(task_id)
+    try:
+        event = initial_task_event(task)
+        await websocket.send_text(event.ws())
+        while not event.terminal:
+            event = await subscription.get(timeout=STREAM_HEARTBEAT_INTERVAL)
+            if event is None:
+                event = TaskEvent("heartbeat", {})
+            await websocket.send_text(event.ws())
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        task_events.unsubscribe(subscription)
+
 @app.get("/api/v1/stock-analysis/result/{task_id}")
 async def get_task_result(task_id: str):
     """
     获取任务结果摘要信息
     """
     try:
-        if task_id not in task_store:
+        task = get_task(task_id)
+        if task is None:
             raise HTTPException(status_code=404, detail="任务不存在")
         
-        task = task_store[task_id]
-        
         if task.status == "completed":
-            # 为减小响应大小，仅返回任务状态和模块信息
+            # 为减小响应大小，仅返回任务ID、状态、缓存状态和模块信息
             result = task.result
-            if isinstance(result, dict) and "data" in result:
-                # 定义所有支持的模块 - 需要与前端组件相匹配
-                modules_info = [
-                    {"type": "basic_info", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/basic_info"},
-                    {"type": "market_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/market_data"},
-                    {"type": "financial_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/financial_data"},
-                    {"type": "research_data", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/research_data"},
-                    {"type": "visualizations", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/visualizations"},
-                    {"type": "report", "endpoint": f"/api/v1/stock-analysis/result/{task_id}/report"}
-                ]
-                
-                # 返回任务ID、状态、缓存状态和模块信息
-                return {
-                    "success": True,
-                    "task_id": task_id,
-                    "status": "completed",
-                    "cached": result.get("cached", False),
-                    "modules": modules_info
-                }
-            return result
+            cached = result.get("cached", False) if isinstance(result, dict) else False
+            return build_result_summary(task_id, cached=cached)
         elif task.status == "failed":
             raise HTTPException(status_code=500, detail=task.error or "任务执行失败")
+        elif task.status == "cancelled":
+            raise HTTPException(status_code=410, detail="任务已取消")
         else:
             raise HTTPException(status_code=202, detail="任务仍在处理中")
         
@@ -677,8 +1356,54 @@ async def get_task_result(task_id: str):
         logger.error(f"获取任务结果失败: {str(e)}\n{error_stack}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def module_response(body: bytes, media_type: str, request: Request) -> Response:
+    """按 Accept-Encoding 压缩模块响应，需要压缩的响应体在线程池中压缩，不阻塞事件循环"""
+    accept_encoding = request.headers.get("accept-encoding")
+    if len(body) >= MIN_COMPRESS_SIZE:
+        body, encoding = await asyncio.to_thread(compress_body, body, accept_encoding)
+    else:
+        body, encoding = compress_body(body, accept_encoding)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def split_query_list(value: Optional[str]) -> Optional[List[str]]:
+    """解析逗号分隔的查询参数"""
+    if not value:
+        return None
+    items = [item.strip() for item in value.split(",") if item.strip()]
+    return items or None
+
+def render_module_slice(body: bytes, response_format: str, series: Optional[List[str]], slice_args: Dict[str, Any]):
+    """解码模块，切片后按请求的格式重新编码，返回(响应体, 媒体类型)
+
+    紧凑格式和Arrow格式不包含默认索引列，JSON格式保持原有的列
+    """
+    drop_index = response_format in (FORMAT_COMPACT, FORMAT_ARROW)
+    sliced = slice_module(loads_json(body), series=series, drop_index=drop_index, **slice_args)
+    if response_format == FORMAT_ARROW:
+        frames = find_frames(sliced)
+        if len(frames) != 1:
+            raise ValueError(f"Arrow格式需要通过series指定一个表格: {', '.join(frames)}")
+        return encode_arrow(next(iter(frames.values()))), ARROW_MEDIA_TYPE
+    if response_format == FORMAT_COMPACT:
+        return dumps_json(compact_value(sliced)), COMPACT_MEDIA_TYPE
+    return dumps_json(records_value(sliced)), "application/json"
+
 @app.get("/api/v1/stock-analysis/result/{task_id}/{module_type}")
-async def get_module_data(task_id: str, module_type: str):
+async def get_module_data(
+    task_id: str,
+    module_type: str,
+    request: Request,
+    format: Optional[str] = None,
+    series: Optional[str] = None,
+    columns: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+):
     """
     获取特定模块的分析结果
     
@@ -689,50 +1414,79 @@ async def get_module_data(task_id: str, module_type: str):
     - research_data: 研究数据模块
     - visualizations: 可视化图表模块
     - report: 综合报告模块
+    
+    参数:
+    - format: 可选，响应格式 json(默认) / compact(按列+字典编码) / arrow(Arrow IPC流)，
+      也可以通过 Accept 头选择
+    - series: 可选，逗号分隔的表格名，如 trade_data,technical_data，只返回这些表格
+    - columns: 可选，逗号分隔的列名，日期列始终保留
+    - start_date / end_date: 可选，按日期列筛选行(包含边界)，如 2024-03-01
+    - limit / offset: 可选，筛选后的分页，表格中的 total 为分页前的行数
+    
+    不带切片参数时直接返回预编码的模块；响应根据 Accept-Encoding 使用 br 或 gzip 压缩
     """
     try:
-        if task_id not in task_store:
+        task = get_task(task_id)
+        if task is None:
             raise HTTPException(status_code=404, detail="任务不存在")
         
-        task = task_store[task_id]
-        
         if task.status != "completed":
             if task.status == "failed":
                 raise HTTPException(status_code=500, detail=task.error or "任务执行失败")
+            elif task.status == "cancelled":
+                raise HTTPException(status_code=410, detail="任务已取消")
             else:
                 raise HTTPException(status_code=202, detail="任务仍在处理中")
         
-        # 从完整结果中提取模块数据
-        result = task.result
-        if not isinstance(result, dict) or "data" not in result:
+        if module_type not in RESULT_MODULES:
+            raise HTTPException(status_code=400, detail=f"不支持的模块类型: {module_type}")
+        
+        if (limit is not None and limit < 0) or offset < 0:
+            raise HTTPException(status_code=400, detail="limit和offset不能为负数")
+        
+        try:
+            response_format = negotiate_format(format, request.headers.get("accept"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        series_list = split_query_list(series)
+        slice_args = {
+            "columns": split_query_list(columns),
+            "start_date": start_date,
+            "end_date": end_date,
+            "limit": limit,
+            "offset": offset,
+        }
+        needs_slice = series_list is not None or limit is not None or any(
+            slice_args[key] for key in ("columns", "start_date", "end_date", "offset")
+        )
+        
+        if not needs_slice and response_format == FORMAT_COMPACT and module_type in COMPACT_MODULES:
+            body = task.get_module(compact_key(module_type))
+            if body is None:
+                raise HTTPException(status_code=500, detail="结果格式错误")
+            return await module_response(body, COMPACT_MEDIA_TYPE, request)
+        
+        body = task.get_module(module_type)
+        if body is None:
             raise HTTPException(status_code=500, detail="结果格式错误")
         
-        data = result["data"]
-        
-        # 根据模块类型返回对应数据
-        if module_type == "basic_info":
-            # 基本信息模块 - 公司基础信息
-            return data.get("basic_info", {})
-        elif module_type == "market_data":
-            # 市场数据模块 - 交易数据、板块数据、技术指标
-            return data.get("market_data", {})
-        elif module_type == "financial_data":
-            # 财务数据模块 - 各种财务指标
-            return data.get("financial_data", {})
-        elif module_type == "research_data":
-            # 研究数据模块 - 分析师报告、新闻
-            return data.get("research_data", {})
-        elif module_type == "visualizations":
-            # 可视化模块 - 各种图表的URL和描述信息
-            return {
-                "visualization_paths": data.get("visualization_paths", []),
-                "graph_description": data.get("graph_description", [])
-            }
-        elif module_type == "report":
-            # 综合报告模块 - 包含所有报告文本和图表
-            return data.get("report_state", {})
-        else:
-            raise HTTPException(status_code=400, detail=f"不支持的模块类型: {module_type}")
+        if not needs_slice and response_format != FORMAT_ARROW:
+            # 直接返回预编码的模块字节，跳过反序列化和重新编码
+            return await module_response(body, "application/json", request)
+        
+        # 在序列化之前完成切片，响应大小只与请求的数据量相关
+        try:
+            sliced_body, media_type = await asyncio.to_thread(
+                render_module_slice, body, response_format, series_list, slice_args
+            )
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=e.args[0])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except RuntimeError as e:
+            raise HTTPException(status_code=406, detail=str(e))
+        return await module_response(sliced_body, media_type, request)
         
     except HTTPException:
         raise
@@ -743,7 +1497,7 @@ async def get_module_data(task_id: str, module_type: str):
 
 # 保留原有API端点，但修改为使用异步处理
 @app.post("/api/v1/stock-analysis")
-async def analyze_stock(request: StockAnalysisRequest, background_tasks: BackgroundTasks):
+async def analyze_stock(request: StockAnalysisRequest):
     """
     个股分析接口 (保留向后兼容性)
     """
@@ -751,20 +1505,22 @@ async def analyze_stock(request: StockAnalysisRequest, background_tasks: Backgro
     
     try:
         # 创建任务ID
-        task_id = generate_task_id(request.company_name, request.stock_code)
+        task_id = generate_task_id(request.company_name, request.stock_code, request.analysis_type)
+        
+        # 相同的分析正在进行时直接返回该任务
+        inflight_task_id = claim_inflight_task(task_id, request.company_name, request.stock_code, request.analysis_type)
+        if inflight_task_id:
+            return {
+                "success": True,
+                "message": "相同的分析正在进行中，已关联到该任务",
+                "task_id": inflight_task_id
+            }
         
         # 初始化任务状态
-        task = TaskStatus(request.company_name)
-        task_store[task_id] = task
+        task = TaskStatus(request.company_name, task_id=task_id)
         
-        # 添加后台任务
-        background_tasks.add_task(
-            process_stock_analysis,
-            task_id,
-            request.company_name,
-            request.analysis_type,
-            request.force_refresh
-        )
+        # 提交到调度器
+        enqueue_analysis_task(task_id, task, request)
         
         # 返回任务信息
         return {
@@ -773,76 +1529,74 @@ async def analyze_stock(request: StockAnalysisRequest, background_tasks: Backgro
             "task_id": task_id
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         error_stack = traceback.format_exc()
         logger.error(f"API错误: {str(e)}\n{error_stack}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/stocks/search")
+def search_stock_names(q: str, limit: int = 10):
+    """
+    股票/板块联想搜索，支持简称前缀、代码前缀和拼音首字母，查询只访问内存索引
+    """
+    limit = max(1, min(limit, 50))
+    return {"query": q, "results": search_stocks(q, limit)}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus文本格式的运行指标：节点/数据库/LLM耗时、token用量、缓存命中率和工作线程池状态"""
+    body = await asyncio.to_thread(metrics_registry.render)
+    return Response(content=body, media_type=METRICS_CONTENT_TYPE)
+
 # 添加图片服务API
 @app.get("/api/v1/images/{image_path:path}")
-async def get_image(image_path: str, width: Optional[int] = None, height: Optional[int] = None, thumbnail: bool = False):
+async def get_image(
+    image_path: str,
+    request: Request,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    thumbnail: bool = False,
+    format: Optional[str] = None,
+):
     """
-    获取图片，支持调整大小和生成缩略图
+    获取图片，支持调整大小、生成缩略图和转换格式
     
     参数:
     - image_path: 图片路径
-    - width: 可选，指定宽度
-    - height: 可选，指定高度
+    - width: 可选，指定宽度，向上取整到固定档位(最大2048)
+    - height: 可选，指定高度，同上
     - thumbnail: 是否生成缩略图
+    - format: 可选，输出格式 webp / png / jpeg
+    
+    变换结果缓存在磁盘上，响应带强ETag，If-None-Match 匹配时返回304
     """
     try:
-        # 构建完整路径
-        full_path = os.path.join("database", image_path)
-        
-        if not os.path.exists(full_path):
-            raise HTTPException(status_code=404, detail="图片不存在")
-        
-        # 获取图片MIME类型
-        content_type, _ = mimetypes.guess_type(full_path)
-        if not content_type:
-            content_type = "application/octet-stream"
-        
-        # 如果不需要调整大小，直接返回原图
-        if not width and not height and not thumbnail:
-            with open(full_path, "rb") as f:
-                image_data = f.read()
-            return Response(content=image_data, media_type=content_type)
-        
-        # 使用PIL处理图片
-        try:
-            img = Image.open(full_path)
-            
-            if thumbnail:
-                # 缩略图模式（保持比例）
-                thumb_size = (width or 200, height or 200)  # 默认200x200
-                img.thumbnail(thumb_size)
-            elif width or height:
-                # 调整大小（可能改变比例）
-                new_width = width or img.width
-                new_height = height or img.height
-                img = img.resize((new_width, new_height))
-            
-            # 保存到内存中
-            img_byte_arr = io.BytesIO()
-            img_format = img.format or "JPEG"
-            img.save(img_byte_arr, format=img_format)
-            img_byte_arr.seek(0)
-            
-            return Response(content=img_byte_arr.getvalue(), media_type=content_type)
-        
-        except Exception as e:
-            logger.error(f"处理图片失败: {str(e)}")
-            # 如果处理失败，返回原图
-            with open(full_path, "rb") as f:
-                image_data = f.read()
-            return Response(content=image_data, media_type=content_type)
-        
-    except HTTPException:
-        raise
+        full_path = resolve_image_path("database", image_path)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="非法的图片路径")
+    if not os.path.isfile(full_path):
+        raise HTTPException(status_code=404, detail="图片不存在")
+    
+    try:
+        variant = await asyncio.to_thread(image_cache.get, full_path, width, height, thumbnail, format)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        error_stack = traceback.format_exc()
-        logger.error(f"获取图片失败: {str(e)}\n{error_stack}")
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.error(f"处理图片失败: {str(e)}")
+        # 如果处理失败，返回原图
+        variant = await asyncio.to_thread(image_cache.get, full_path)
+    
+    headers = {
+        "ETag": variant.etag,
+        "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), variant.etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(variant.path, media_type=variant.media_type, headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
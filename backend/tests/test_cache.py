@@ -0,0 +1,36 @@
+import socket
+import time
+
+import pytest
+
+from utils import cache as cache_module
+from utils.cache import RedisCache
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    """重置单例，指向一个没有Redis监听的端口"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    monkeypatch.setattr(cache_module, "REDIS_HOST", "127.0.0.1")
+    monkeypatch.setattr(cache_module, "REDIS_PORT", port)
+    for name, value in (("_instance", None), ("_client", None), ("_raw_client", None), ("_connected", False)):
+        monkeypatch.setattr(RedisCache, name, value)
+    return RedisCache
+
+
+def test_creating_cache_does_not_connect(fresh_cache, monkeypatch):
+    created = []
+    monkeypatch.setattr(cache_module.redis, "Redis", lambda *args, **kwargs: created.append(kwargs))
+    fresh_cache()
+    assert created == []
+
+
+def test_unreachable_redis_fails_fast_once(fresh_cache):
+    cache = fresh_cache()
+    started = time.time()
+    assert not cache.available
+    assert cache.client is None and cache.raw_client is None
+    assert not cache.available
+    assert time.time() - started < 1
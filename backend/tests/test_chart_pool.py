@@ -0,0 +1,68 @@
+import os
+import time
+from multiprocessing import shared_memory
+
+import pandas as pd
+import pytest
+
+from utils import chart_pool
+from utils.chart_pool import ChartRenderPool
+
+
+def slow_render_job(handle, file_type, out_dir):
+    """模拟卡住的渲染：超时后才写输出文件"""
+    time.sleep(3)
+    with open(os.path.join(out_dir, "late.png"), "wb") as f:
+        f.write(b"late")
+    return [], {}
+
+
+def quick_render_job(handle, file_type, out_dir):
+    return [out_dir], {"rows": len(chart_pool.read_shared_frame(handle))}
+
+
+@pytest.fixture
+def pool():
+    pool = ChartRenderPool(max_workers=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_timeout_terminates_hung_worker(tmp_path, pool, monkeypatch):
+    df = pd.DataFrame({"close": [1.0, 2.0, 3.0]})
+    pool.warm()
+    executor = pool._executor
+    processes = list(executor._processes.values())
+    names = []
+    original = chart_pool.SharedFrame.__init__
+
+    def record(self, frame):
+        original(self, frame)
+        names.append(self.shm.name)
+
+    monkeypatch.setattr(chart_pool.SharedFrame, "__init__", record)
+    monkeypatch.setattr(chart_pool, "_render_job", slow_render_job)
+    with pytest.raises(TimeoutError):
+        pool.render(df, "stock", str(tmp_path), timeout=0.5)
+
+    # 返回前工作进程已结束，共享内存已释放，进程池会重建
+    assert all(not process.is_alive() for process in processes)
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=names[0])
+    assert pool._executor is None
+    time.sleep(3)
+    assert not os.path.exists(tmp_path / "late.png")
+
+    monkeypatch.setattr(chart_pool, "_render_job", quick_render_job)
+    assert pool.render(df, "stock", str(tmp_path), timeout=30) == ([str(tmp_path)], {"rows": 3})
+
+
+def test_render_data_file_does_not_retry_after_timeout(tmp_path, monkeypatch):
+    class HungPool:
+        def render(self, *args, **kwargs):
+            raise TimeoutError("hung")
+
+    monkeypatch.setattr(chart_pool, "get_chart_pool", lambda: HungPool())
+    with pytest.raises(TimeoutError):
+        chart_pool.render_data_file(pd.DataFrame({"close": [1.0]}), "stock", str(tmp_path))
+    assert os.listdir(tmp_path) == []
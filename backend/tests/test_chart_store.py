@@ -0,0 +1,83 @@
+import json
+import os
+import time
+
+from helpers.chart_store import (
+    MANIFEST_NAME, STAGING_MARKER, STAGING_MAX_AGE, collect_garbage, commit_run, load_run, referenced_runs, staging_dir
+)
+
+
+def make_run(data_root, run_id, age, size=100, stock_code="000651", file_type="stock"):
+    """创建一个已提交的运行目录，age 为距上次使用的秒数"""
+    run_dir = os.path.join(str(data_root), stock_code, "visualizations", file_type, run_id)
+    staging = staging_dir(run_dir)
+    os.makedirs(staging)
+    with open(os.path.join(staging, "chart.png"), "wb") as f:
+        f.write(b"x" * size)
+    commit_run(staging, run_dir, run_id, file_type, "描述")
+    past = time.time() - age
+    os.utime(os.path.join(run_dir, MANIFEST_NAME), (past, past))
+    return run_dir
+
+
+def test_keeps_most_recent_runs_per_group(tmp_path):
+    runs = [make_run(tmp_path, f"run{i}", age=i * 60) for i in range(4)]
+    other = make_run(tmp_path, "other", age=3600, file_type="financial")
+    stats = collect_garbage(str(tmp_path), keep_runs=2, quota_bytes=0)
+    assert stats["runs_removed"] == 2
+    assert [os.path.exists(path) for path in runs] == [True, True, False, False]
+    assert load_run(other) is not None
+
+
+def test_quota_removes_oldest_but_keeps_newest_of_each_group(tmp_path):
+    newest = make_run(tmp_path, "new", age=0, size=1000)
+    older = make_run(tmp_path, "old", age=60, size=1000)
+    lone = make_run(tmp_path, "lone", age=7200, size=1000, stock_code="000333")
+    collect_garbage(str(tmp_path), keep_runs=5, quota_bytes=1500)
+    assert os.path.exists(newest)
+    assert not os.path.exists(older)
+    assert os.path.exists(lone)
+
+
+def test_pinned_runs_survive_keep_runs_and_quota(tmp_path):
+    runs = [make_run(tmp_path, f"run{i}", age=i * 60, size=1000) for i in range(4)]
+    pinned = {runs[1], runs[3]}
+    stats = collect_garbage(str(tmp_path), keep_runs=1, quota_bytes=1, pinned=pinned)
+    assert stats["runs_pinned"] == 2
+    assert [os.path.exists(path) for path in runs] == [True, True, False, True]
+
+
+def test_referenced_runs_parses_result_urls(tmp_path):
+    body = json.dumps({
+        "visualization_paths": [
+            "/static/data/000651/visualizations/stock/abc123/chart.png",
+            "/static/data/000651/visualizations/stock/abc123/volume.png",
+            "/static/data/000333/visualizations/财务数据/def456/chart.png",
+            # 旧版直接写在数据目录下的图表不属于任何运行
+            "/static/data/000651/visualizations/stock/legacy.png",
+        ]
+    }, ensure_ascii=False).encode("utf-8")
+    assert referenced_runs([body], data_root=str(tmp_path)) == {
+        os.path.normpath(os.path.join(str(tmp_path), "000651", "visualizations", "stock", "abc123")),
+        os.path.normpath(os.path.join(str(tmp_path), "000333", "visualizations", "财务数据", "def456")),
+    }
+
+
+def test_result_references_pin_runs(tmp_path):
+    runs = [make_run(tmp_path, f"run{i}", age=i * 60) for i in range(3)]
+    body = b'{"visualization_paths": ["/static/data/000651/visualizations/stock/run2/chart.png"]}'
+    collect_garbage(str(tmp_path), keep_runs=1, quota_bytes=0, pinned=referenced_runs([body], data_root=str(tmp_path)))
+    assert [os.path.exists(path) for path in runs] == [True, False, True]
+
+
+def test_abandoned_staging_dirs_are_removed(tmp_path):
+    group = tmp_path / "000651" / "visualizations" / "stock"
+    stale = group / f"run{STAGING_MARKER}1-1"
+    fresh = group / f"run{STAGING_MARKER}1-2"
+    stale.mkdir(parents=True)
+    fresh.mkdir()
+    past = time.time() - STAGING_MAX_AGE - 60
+    os.utime(stale, (past, past))
+    collect_garbage(str(tmp_path), keep_runs=1, quota_bytes=0)
+    assert not stale.exists()
+    assert fresh.exists()
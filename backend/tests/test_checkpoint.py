@@ -0,0 +1,77 @@
+import operator
+from typing import Annotated, List, TypedDict
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("langgraph")
+from langgraph.graph import END, START, StateGraph
+
+from core.checkpoint import clear_thread, create_checkpointer, list_threads, prune_checkpoints
+
+
+class State(TypedDict, total=False):
+    steps: Annotated[List[str], operator.add]
+    frame: object
+
+
+def build_graph(checkpointer, calls, fail):
+    def fetch(state):
+        calls.append("fetch")
+        return {"steps": ["fetch"], "frame": pd.DataFrame({"close": [1.0, 2.0]})}
+
+    def analyze(state):
+        calls.append("analyze")
+        if fail:
+            fail.pop()
+            raise RuntimeError("LLM超时")
+        return {"steps": [f"analyze:{state['frame']['close'].sum()}"]}
+
+    builder = StateGraph(State)
+    builder.add_node("fetch", fetch)
+    builder.add_node("analyze", analyze)
+    builder.add_edge(START, "fetch")
+    builder.add_edge("fetch", "analyze")
+    builder.add_edge("analyze", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+@pytest.fixture
+def checkpointer(tmp_path):
+    return create_checkpointer(str(tmp_path / "checkpoints.db"))
+
+
+def run_failed(checkpointer, thread_id):
+    calls = []
+    graph = build_graph(checkpointer, calls, fail=[True])
+    with pytest.raises(RuntimeError):
+        graph.invoke({"steps": []}, {"configurable": {"thread_id": thread_id}})
+    return graph, calls
+
+
+def test_resume_skips_completed_nodes(checkpointer):
+    graph, calls = run_failed(checkpointer, "t1")
+    config = {"configurable": {"thread_id": "t1"}}
+    assert graph.get_state(config).next == ("analyze",)
+    # DataFrame 经 pickle 序列化后可以还原
+    result = graph.invoke(None, config)
+    assert calls == ["fetch", "analyze", "analyze"]
+    assert result["steps"] == ["fetch", "analyze:3.0"]
+
+
+def test_prune_removes_expired_failed_and_completed_threads(checkpointer):
+    for thread_id in ("failed", "running", "done", "unknown"):
+        run_failed(checkpointer, thread_id)
+    statuses = {"failed": "failed", "running": "processing", "done": "completed"}
+
+    assert prune_checkpoints(checkpointer, statuses.get, ttl=3600) == 1
+    assert sorted(list_threads(checkpointer)) == ["failed", "running", "unknown"]
+
+    assert prune_checkpoints(checkpointer, statuses.get, ttl=0) == 2
+    assert list_threads(checkpointer) == ["running"]
+
+
+def test_clear_thread(checkpointer):
+    run_failed(checkpointer, "t1")
+    clear_thread(checkpointer, "t1")
+    assert list_threads(checkpointer) == []
@@ -0,0 +1,69 @@
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from utils.image_cache import DerivedImageCache, SIZE_BUCKETS, quantize_size, resolve_image_path, etag_matches
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "chart.png"
+    Image.new("RGB", (400, 300), "red").save(path)
+    return str(path)
+
+
+def test_quantize_rounds_up_and_caps():
+    assert quantize_size(None) is None
+    assert quantize_size(1) == SIZE_BUCKETS[0]
+    assert quantize_size(201) == 256
+    assert quantize_size(256) == 256
+    assert quantize_size(100000) == SIZE_BUCKETS[-1]
+    with pytest.raises(ValueError):
+        quantize_size(0)
+
+
+def test_nearby_sizes_share_one_variant(tmp_path, source):
+    cache = DerivedImageCache(str(tmp_path / "cache"))
+    first = cache.get(source, width=201)
+    second = cache.get(source, width=250)
+    assert first == second
+    with Image.open(first.path) as img:
+        assert img.width == 256
+
+
+def test_sweep_evicts_least_recently_used(tmp_path, source):
+    cache = DerivedImageCache(str(tmp_path / "cache"), max_bytes=10 ** 9)
+    old = cache.get(source, width=64)
+    recent = cache.get(source, width=128)
+    past = time.time() - 3600
+    os.utime(old.path, (past, past))
+    os.utime(recent.path, (past, past))
+    # 命中会刷新访问时间
+    cache.get(source, width=128)
+
+    cache.max_bytes = int(os.path.getsize(recent.path) * 1.2)
+    cache.sweep()
+    assert not os.path.exists(old.path)
+    assert os.path.exists(recent.path)
+
+
+def test_new_variant_triggers_sweep_over_limit(tmp_path, source):
+    cache = DerivedImageCache(str(tmp_path / "cache"), max_bytes=1)
+    for width in (64, 128, 256):
+        cache.get(source, width=width)
+    total = sum(len(files) for _, _, files in os.walk(tmp_path / "cache"))
+    assert total <= 1
+
+
+def test_original_is_served_without_transform(tmp_path, source):
+    cache = DerivedImageCache(str(tmp_path / "cache"))
+    variant = cache.get(source)
+    assert variant.path == source
+    assert etag_matches(f"W/{variant.etag}", variant.etag)
+
+
+def test_path_traversal_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        resolve_image_path(str(tmp_path), "../etc/passwd")
@@ -0,0 +1,77 @@
+import os
+import time
+
+import pandas as pd
+
+from core import memo as memo_module
+from core.memo import NodeMemo, fingerprint, memo_date, report_memo
+
+
+def test_fingerprint_uses_frame_content():
+    first = pd.DataFrame({"close": [1.0, 2.0]})
+    same = pd.DataFrame({"close": [1.0, 2.0]})
+    changed = pd.DataFrame({"close": [1.0, 2.5]})
+    assert fingerprint("technical", first) == fingerprint("technical", same)
+    assert fingerprint("technical", first) != fingerprint("technical", changed)
+    assert fingerprint(None, "a") != fingerprint("a", None)
+
+
+class FakeReports:
+    def __init__(self):
+        self.text_reports = {}
+
+
+class FakeState:
+    def __init__(self, data):
+        self.data = data
+        self.report_state = FakeReports()
+
+    def add_report(self, key, report):
+        self.report_state.text_reports[key] = report
+        return {"report_state": self.report_state}
+
+
+def make_node(memo, calls):
+    def technical(state):
+        calls.append(state.data)
+        state.add_report("technical_report", f"报告:{state.data}")
+        return {"report_state": state.report_state}
+
+    return memo.wrap("technical", technical, lambda state: (memo_module.memo_date(), state.data),
+                     *report_memo("technical_report"))
+
+
+def test_wrap_reuses_output_only_within_the_same_day(tmp_path, monkeypatch):
+    memo = NodeMemo(str(tmp_path), max_age=3600)
+    calls = []
+    node = make_node(memo, calls)
+
+    node(FakeState("a"))
+    state = FakeState("a")
+    node(state)
+    assert calls == ["a"]
+    assert state.report_state.text_reports["technical_report"] == "报告:a"
+
+    monkeypatch.setattr(memo_module, "memo_date", lambda: "20990101")
+    node(FakeState("a"))
+    assert calls == ["a", "a"]
+
+
+def test_sweep_removes_expired_records_and_enforces_quota(tmp_path):
+    memo = NodeMemo(str(tmp_path), max_age=3600)
+    for key in ("aa01", "aa02", "bb03"):
+        memo.set("technical", key, "x" * 1000)
+    past = time.time() - 7200
+    expired = memo._path("technical", "aa01")
+    os.utime(expired, (past, past))
+    older = memo._path("technical", "aa02")
+    os.utime(older, (time.time() - 60, time.time() - 60))
+
+    stats = memo.sweep()
+    assert stats["removed"] == 1
+    assert not os.path.exists(expired)
+
+    memo.max_bytes = os.path.getsize(older) + 10
+    memo.sweep()
+    assert not os.path.exists(older)
+    assert memo.get("technical", "bb03") == "x" * 1000
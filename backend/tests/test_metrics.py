@@ -0,0 +1,35 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from utils.metrics import CONTENT_TYPE, MetricsRegistry, start_metrics_server
+
+
+def test_histogram_and_counter_render():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "任务数", ["status"])
+    histogram = registry.histogram("duration_seconds", "耗时", buckets=(1.0, 5.0))
+    counter.inc(status="completed")
+    histogram.observe(2.0)
+    body = registry.render()
+    assert 'jobs_total{status="completed"} 1' in body
+    assert 'duration_seconds_bucket{le="1"} 0' in body
+    assert 'duration_seconds_bucket{le="5"} 1' in body
+    assert "duration_seconds_count 1" in body
+
+
+def test_worker_metrics_server_serves_registry():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("workers", "工作线程数", ["state"])
+    registry.add_collector(lambda: gauge.set(3, state="active"))
+    server = start_metrics_server(0, "127.0.0.1", registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            assert 'workers{state="active"} 3' in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
@@ -0,0 +1,83 @@
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+
+from core.runtime import (
+    CancellableNetworkBackend, RunContext, TaskCancelled, activate_run_context, cancellable_node
+)
+
+
+@pytest.fixture
+def silent_server():
+    """接受连接但从不响应的服务端，模拟长时间等待的LLM请求"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    connections = []
+
+    def accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            connections.append(conn)
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/"
+    server.close()
+    for conn in connections:
+        conn.close()
+
+
+def make_client():
+    transport = httpx.HTTPTransport()
+    transport._pool._network_backend = CancellableNetworkBackend(transport._pool._network_backend)
+    return httpx.Client(transport=transport, timeout=30)
+
+
+def test_cancel_aborts_in_flight_request(silent_server):
+    client = make_client()
+    run_context = RunContext("t1")
+    config = {"configurable": {"thread_id": "t1"}}
+    node = cancellable_node("technical", lambda state: client.get(silent_server))
+    outcome = {}
+
+    def run():
+        with activate_run_context("t1", run_context):
+            try:
+                node({}, config)
+            except BaseException as e:
+                outcome["error"] = e
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    time.sleep(0.3)
+    started = time.time()
+    run_context.cancel()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert time.time() - started < 2
+    assert isinstance(outcome["error"], TaskCancelled)
+
+
+def test_external_cancel_is_seen_by_polling():
+    flag = {"cancelled": False}
+    aborted = []
+    run_context = RunContext("t1", external_check=lambda: flag["cancelled"], check_interval=0)
+    with run_context.abort_on_cancel(lambda: aborted.append(True)):
+        flag["cancelled"] = True
+        assert run_context.cancelled
+    assert aborted == [True]
+    with pytest.raises(TaskCancelled):
+        with run_context.abort_on_cancel(lambda: None):
+            pass
+
+
+def test_requests_outside_a_run_are_not_guarded(silent_server):
+    client = make_client()
+    with pytest.raises(httpx.ReadTimeout):
+        client.get(silent_server, timeout=0.2)
@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+
+import pytest
+
+from utils.scheduler import AnalysisScheduler, DuplicateJobError, QueueFullError, RedisAnalysisScheduler
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_interactive_lane_runs_before_batch():
+    scheduler = AnalysisScheduler(max_workers=1, max_queue_size=10, batch_max_active=1)
+    gate = threading.Event()
+    order = []
+    scheduler.submit("blocker", gate.wait)
+    assert wait_until(lambda: scheduler.stats()["active_workers"] == 1)
+    scheduler.submit("b1", order.append, "b1", lane="batch")
+    scheduler.submit("i1", order.append, "i1", lane="interactive")
+    assert scheduler.queue_info("b1")["position"] == 2
+    gate.set()
+    assert wait_until(lambda: len(order) == 2)
+    assert order == ["i1", "b1"]
+    scheduler.shutdown()
+
+
+def test_local_queue_full_and_cancel():
+    scheduler = AnalysisScheduler(max_workers=1, max_queue_size=1)
+    gate = threading.Event()
+    scheduler.submit("blocker", gate.wait)
+    assert wait_until(lambda: scheduler.stats()["active_workers"] == 1)
+    scheduler.submit("queued", gate.wait)
+    with pytest.raises(QueueFullError):
+        scheduler.submit("rejected", gate.wait)
+    assert scheduler.cancel("queued")
+    assert not scheduler.cancel("blocker")
+    gate.set()
+    scheduler.shutdown()
+
+
+@pytest.fixture
+def client():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def make_scheduler(client, handler, **kwargs):
+    kwargs.setdefault("poll_timeout", 1)
+    return RedisAnalysisScheduler(client, handlers={handler.__name__: handler}, **kwargs)
+
+
+def test_running_job_stays_in_processing_list(client):
+    gate = threading.Event()
+
+    def job(_):
+        gate.wait(5)
+
+    scheduler = make_scheduler(client, job, max_workers=1)
+    scheduler.submit("t1", job, "x")
+    assert wait_until(lambda: client.hexists(scheduler._running_key, "t1"))
+    processing = client.keys(f"{scheduler.prefix}:processing:*")
+    assert len(processing) == 1
+    assert json.loads(client.lrange(processing[0], 0, -1)[0])["job_id"] == "t1"
+    # 心跳有效时不回收
+    assert scheduler.reap_expired() == 0
+
+    gate.set()
+    assert wait_until(lambda: not client.hexists(scheduler._running_key, "t1"))
+    assert client.llen(processing[0]) == 0
+    scheduler.shutdown()
+
+
+def crash_worker(client, scheduler, job_id, lane="interactive", attempts=0):
+    """模拟工作进程领取任务后崩溃：任务留在处理中列表，心跳不存在"""
+    consumer = "dead-host:1:abcd:0"
+    payload = json.dumps({"job_id": job_id, "handler": "job", "args": [], "kwargs": {},
+                          "lane": lane, "enqueued_at": time.time(), "attempts": attempts})
+    client.hset(scheduler._consumers_key, consumer, "dead-host:1:abcd")
+    client.rpush(scheduler._processing_key(consumer), payload)
+    client.hset(scheduler._running_key, job_id, payload)
+    return consumer
+
+
+def test_reaper_requeues_job_of_dead_worker(client):
+    def job():
+        pass
+
+    scheduler = make_scheduler(client, job, max_workers=0)
+    consumer = crash_worker(client, scheduler, "t1", lane="batch")
+    assert scheduler.reap_expired() == 1
+    queued = client.lrange(scheduler._lane_key("batch"), 0, -1)
+    assert [json.loads(item)["job_id"] for item in queued] == ["t1"]
+    assert json.loads(queued[0])["attempts"] == 1
+    assert not client.exists(scheduler._processing_key(consumer))
+    assert not client.hexists(scheduler._running_key, "t1")
+    assert scheduler.queue_info("t1")["state"] == "queued"
+    # 另一个进程再次回收时不会重复入队
+    assert scheduler.reap_expired() == 0
+    scheduler.shutdown()
+
+
+def test_reaper_abandons_job_after_max_attempts(client):
+    abandoned = []
+
+    def job():
+        pass
+
+    scheduler = make_scheduler(client, job, max_workers=0, max_attempts=2, on_abandoned=abandoned.append)
+    crash_worker(client, scheduler, "t1", attempts=1)
+    assert scheduler.reap_expired() == 1
+    assert [item["job_id"] for item in abandoned] == ["t1"]
+    assert client.llen(scheduler._lane_key("interactive")) == 0
+    assert not client.hexists(scheduler._jobs_key, "t1")
+    scheduler.shutdown()
+
+
+def test_redis_queue_full(client):
+    def job():
+        pass
+
+    scheduler = make_scheduler(client, job, max_workers=0, max_queue_size=1)
+    assert scheduler.submit("t1", job) == 1
+    with pytest.raises(QueueFullError):
+        scheduler.submit("t2", job, lane="batch")
+    assert scheduler.cancel("t1")
+    assert not client.hexists(scheduler._jobs_key, "t1")
+    scheduler.shutdown()
+
+
+def test_local_rejects_duplicate_job_id():
+    scheduler = AnalysisScheduler(max_workers=1, max_queue_size=10)
+    gate = threading.Event()
+    scheduler.submit("running", gate.wait)
+    assert wait_until(lambda: scheduler.stats()["active_workers"] == 1)
+    scheduler.submit("queued", gate.wait)
+    for job_id in ("running", "queued"):
+        with pytest.raises(DuplicateJobError):
+            scheduler.submit(job_id, gate.wait)
+    gate.set()
+    assert wait_until(lambda: scheduler.queue_info("running") is None)
+    # 任务结束后可以用相同ID重新提交
+    scheduler.submit("running", lambda: None)
+    scheduler.shutdown()
+
+
+def test_redis_rejects_duplicate_job_id(client):
+    def job():
+        pass
+
+    scheduler = make_scheduler(client, job, max_workers=0)
+    scheduler.submit("t1", job)
+    with pytest.raises(DuplicateJobError):
+        scheduler.submit("t1", job, lane="batch")
+    assert client.llen(scheduler._lane_key("batch")) == 0
+    crash_worker(client, scheduler, "t2")
+    with pytest.raises(DuplicateJobError):
+        scheduler.submit("t2", job)
+    scheduler.shutdown()
@@ -0,0 +1,47 @@
+import pytest
+
+from helpers.stock_resolver import StockResolver
+
+STOCKS = [
+    ("000651", "格力电器"), ("301260", "格力博"), ("600185", "格力地产"),
+    ("600030", "中信证券"), ("688408", "中信博"), ("601998", "中信银行"),
+    ("600519", "贵州茅台"), ("000002", "万科A"), ("000004", "*ST国华"), ("300750", "宁德时代"),
+]
+
+
+@pytest.fixture(scope="module")
+def resolver(tmp_path_factory):
+    path = tmp_path_factory.mktemp("stocks") / "all_a_shares.csv"
+    path.write_text("code,name\n" + "\n".join(f"{code},{name}" for code, name in STOCKS), encoding="utf-8")
+    return StockResolver(str(path))
+
+
+@pytest.mark.parametrize("query, code, match_type", [
+    ("600519", "600519", "code"),
+    ("sh600519", "600519", "code"),
+    ("600519.SH", "600519", "code"),
+    ("格力电器", "000651", "exact"),
+    ("万科", "000002", "alias"),
+    ("国华", "000004", "alias"),
+    ("贵州茅台酒股份有限公司", "600519", "fuzzy"),
+    ("格力电", "000651", "fuzzy"),
+    ("宁德", "300750", "fuzzy"),
+])
+def test_resolves(resolver, query, code, match_type):
+    match = resolver.resolve(query)
+    assert (match.stock_code, match.match_type) == (code, match_type)
+
+
+@pytest.mark.parametrize("query", ["格力", "中信"])
+def test_ambiguous_short_names_do_not_pick_shortest_stock(resolver, query):
+    # 格力博、中信博 的简称最短、Dice 系数最高，但领先不够明显
+    assert resolver.resolve(query) is None
+
+
+def test_fuzzy_can_be_disabled(resolver):
+    assert resolver.resolve("格力电", allow_fuzzy=False) is None
+    assert resolver.resolve("格力电器", allow_fuzzy=False).stock_code == "000651"
+
+
+def test_unknown_code(resolver):
+    assert resolver.resolve("999999") is None
@@ -0,0 +1,50 @@
+import pytest
+
+from helpers import stock_search
+from helpers.stock_search import StockSearchIndex
+
+
+def make_index(names):
+    stocks = {code: {"code": code, "name": name, "industry": None} for code, name in names.items()}
+    return StockSearchIndex(stocks, {"BK0475": {"code": "BK0475", "name": "银行"}})
+
+
+@pytest.fixture(scope="module")
+def crowded_index():
+    # 300 只以 "中一" / "中国一" 开头的长名称排在前面，最短的 "中国"、"中国人寿" 排在区间末尾
+    names = {f"{600000 + i}": f"中一{chr(0x4E00 + i)}科技" for i in range(300)}
+    names.update({f"{601000 + i}": f"中国一{chr(0x4E00 + i)}科技" for i in range(300)})
+    names.update({"601988": "中国", "601628": "中国人寿", "000001": "平安银行", "000006": "深振业A"})
+    return make_index(names)
+
+
+def test_short_prefix_ranks_the_whole_range(crowded_index):
+    results = crowded_index.search("中", limit=3)
+    assert results[0]["name"] == "中国"
+
+
+def test_long_prefix_ranks_the_whole_range(crowded_index):
+    results = crowded_index.search("中国人", limit=3)
+    assert [item["code"] for item in results] == ["601628"]
+    assert crowded_index.search("中国", limit=1)[0]["code"] == "601988"
+
+
+def test_precomputed_prefixes_match_full_scan(crowded_index, monkeypatch):
+    for prefix in ("中", "中国", "6", "60", "平", "Y"):
+        precomputed = crowded_index.search(prefix, limit=10)
+        monkeypatch.setattr(stock_search, "PRECOMPUTED_PREFIX_LEN", 0)
+        assert crowded_index.search(prefix, limit=10) == precomputed
+        monkeypatch.undo()
+
+
+@pytest.mark.parametrize("query", ["sz0000", "SZ000006", "000006.SZ", "0000"])
+def test_exchange_prefix_is_stripped(crowded_index, query):
+    codes = [item["code"] for item in crowded_index.search(query, limit=5)]
+    assert "000006" in codes
+
+
+def test_exact_match_and_pinyin(crowded_index):
+    assert crowded_index.search("平安银行")[0]["match_type"] == "prefix"
+    assert crowded_index.search("深振业")[0]["match_type"] == "alias"
+    assert crowded_index.search("PAYH")[0]["code"] == "000001"
+    assert crowded_index.search("银行")[0]["type"] == "sector"
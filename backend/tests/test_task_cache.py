@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from utils.task_cache import TaskCache
+
+
+class Task:
+    def __init__(self, task_id, company_name="格力电器", stock_code="000651", analysis_type="综合分析",
+                 status="completed", size=10, age=0):
+        self.task_id = task_id
+        self.company_name = company_name
+        self.stock_code = stock_code
+        self.analysis_type = analysis_type
+        self.status = status
+        self.size = size
+        self.updated_at = datetime.now() - timedelta(seconds=age)
+
+
+def make_cache(**kwargs):
+    options = {"max_tasks": 10, "max_bytes": 1000, "ttl_by_status": {}, "size_of": lambda task: task.size}
+    options.update(kwargs)
+    return TaskCache(**options)
+
+
+def test_find_respects_analysis_type():
+    cache = make_cache()
+    cache["tech"] = Task("tech", analysis_type="技术面分析")
+    cache["full"] = Task("full", analysis_type="综合分析", age=60)
+    assert cache.find("格力电器", "000651", analysis_type="技术面分析") == "tech"
+    assert cache.find(None, "000651", analysis_type="综合分析") == "full"
+    assert cache.find("格力电器", None, analysis_type="基本面分析") is None
+
+
+def test_index_follows_analysis_type_change():
+    cache = make_cache()
+    task = Task("t1", analysis_type="技术面分析")
+    cache["t1"] = task
+    task.analysis_type = "综合分析"
+    cache.track("t1")
+    assert cache.find("格力电器", None, analysis_type="技术面分析") is None
+    assert cache.find("格力电器", None, analysis_type="综合分析") == "t1"
+
+
+def test_lru_eviction_skips_running_tasks_and_saves_evicted():
+    evicted = []
+    cache = make_cache(max_tasks=2, on_evict=lambda task_id, task: evicted.append(task_id))
+    cache["running"] = Task("running", status="processing")
+    cache["old"] = Task("old")
+    cache["new"] = Task("new")
+    assert evicted == ["old"]
+    assert "running" in cache and "new" in cache
+
+
+def test_access_refreshes_lru_order():
+    cache = make_cache(max_tasks=2)
+    cache["a"] = Task("a")
+    cache["b"] = Task("b")
+    cache.get("a")
+    cache["c"] = Task("c")
+    assert "a" in cache and "b" not in cache
+
+
+def test_byte_limit_and_ttl():
+    cache = make_cache(max_bytes=25, ttl_by_status={"failed": 0}, sweep_interval=0)
+    cache["a"] = Task("a", size=10)
+    cache["b"] = Task("b", size=10)
+    cache["c"] = Task("c", size=10)
+    assert "a" not in cache
+    assert cache.stats()["bytes"] == 20
+
+    cache["f"] = Task("f", status="failed", size=1)
+    cache["d"] = Task("d", size=1)
+    assert "f" not in cache
+    assert cache.find("格力电器", None, status="failed", analysis_type="综合分析") is None
@@ -0,0 +1,64 @@
+import pytest
+
+from utils.task_store import RedisTaskRegistry, TaskRegistry
+
+
+def status(company_name, stock_code, analysis_type, state="completed", updated_at="2024-01-01T10:00:00"):
+    return {
+        "company_name": company_name, "stock_code": stock_code, "status": state, "progress": 100,
+        "message": "", "stage": "完成", "created_at": updated_at, "updated_at": updated_at,
+        "error": None, "analysis_type": analysis_type,
+    }
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def registry(request, tmp_path):
+    if request.param == "sqlite":
+        return TaskRegistry(str(tmp_path / "tasks.db"))
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    raw_client = fakeredis.FakeRedis(server=server)
+    return RedisTaskRegistry(client, raw_client, ttl=3600)
+
+
+def test_completed_task_reuse_respects_analysis_type(registry):
+    registry.save_status("tech", status("格力电器", "000651", "技术面分析"))
+    assert registry.find_completed_task("格力电器", "000651", "技术面分析") == "tech"
+    assert registry.find_completed_task("格力电器", "000651", "基本面分析") is None
+    assert registry.find_completed_task(None, "000651", "综合分析") is None
+
+    registry.save_status("full", status("格力电器", "000651", "综合分析", updated_at="2024-01-02T10:00:00"))
+    assert registry.find_completed_task("格力电器", None, "综合分析") == "full"
+    assert registry.find_completed_task("格力电器", "000651", "技术面分析") == "tech"
+
+
+def test_unfinished_tasks_are_not_reused(registry):
+    registry.save_status("t1", status("格力电器", "000651", "综合分析", state="processing"))
+    assert registry.find_completed_task("格力电器", "000651", "综合分析") is None
+
+
+def test_legacy_rows_without_type_count_as_full_analysis(tmp_path):
+    registry = TaskRegistry(str(tmp_path / "tasks.db"))
+    registry.save_status("legacy", status("格力电器", "000651", None))
+    assert registry.find_completed_task("格力电器", None) == "legacy"
+    assert registry.find_completed_task("格力电器", None, "技术面分析") is None
+
+
+def test_latest_completed_task_per_stock_and_type(registry):
+    registry.save_status("old", status("格力电器", "000651", "综合分析", updated_at="2024-01-01T10:00:00"))
+    registry.save_status("new", status("格力电器", "000651", "综合分析", updated_at="2024-01-02T10:00:00"))
+    registry.save_status("tech", status("格力电器", "000651", "技术面分析"))
+    registry.save_status("running", status("美的集团", "000333", "综合分析", state="processing"))
+    assert sorted(registry.latest_completed_tasks(batch_size=1)) == ["new", "tech"]
+
+
+def test_unfinished_tasks_follow_status_changes(registry):
+    registry.save_status("queued", status("格力电器", "000651", "综合分析", state="pending"))
+    registry.save_status("running", status("美的集团", "000333", "综合分析", state="processing"))
+    registry.save_status("done", status("贵州茅台", "600519", "综合分析"))
+    assert sorted(registry.unfinished_tasks()) == ["queued", "running"]
+
+    registry.save_status("running", status("美的集团", "000333", "综合分析", state="failed"))
+    registry.delete("queued")
+    assert registry.unfinished_tasks() == []
@@ -0,0 +1,85 @@
+import gzip
+
+import pandas as pd
+import pytest
+
+from helpers.utility import dataframe_to_json_friendly, dumps_json
+from helpers import wire_format
+from helpers.wire_format import (
+    compress_body, decode_columnar, slice_frame, to_columnar, to_records, MIN_COMPRESS_SIZE
+)
+
+
+def make_frame(rows=6):
+    df = pd.DataFrame({
+        "date": [f"2024-01-0{i + 1}" for i in range(rows)],
+        "close": [10.0 + i for i in range(rows)],
+        "signal": ["金叉" if i % 2 else "死叉" for i in range(rows)],
+    })
+    return dataframe_to_json_friendly(df)
+
+
+def test_compact_drops_default_index_and_round_trips():
+    frame = make_frame()
+    compact = to_columnar(frame)
+    assert compact["columns"] == ["date", "close", "signal"]
+    assert compact["dictionaries"]["signal"] == ["死叉", "金叉"]
+    decoded = decode_columnar(compact)
+    assert decoded["data"][1] == [10.0 + i for i in range(6)]
+
+
+def test_compact_keeps_meaningful_index():
+    df = pd.DataFrame({"close": [1.0, 2.0]}, index=pd.Index([5, 9], name="index"))
+    compact = to_columnar(dataframe_to_json_friendly(df))
+    assert compact["columns"] == ["index", "close"]
+
+
+def test_json_records_keep_index_column():
+    records = to_records(make_frame())
+    assert records["columns"][0] == "index"
+
+
+def test_slice_drops_index_before_paging():
+    sliced = slice_frame(make_frame(), offset=2, limit=2, drop_index=True)
+    assert "index" not in sliced["columns"]
+    assert sliced["total"] == 6
+    assert sliced["data"][0] == ["2024-01-03", "2024-01-04"]
+
+
+def test_slice_filters_by_date_and_projects_columns():
+    sliced = slice_frame(make_frame(), columns=["CLOSE"], start_date="20240102", end_date="2024/01/03")
+    assert sliced["columns"] == ["date", "close"]
+    assert sliced["data"][1] == [11.0, 12.0]
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("identity", None),
+    (None, None),
+])
+def test_compress_body_negotiates_and_round_trips(accept_encoding, expected):
+    if expected == "br" and wire_format.brotli is None:
+        pytest.skip("未安装brotli")
+    body = dumps_json({"rows": [{"date": f"2024-01-{i % 28 + 1:02d}", "close": i} for i in range(500)]})
+    assert len(body) >= MIN_COMPRESS_SIZE
+    compressed, encoding = compress_body(body, accept_encoding)
+    assert encoding == expected
+    if encoding == "gzip":
+        assert gzip.decompress(compressed) == body
+    elif encoding == "br":
+        assert wire_format.brotli.decompress(compressed) == body
+    else:
+        assert compressed == body
+    # 相同输入重复压缩结果一致
+    assert compress_body(body, accept_encoding) == (compressed, encoding)
+
+
+def test_small_bodies_are_not_compressed():
+    assert compress_body(b"{}", "gzip, br") == (b"{}", None)
+
+
+def test_invalid_date_rejected():
+    with pytest.raises(ValueError):
+        slice_frame(make_frame(), start_date="2024")
@@ -4,6 +4,7 @@ import datetime
 from typing import Dict, Any
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
+from utils.metrics import timed_db_query
 
 current_date = datetime.date.today().strftime("%Y-%m-%d")
 
@@ -18,6 +19,7 @@ class DBAnalystInput(BaseModel):
     add_date: str = Field(description="增加日期, 格式为YYYY-MM-DD")
 
 @tool(args_schema=DBAnalystInput)
+@timed_db_query
 def get_analyst_data_from_db_tool(stock_code: str, add_date: str) -> pd.DataFrame:
     """
     从数据库获取分析师数据。
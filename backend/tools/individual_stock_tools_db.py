@@ -4,6 +4,7 @@ import datetime
 from typing import Dict, Any
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
+from utils.metrics import timed_db_query
 
 current_date = datetime.date.today().strftime("%Y-%m-%d")
 
@@ -15,6 +16,7 @@ class DBStockInfoInput(BaseModel):
     end_date: str = Field(description="结束日期, 格式为YYYY-MM-DD")
 
 @tool(args_schema=DBStockInfoInput)
+@timed_db_query
 def get_stock_info_from_db_tool(stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
     """
     从数据库获取股票信息。
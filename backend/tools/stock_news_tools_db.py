@@ -4,6 +4,7 @@ import datetime
 from typing import Dict, Any
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
+from utils.metrics import timed_db_query
 
 current_date = datetime.date.today().strftime("%Y-%m-%d")
 
@@ -14,6 +15,7 @@ class DBStockNewsInput(BaseModel):
 
 
 @tool(args_schema=DBStockNewsInput)
+@timed_db_query
 def get_stock_news_from_db_tool(stock_code: str) -> pd.DataFrame:
     """
     从数据库获取公司信息数据。
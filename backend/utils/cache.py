@@ -3,9 +3,12 @@ import os
 import redis
 import asyncio
 import logging
+import threading
 from functools import wraps
+from redis.backoff import NoBackoff
+from redis.retry import Retry
 from typing import Any, Callable, Dict, Optional, TypeVar, cast
-from config.settings import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD, REDIS_CACHE_TTL
+from config.settings import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD, REDIS_CACHE_TTL, REDIS_CONNECT_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
@@ -25,40 +28,74 @@ class CustomJSONEncoder(json.JSONEncoder):
         return super().default(obj)
 
 class RedisCache:
-    """Redis缓存实用工具类"""
+    """Redis缓存实用工具类
+
+    首次使用客户端时才连接并测试Redis，导入模块和创建实例时不访问网络
+    """
     
     _instance = None
     _client = None
+    _raw_client = None  # 不解码响应的客户端，用于读写预编码的字节数据
+    _connected = False
+    _connect_lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(RedisCache, cls).__new__(cls)
+        return cls._instance
+
+    @classmethod
+    def _create_client(cls, decode_responses: bool, **kwargs) -> redis.Redis:
+        return redis.Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            password=REDIS_PASSWORD,
+            decode_responses=decode_responses,
+            socket_timeout=5,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            **kwargs,
+        )
+
+    @classmethod
+    def _connect(cls) -> None:
+        """创建客户端并测试连接，只执行一次；测试连接不重试，Redis不可达时很快返回"""
+        if cls._connected:
+            return
+        with cls._connect_lock:
+            if cls._connected:
+                return
             try:
-                cls._client = redis.Redis(
-                    host=REDIS_HOST,
-                    port=REDIS_PORT,
-                    db=REDIS_DB,
-                    password=REDIS_PASSWORD,
-                    decode_responses=True,
-                    socket_timeout=5,
-                )
-                # 测试连接
-                cls._client.ping()
+                probe = cls._create_client(True, retry=Retry(NoBackoff(), 0))
+                try:
+                    probe.ping()
+                finally:
+                    probe.close()
+                cls._client = cls._create_client(True)
+                cls._raw_client = cls._create_client(False)
                 logger.info(f"Redis缓存连接成功: {REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}")
             except Exception as e:
                 logger.warning(f"Redis缓存连接失败: {str(e)}")
                 cls._client = None
-        return cls._instance
+                cls._raw_client = None
+            cls._connected = True
     
     @property
     def client(self) -> Optional[redis.Redis]:
         """获取Redis客户端实例"""
+        self._connect()
         return self._client
     
+    @property
+    def raw_client(self) -> Optional[redis.Redis]:
+        """获取不解码响应的Redis客户端实例，读写原始字节"""
+        self._connect()
+        return self._raw_client
+    
     @property
     def available(self) -> bool:
         """检查Redis是否可用"""
-        if self._client is None:
+        if self.client is None:
             return False
         try:
             self._client.ping()
@@ -96,6 +133,50 @@ class RedisCache:
             logger.error(f"设置Redis缓存失败: {str(e)}")
             return False
     
+    def set_hash(self, key: str, mapping: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """整体替换一个哈希键的所有字段，字段值为预编码的字节或字符串"""
+        if not self.available or not mapping:
+            return False
+
+        if ttl is None:
+            ttl = REDIS_CACHE_TTL
+
+        try:
+            pipe = self._raw_client.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, ttl)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"设置Redis哈希缓存失败: {str(e)}")
+            return False
+
+    def get_hash(self, key: str) -> Optional[Dict[str, bytes]]:
+        """获取哈希键的所有字段，字段值保持为原始字节"""
+        if not self.available:
+            return None
+
+        try:
+            data = self._raw_client.hgetall(key)
+            if not data:
+                return None
+            return {field.decode("utf-8"): value for field, value in data.items()}
+        except Exception as e:
+            logger.error(f"从Redis获取哈希缓存失败: {str(e)}")
+            return None
+
+    def get_hash_field(self, key: str, field: str) -> Optional[bytes]:
+        """获取哈希键的单个字段"""
+        if not self.available:
+            return None
+
+        try:
+            return self._raw_client.hget(key, field)
+        except Exception as e:
+            logger.error(f"从Redis获取哈希字段失败: {str(e)}")
+            return None
+
     def delete(self, key: str) -> bool:
         """删除缓存键"""
         if not self.available:
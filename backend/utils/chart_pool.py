@@ -0,0 +1,232 @@
+import os
+import pickle
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import CHART_POOL_ENABLED, CHART_POOL_WORKERS, CHART_RENDER_TIMEOUT
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow为可选依赖，未安装时用pickle序列化DataFrame
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_ARROW = "arrow"
+FORMAT_PICKLE = "pickle"
+
+# (共享内存名称, 数据长度, 序列化格式)
+FrameHandle = Tuple[str, int, str]
+
+
+def encode_frame(df) -> Tuple[str, Any]:
+    """序列化DataFrame：优先使用Arrow IPC，类型不支持时退回pickle"""
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return FORMAT_ARROW, sink.getvalue()
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            logger.debug(f"DataFrame无法转换为Arrow格式，使用pickle: {str(e)}")
+    return FORMAT_PICKLE, pickle.dumps(df, protocol=5)
+
+
+def decode_frame(fmt: str, data: bytes):
+    if fmt == FORMAT_ARROW:
+        return pa.ipc.open_stream(data).read_all().to_pandas()
+    return pickle.loads(data)
+
+
+class SharedFrame:
+    """放入共享内存的DataFrame，工作进程按名称读取，不经过进程池的管道传输
+
+    由创建方在渲染结束后释放
+    """
+
+    def __init__(self, df):
+        self.format, payload = encode_frame(df)
+        view = memoryview(payload).cast("B")
+        self.size = view.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, self.size))
+        self.shm.buf[:self.size] = view
+
+    @property
+    def handle(self) -> FrameHandle:
+        return self.shm.name, self.size, self.format
+
+    def close(self) -> None:
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SharedFrame":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_shared_frame(handle: FrameHandle):
+    """在工作进程中读取共享内存中的DataFrame"""
+    name, size, fmt = handle
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # 先复制出来再解码，解码结果不引用共享内存，读取后即可关闭
+        data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+    return decode_frame(fmt, data)
+
+
+def _init_worker() -> None:
+    """工作进程初始化：固定Agg后端，预先导入绘图库并加载字体缓存"""
+    os.environ["MPLBACKEND"] = "Agg"
+    import matplotlib
+    matplotlib.use("Agg")
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    try:
+        import seaborn  # noqa: F401
+    except ImportError:
+        pass
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import helpers.chart_engine  # noqa: F401
+
+    fig = Figure(figsize=(1, 1))
+    FigureCanvasAgg(fig)
+    fig.subplots().set_title("warm")
+    fig.canvas.draw()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _render_job(handle: FrameHandle, file_type: str, out_dir: str) -> Tuple[List[str], Dict[str, Any]]:
+    from helpers.chart_engine import build_chart_frame, render_charts, summarize_frame
+    frame = build_chart_frame(read_shared_frame(handle))
+    return render_charts(frame, file_type, out_dir), summarize_frame(frame)
+
+
+class ChartRenderPool:
+    """图表渲染进程池
+
+    使用 spawn 启动工作进程，不继承服务进程的线程和 pyplot 状态；
+    工作进程崩溃导致进程池不可用时，下次使用自动重建
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _terminate(self, executor: ProcessPoolExecutor) -> None:
+        """强制结束进程池的全部工作进程并丢弃进程池
+
+        shutdown 不会停止正在执行的任务，超时的任务会继续写暂存目录、读共享内存；
+        同一进程池中其他正在渲染的任务会收到 BrokenProcessPool，由调用方改为在当前进程绘制
+        """
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(5)
+        self._reset(executor)
+
+    def warm(self) -> None:
+        """启动全部工作进程并完成初始化"""
+        executor = self._get_executor()
+        pids = {future.result() for future in [executor.submit(_ping) for _ in range(self.max_workers)]}
+        logger.info(f"图表渲染进程池已启动 {len(pids)} 个工作进程")
+
+    def render(self, df, file_type: str, out_dir: str, timeout: Optional[float] = None) -> Tuple[List[str], Dict[str, Any]]:
+        """在工作进程中绘制一个数据文件的全部图表，返回 (图表路径, 指标摘要)
+
+        超时时先结束工作进程再释放共享内存并抛出 TimeoutError，调用方随后可以安全删除输出目录
+        """
+        executor = self._get_executor()
+        with SharedFrame(df) as shared:
+            future = executor.submit(_render_job, shared.handle, file_type, out_dir)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                if not future.cancel():
+                    self._terminate(executor)
+                raise TimeoutError(f"{file_type}图表渲染超过{timeout}秒")
+            except BrokenProcessPool:
+                self._reset(executor)
+                raise
+            finally:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_chart_pool: Optional[ChartRenderPool] = None
+_chart_pool_lock = threading.Lock()
+
+
+def get_chart_pool() -> Optional[ChartRenderPool]:
+    """进程内共享的渲染进程池，关闭时返回None"""
+    global _chart_pool
+    if not CHART_POOL_ENABLED:
+        return None
+    if _chart_pool is None:
+        with _chart_pool_lock:
+            if _chart_pool is None:
+                _chart_pool = ChartRenderPool(CHART_POOL_WORKERS)
+    return _chart_pool
+
+
+def shutdown_chart_pool() -> None:
+    if _chart_pool is not None:
+        _chart_pool.shutdown()
+
+
+def render_data_file(df, file_type: str, out_dir: str) -> Tuple[List[str], Dict[str, Any]]:
+    """绘制一个数据文件的图表：优先使用进程池，进程池关闭或不可用时在当前线程绘制
+
+    渲染超时直接抛出 TimeoutError，不在当前线程重试，避免同样的数据卡住分析线程
+    """
+    pool = get_chart_pool()
+    if pool is not None:
+        try:
+            return pool.render(df, file_type, out_dir, timeout=CHART_RENDER_TIMEOUT)
+        except BrokenProcessPool as e:
+            logger.error(f"图表渲染进程池不可用，改为在当前进程绘制: {str(e)}")
+        except TimeoutError as e:
+            logger.error(f"图表渲染超时，已结束渲染进程: {str(e)}")
+            raise
+    from helpers.chart_engine import build_chart_frame, render_charts, summarize_frame
+    frame = build_chart_frame(df)
+    return render_charts(frame, file_type, out_dir), summarize_frame(frame)
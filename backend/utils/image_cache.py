@@ -0,0 +1,209 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 支持的输出格式及对应的PIL格式名
+OUTPUT_FORMATS = {"png": "PNG", "jpeg": "JPEG", "jpg": "JPEG", "webp": "WEBP"}
+
+# 允许的输出尺寸，请求的宽高向上取整到最近的档位，超过最大档位时按最大档位处理。
+# 限制档位数量使每张源图最多生成有限个变换结果，避免任意宽高请求占满磁盘和CPU
+SIZE_BUCKETS = (64, 128, 200, 256, 320, 480, 640, 800, 960, 1280, 1600, 2048)
+# 清理缓存目录时删除到上限的该比例，避免每次生成新文件都触发清理
+SWEEP_TARGET_RATIO = 0.9
+
+
+def quantize_size(value: Optional[int]) -> Optional[int]:
+    """将请求的宽或高映射到尺寸档位
+
+    Raises:
+        ValueError: 尺寸不是正数
+    """
+    if value is None:
+        return None
+    if value <= 0:
+        raise ValueError(f"无效的图片尺寸: {value}")
+    position = bisect_left(SIZE_BUCKETS, value)
+    return SIZE_BUCKETS[min(position, len(SIZE_BUCKETS) - 1)]
+
+
+@dataclass(frozen=True)
+class ImageVariant:
+    """可直接返回给客户端的图片文件"""
+    path: str
+    etag: str
+    media_type: str
+
+
+def resolve_image_path(root: str, image_path: str) -> str:
+    """将请求路径解析为 root 下的真实文件路径，拒绝目录穿越
+
+    Raises:
+        ValueError: 路径指向 root 之外
+    """
+    root_real = os.path.realpath(root)
+    full_path = os.path.realpath(os.path.join(root_real, image_path.lstrip("/\\")))
+    if os.path.commonpath([root_real, full_path]) != root_real:
+        raise ValueError(f"非法的图片路径: {image_path}")
+    return full_path
+
+
+class DerivedImageCache:
+    """缩放/缩略图/转码结果的磁盘缓存
+
+    缓存键由源文件路径、mtime_ns、大小和变换参数计算，源文件更新后自动失效；
+    缓存键同时作为强ETag，客户端可以用 If-None-Match 校验。
+    宽高按 SIZE_BUCKETS 取整；目录总大小超过 max_bytes 时按最近访问时间(文件mtime)删除最旧的结果
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._sweep_lock = threading.Lock()
+        # 缓存目录的估计大小，首次生成结果时扫描目录得到
+        self._total_bytes: Optional[int] = None
+
+    @staticmethod
+    def _digest(*parts) -> str:
+        return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(
+        self,
+        source_path: str,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        thumbnail: bool = False,
+        output_format: Optional[str] = None,
+    ) -> ImageVariant:
+        """获取源图片或其变换结果，变换结果不存在时生成并写入缓存
+
+        Raises:
+            FileNotFoundError: 源文件不存在
+            ValueError: 不支持的输出格式
+        """
+        stat = os.stat(source_path)
+        width, height = quantize_size(width), quantize_size(height)
+        if output_format is not None:
+            output_format = output_format.lower()
+            if output_format not in OUTPUT_FORMATS:
+                raise ValueError(f"不支持的图片格式: {output_format}")
+
+        source_type = mimetypes.guess_type(source_path)[0] or "application/octet-stream"
+        if not width and not height and not thumbnail and output_format is None:
+            etag = self._digest(source_path, stat.st_mtime_ns, stat.st_size)
+            return ImageVariant(source_path, f'"{etag}"', source_type)
+
+        key = self._digest(source_path, stat.st_mtime_ns, stat.st_size, width, height, thumbnail, output_format)
+        ext = output_format or os.path.splitext(source_path)[1].lstrip(".").lower() or "png"
+        target = os.path.join(self.cache_dir, key[:2], f"{key}.{ext}")
+        media_type = mimetypes.guess_type(target)[0] or source_type
+        variant = ImageVariant(target, f'"{key}"', media_type)
+        try:
+            # 命中时更新mtime，清理时按最近访问时间淘汰
+            os.utime(target)
+            return variant
+        except FileNotFoundError:
+            pass
+
+        with self._key_lock(key):
+            if not os.path.exists(target):
+                self._render(source_path, target, width, height, thumbnail, output_format)
+                self._added(os.path.getsize(target))
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return variant
+
+    def _scan(self) -> Tuple[int, list]:
+        """返回缓存目录的总大小和 [(mtime, 大小, 路径)]"""
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return total, files
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += size
+                if self._total_bytes <= self.max_bytes:
+                    return
+        self.sweep()
+
+    def sweep(self) -> int:
+        """删除最久未访问的结果直到目录大小低于上限，返回删除的字节数"""
+        if not self._sweep_lock.acquire(blocking=False):
+            return 0
+        try:
+            total, files = self._scan()
+            removed = 0
+            if self.max_bytes > 0 and total > self.max_bytes:
+                target = self.max_bytes * SWEEP_TARGET_RATIO
+                for _, size, path in sorted(files):
+                    if total - removed <= target:
+                        break
+                    try:
+                        os.remove(path)
+                        removed += size
+                    except FileNotFoundError:
+                        pass
+                logger.info(f"清理图片缓存 {removed} 字节，剩余 {total - removed} 字节")
+            with self._lock:
+                self._total_bytes = total - removed
+            return removed
+        finally:
+            self._sweep_lock.release()
+
+    def _render(self, source_path, target, width, height, thumbnail, output_format) -> None:
+        """使用PIL生成变换后的图片，先写临时文件再原子替换"""
+        from PIL import Image
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with Image.open(source_path) as img:
+            img_format = OUTPUT_FORMATS.get(output_format) or img.format or "PNG"
+            if thumbnail:
+                # 缩略图模式（保持比例）
+                img.thumbnail((width or 200, height or 200))  # 默认200x200
+            elif width or height:
+                # 调整大小（可能改变比例）
+                img = img.resize((width or img.width, height or img.height))
+            if img_format == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+
+            tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                img.save(tmp_path, format=img_format)
+                os.replace(tmp_path, target)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        logger.info(f"生成图片缓存: {source_path} -> {target}")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """检查 If-None-Match 头是否与ETag匹配(弱比较)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,536 @@
+import os
+import json
+import uuid
+import socket
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 优先级通道，按顺序调度：交互式请求优先于批量请求
+LANES = ("interactive", "batch")
+
+
+class QueueFullError(Exception):
+    """分析队列已满，拒绝新任务"""
+
+
+class DuplicateJobError(Exception):
+    """相同ID的任务已在排队或运行中"""
+
+
+class _Job:
+    """调度器内部的任务记录"""
+
+    def __init__(self, job_id: str, lane: str, fn: Callable, args: tuple, kwargs: dict):
+        self.job_id = job_id
+        self.lane = lane
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.time()
+        self.started_at: Optional[float] = None
+
+    @property
+    def wait_seconds(self) -> float:
+        end = self.started_at if self.started_at is not None else time.time()
+        return round(end - self.enqueued_at, 3)
+
+
+class AnalysisScheduler:
+    """有界工作线程池，带准入控制和优先级通道
+
+    - 固定数量的工作线程执行任务，避免无限制地并发运行工作流
+    - 所有通道共享一个有界队列，队列满时 submit 抛出 QueueFullError
+    - interactive 通道优先出队；batch 通道同时运行的任务数有上限，
+      保证交互式请求始终有可用的工作线程
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue_size: int = 20, batch_max_active: Optional[int] = None):
+        self.max_workers = max(1, max_workers)
+        self.max_queue_size = max(0, max_queue_size)
+        if batch_max_active is None:
+            batch_max_active = max(1, self.max_workers - 1)
+        self.batch_max_active = max(1, min(batch_max_active, self.max_workers))
+
+        self._cond = threading.Condition()
+        self._lanes: Dict[str, deque] = {lane: deque() for lane in LANES}
+        self._jobs: Dict[str, _Job] = {}
+        self._active: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._completed = 0
+        self._total_wait = 0.0
+        self._shutdown = False
+
+        self._workers = []
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"analysis-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, job_id: str, fn: Callable, *args, lane: str = "interactive", **kwargs) -> int:
+        """提交任务到指定通道
+
+        Returns:
+            int: 任务在所有排队任务中的位置(从1开始)
+
+        Raises:
+            ValueError: 通道名称无效
+            QueueFullError: 队列已满
+            DuplicateJobError: 相同ID的任务已在排队或运行中
+        """
+        if lane not in self._lanes:
+            raise ValueError(f"不支持的优先级通道: {lane}")
+
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("调度器已关闭")
+            if job_id in self._jobs:
+                raise DuplicateJobError(f"任务 {job_id} 已在队列中或正在运行")
+            if self._queued_count() >= self.max_queue_size:
+                raise QueueFullError(f"分析队列已满({self.max_queue_size})")
+            job = _Job(job_id, lane, fn, args, kwargs)
+            self._lanes[lane].append(job)
+            self._jobs[job_id] = job
+            self._cond.notify()
+            position = self._position(job)
+
+        logger.info(f"任务 {job_id} 进入 {lane} 队列，排队位置: {position}")
+        return position
+
+    def queue_info(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务的排队信息，任务不在调度器中时返回None"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            running = job.started_at is not None
+            return {
+                "lane": job.lane,
+                "state": "running" if running else "queued",
+                "position": 0 if running else self._position(job),
+                "queue_depth": self._queued_count(),
+                "wait_seconds": job.wait_seconds,
+            }
+
+    def cancel(self, job_id: str) -> bool:
+        """从队列中移除尚未开始的任务，已开始运行的任务返回False"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.started_at is not None:
+                return False
+            self._lanes[job.lane].remove(job)
+            self._jobs.pop(job_id, None)
+        logger.info(f"任务 {job_id} 已从 {job.lane} 队列移除")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """获取调度器整体运行状态"""
+        with self._cond:
+            return {
+                "max_workers": self.max_workers,
+                "active_workers": sum(self._active.values()),
+                "active_by_lane": dict(self._active),
+                "queued_by_lane": {lane: len(q) for lane, q in self._lanes.items()},
+                "queue_depth": self._queued_count(),
+                "max_queue_size": self.max_queue_size,
+                "completed": self._completed,
+                "avg_wait_seconds": round(self._total_wait / self._completed, 3) if self._completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """停止接收新任务并唤醒所有工作线程退出"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+
+    def _queued_count(self) -> int:
+        return sum(len(q) for q in self._lanes.values())
+
+    def _position(self, job: _Job) -> int:
+        """计算排队位置：前面所有更高优先级通道的任务 + 同通道前面的任务"""
+        position = 0
+        for lane in LANES:
+            queue = self._lanes[lane]
+            if lane == job.lane:
+                for index, queued in enumerate(queue):
+                    if queued is job:
+                        return position + index + 1
+                return position + len(queue)
+            position += len(queue)
+        return position
+
+    def _next_job(self) -> Optional[_Job]:
+        """按优先级选出下一个可执行的任务"""
+        if self._lanes["interactive"]:
+            return self._lanes["interactive"].popleft()
+        if self._lanes["batch"] and self._active["batch"] < self.batch_max_active:
+            return self._lanes["batch"].popleft()
+        return None
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None and not self._shutdown:
+                    self._cond.wait()
+                    job = self._next_job()
+                if job is None:
+                    return
+                job.started_at = time.time()
+                self._active[job.lane] += 1
+
+            try:
+                job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                logger.error(f"任务 {job.job_id} 执行异常: {str(e)}")
+            finally:
+                with self._cond:
+                    self._active[job.lane] -= 1
+                    self._completed += 1
+                    self._total_wait += job.wait_seconds
+                    self._jobs.pop(job.job_id, None)
+                    # batch 通道释放名额后可能有等待中的任务可以执行
+                    self._cond.notify_all()
+
+
+# 原子地检查队列容量并入队，返回排队位置，队列已满时返回-1
+# KEYS: 按优先级排列的各通道队列；ARGV: 通道序号(从1开始), 任务数据, 队列上限
+_SUBMIT_SCRIPT = """
+local total = 0
+for i, key in ipairs(KEYS) do
+    total = total + redis.call('LLEN', key)
+end
+if total >= tonumber(ARGV[3]) then
+    return -1
+end
+local lane = tonumber(ARGV[1])
+redis.call('RPUSH', KEYS[lane], ARGV[2])
+local position = 0
+for i = 1, lane do
+    position = position + redis.call('LLEN', KEYS[i])
+end
+return position
+"""
+
+# 回收心跳已过期的工作线程的处理中列表，原子地取出其中的任务，只有一个进程能取到
+# KEYS: 工作线程登记哈希(消费者 -> 进程ID), 运行中任务哈希；ARGV: 键前缀
+_REAP_SCRIPT = """
+local reaped = {}
+local consumers = redis.call('HGETALL', KEYS[1])
+for i = 1, #consumers, 2 do
+    local consumer, worker = consumers[i], consumers[i + 1]
+    if redis.call('EXISTS', ARGV[1] .. 'heartbeat:' .. worker) == 0 then
+        local processing = ARGV[1] .. 'processing:' .. consumer
+        for _, payload in ipairs(redis.call('LRANGE', processing, 0, -1)) do
+            redis.call('HDEL', KEYS[2], cjson.decode(payload)['job_id'])
+            table.insert(reaped, payload)
+        end
+        redis.call('DEL', processing)
+        redis.call('HDEL', KEYS[1], consumer)
+    end
+end
+return reaped
+"""
+
+
+class RedisAnalysisScheduler:
+    """基于Redis列表的共享任务队列，接口与 AnalysisScheduler 相同
+
+    - 每个优先级通道对应一个Redis列表，任何进程都可以提交任务
+    - 每个进程启动 max_workers 个工作线程，按通道优先级 LMOVE/BLMOVE 把任务移入
+      本线程的处理中列表，任务结束后才从该列表删除；max_workers 为0时该进程只提交任务(纯API进程)
+    - 有工作线程的进程定期刷新心跳键，进程崩溃后心跳过期，任何进程的回收线程
+      把其处理中列表里的任务放回队列头部，超过 max_attempts 次的任务交给 on_abandoned 处理
+    - 任务以处理函数名和参数的形式入队，处理函数需要在构造时注册
+    - batch 通道的并发上限按进程计算
+    """
+
+    def __init__(
+        self,
+        client,
+        handlers: Dict[str, Callable],
+        max_workers: int = 2,
+        max_queue_size: int = 20,
+        batch_max_active: Optional[int] = None,
+        prefix: str = "analysis_queue",
+        poll_timeout: int = 2,
+        lease_seconds: int = 60,
+        max_attempts: int = 2,
+        on_abandoned: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self._client = client
+        self.handlers = dict(handlers)
+        self.max_workers = max(0, max_workers)
+        self.max_queue_size = max(0, max_queue_size)
+        if batch_max_active is None:
+            batch_max_active = max(1, self.max_workers - 1)
+        self.batch_max_active = max(1, min(batch_max_active, max(1, self.max_workers)))
+        self.prefix = prefix
+        self.poll_timeout = poll_timeout
+        self.lease_seconds = max(3, lease_seconds)
+        self.max_attempts = max(1, max_attempts)
+        self.on_abandoned = on_abandoned
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._submit_script = client.register_script(_SUBMIT_SCRIPT)
+        self._reap_script = client.register_script(_REAP_SCRIPT)
+
+        self._lock = threading.Lock()
+        self._active: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._completed = 0
+        self._total_wait = 0.0
+        self._shutdown = False
+        self._stop = threading.Event()
+
+        if self.max_workers:
+            self._beat()
+        self._workers = []
+        for i in range(self.max_workers):
+            consumer = f"{self.worker_id}:{i}"
+            worker = threading.Thread(target=self._worker_loop, args=(consumer,), name=f"analysis-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self._maintenance = threading.Thread(target=self._maintenance_loop, name="analysis-queue-reaper", daemon=True)
+        self._maintenance.start()
+
+    def _lane_key(self, lane: str) -> str:
+        return f"{self.prefix}:{lane}"
+
+    @property
+    def _jobs_key(self) -> str:
+        # job_id -> 排队中的任务数据，用于查询排队位置
+        return f"{self.prefix}:jobs"
+
+    @property
+    def _running_key(self) -> str:
+        # job_id -> 运行中的任务信息，所有进程共享
+        return f"{self.prefix}:running"
+
+    @property
+    def _consumers_key(self) -> str:
+        # 工作线程 -> 所属进程ID，回收线程据此找到心跳键和处理中列表
+        return f"{self.prefix}:consumers"
+
+    def _processing_key(self, consumer: str) -> str:
+        return f"{self.prefix}:processing:{consumer}"
+
+    def _heartbeat_key(self, worker_id: str) -> str:
+        return f"{self.prefix}:heartbeat:{worker_id}"
+
+    def submit(self, job_id: str, fn: Callable, *args, lane: str = "interactive", **kwargs) -> int:
+        """提交任务到共享队列
+
+        Returns:
+            int: 任务在所有排队任务中的位置(从1开始)
+
+        Raises:
+            ValueError: 通道名称无效或处理函数未注册
+            QueueFullError: 队列已满
+            DuplicateJobError: 相同ID的任务已在排队或运行中
+        """
+        if lane not in LANES:
+            raise ValueError(f"不支持的优先级通道: {lane}")
+        if self.handlers.get(fn.__name__) is not fn:
+            raise ValueError(f"处理函数未注册: {fn.__name__}")
+        if self._shutdown:
+            raise RuntimeError("调度器已关闭")
+
+        payload = json.dumps({
+            "job_id": job_id,
+            "handler": fn.__name__,
+            "args": list(args),
+            "kwargs": kwargs,
+            "lane": lane,
+            "enqueued_at": time.time(),
+        }, ensure_ascii=False)
+        if self._client.hexists(self._running_key, job_id) or not self._client.hsetnx(self._jobs_key, job_id, payload):
+            raise DuplicateJobError(f"任务 {job_id} 已在队列中或正在运行")
+        position = self._submit_script(
+            keys=[self._lane_key(name) for name in LANES],
+            args=[LANES.index(lane) + 1, payload, self.max_queue_size],
+        )
+        if position < 0:
+            self._client.hdel(self._jobs_key, job_id)
+            raise QueueFullError(f"分析队列已满({self.max_queue_size})")
+
+        logger.info(f"任务 {job_id} 进入 {lane} 共享队列，排队位置: {position}")
+        return position
+
+    def queue_info(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务的排队信息，任务不在队列中时返回None"""
+        running = self._client.hget(self._running_key, job_id)
+        if running:
+            job = json.loads(running)
+            return {
+                "lane": job["lane"],
+                "state": "running",
+                "position": 0,
+                "queue_depth": self._queued_count(),
+                "wait_seconds": round(job["started_at"] - job["enqueued_at"], 3),
+            }
+
+        payload = self._client.hget(self._jobs_key, job_id)
+        if not payload:
+            return None
+        job = json.loads(payload)
+        position = 0
+        for lane in LANES:
+            queue = self._client.lrange(self._lane_key(lane), 0, -1)
+            if lane == job["lane"]:
+                if payload not in queue:
+                    return None
+                position += queue.index(payload) + 1
+                break
+            position += len(queue)
+        return {
+            "lane": job["lane"],
+            "state": "queued",
+            "position": position,
+            "queue_depth": self._queued_count(),
+            "wait_seconds": round(time.time() - job["enqueued_at"], 3),
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        """从共享队列中移除尚未开始的任务，已开始运行的任务返回False"""
+        payload = self._client.hget(self._jobs_key, job_id)
+        if not payload:
+            return False
+        lane = json.loads(payload)["lane"]
+        if not self._client.lrem(self._lane_key(lane), 1, payload):
+            return False
+        self._client.hdel(self._jobs_key, job_id)
+        logger.info(f"任务 {job_id} 已从 {lane} 共享队列移除")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """获取调度器运行状态：本进程的工作线程和共享队列"""
+        queued = {lane: self._client.llen(self._lane_key(lane)) for lane in LANES}
+        with self._lock:
+            return {
+                "backend": "redis",
+                "max_workers": self.max_workers,
+                "active_workers": sum(self._active.values()),
+                "active_by_lane": dict(self._active),
+                "queued_by_lane": queued,
+                "queue_depth": sum(queued.values()),
+                "max_queue_size": self.max_queue_size,
+                "running_cluster": self._client.hlen(self._running_key),
+                "completed": self._completed,
+                "avg_wait_seconds": round(self._total_wait / self._completed, 3) if self._completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """停止接收新任务，工作线程在当前任务结束后退出"""
+        self._shutdown = True
+        self._stop.set()
+
+    def _queued_count(self) -> int:
+        return sum(self._client.llen(self._lane_key(lane)) for lane in LANES)
+
+    def _beat(self) -> None:
+        """刷新本进程的心跳键"""
+        self._client.set(self._heartbeat_key(self.worker_id), time.time(), ex=self.lease_seconds)
+
+    def reap_expired(self) -> int:
+        """回收心跳已过期的工作线程领取的任务
+
+        未超过 max_attempts 次的任务放回原通道的队列头部，其余交给 on_abandoned
+
+        Returns:
+            int: 回收的任务数量
+        """
+        reaped = self._reap_script(keys=[self._consumers_key, self._running_key], args=[f"{self.prefix}:"])
+        for payload in reaped:
+            job = json.loads(payload)
+            job.pop("started_at", None)
+            job["attempts"] = job.get("attempts", 0) + 1
+            if job["attempts"] < self.max_attempts:
+                payload = json.dumps(job, ensure_ascii=False)
+                pipe = self._client.pipeline(transaction=True)
+                pipe.hset(self._jobs_key, job["job_id"], payload)
+                pipe.lpush(self._lane_key(job["lane"]), payload)
+                pipe.execute()
+                logger.warning(f"执行任务 {job['job_id']} 的工作进程已失去心跳，任务重新进入 {job['lane']} 队列")
+                continue
+            self._client.hdel(self._jobs_key, job["job_id"])
+            logger.error(f"任务 {job['job_id']} 的工作进程已失去心跳，已重试 {job['attempts']} 次，不再重新入队")
+            if self.on_abandoned is not None:
+                try:
+                    self.on_abandoned(job)
+                except Exception as e:
+                    logger.error(f"处理被放弃的任务 {job['job_id']} 失败: {str(e)}")
+        return len(reaped)
+
+    def _maintenance_loop(self) -> None:
+        """定期刷新心跳并回收其他进程崩溃后遗留的任务"""
+        interval = self.lease_seconds / 3
+        while not self._stop.wait(interval):
+            try:
+                if self.max_workers:
+                    self._beat()
+                self.reap_expired()
+            except Exception as e:
+                logger.error(f"刷新共享队列心跳或回收任务失败: {str(e)}")
+
+    def _fetch(self, processing_key: str) -> Optional[str]:
+        """按通道优先级把一个任务移入处理中列表
+
+        BLMOVE 只能等待一个列表，队列都为空时只阻塞等待 interactive 通道，
+        batch 通道的任务最多延迟 poll_timeout 秒被领取
+        """
+        with self._lock:
+            batch_available = self._active["batch"] < self.batch_max_active
+        lanes = [lane for lane in LANES if lane != "batch" or batch_available]
+        for lane in lanes:
+            payload = self._client.lmove(self._lane_key(lane), processing_key, "LEFT", "RIGHT")
+            if payload:
+                return payload
+        return self._client.blmove(self._lane_key(lanes[0]), processing_key, self.poll_timeout, "LEFT", "RIGHT")
+
+    def _worker_loop(self, consumer: str) -> None:
+        processing_key = self._processing_key(consumer)
+        while not self._shutdown:
+            try:
+                self._client.hset(self._consumers_key, consumer, self.worker_id)
+                payload = self._fetch(processing_key)
+            except Exception as e:
+                logger.error(f"从共享队列获取任务失败: {str(e)}")
+                time.sleep(1)
+                continue
+            if payload is None:
+                continue
+
+            job = json.loads(payload)
+            job["started_at"] = time.time()
+            wait_seconds = job["started_at"] - job["enqueued_at"]
+            handler = self.handlers.get(job["handler"])
+            try:
+                pipe = self._client.pipeline(transaction=True)
+                pipe.hset(self._running_key, job["job_id"], json.dumps(job, ensure_ascii=False))
+                pipe.hdel(self._jobs_key, job["job_id"])
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"记录任务 {job['job_id']} 运行状态失败: {str(e)}")
+
+            with self._lock:
+                self._active[job["lane"]] += 1
+            try:
+                if handler is None:
+                    raise ValueError(f"处理函数未注册: {job['handler']}")
+                handler(*job["args"], **job["kwargs"])
+            except Exception as e:
+                logger.error(f"任务 {job['job_id']} 执行异常: {str(e)}")
+            finally:
+                with self._lock:
+                    self._active[job["lane"]] -= 1
+                    self._completed += 1
+                    self._total_wait += wait_seconds
+                try:
+                    pipe = self._client.pipeline(transaction=True)
+                    pipe.hdel(self._running_key, job["job_id"])
+                    pipe.lrem(processing_key, 1, payload)
+                    pipe.execute()
+                except Exception as e:
+                    logger.error(f"清理任务 {job['job_id']} 运行状态失败: {str(e)}")
@@ -0,0 +1,188 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 运行中的任务不会被淘汰，执行线程持有的对象必须与缓存中的保持一致
+ACTIVE_STATUSES = ("pending", "processing")
+
+
+class TaskCache:
+    """有界的内存任务缓存，替代无限增长的 task_store 字典
+
+    - 按最近访问顺序(LRU)淘汰，限制任务数量和结果占用的字节数
+    - 已结束的任务按状态设置存活时间，例如失败任务比已完成任务更早淘汰
+    - 淘汰前调用 on_evict 将未持久化的结果写入注册表，之后可按需重新加载
+    - 按公司名称/股票代码和分析类型建立二级索引，复用任务时无需遍历所有任务
+    """
+
+    def __init__(
+        self,
+        max_tasks: int,
+        max_bytes: int,
+        ttl_by_status: Dict[str, int],
+        size_of: Callable[[Any], int],
+        on_evict: Optional[Callable[[str, Any], None]] = None,
+        sweep_interval: float = 30.0,
+    ):
+        self.max_tasks = max(1, max_tasks)
+        self.max_bytes = max_bytes
+        self.ttl_by_status = dict(ttl_by_status)
+        self.size_of = size_of
+        self.on_evict = on_evict
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.RLock()
+        self._tasks: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._touched: Dict[str, float] = {}
+        self._index: Dict[Tuple[str, str, Optional[str]], Set[str]] = {}
+        self._index_keys: Dict[str, Set[Tuple[str, str, Optional[str]]]] = {}
+        self._last_sweep = time.monotonic()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def __getitem__(self, task_id: str) -> Any:
+        task = self.get(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def __setitem__(self, task_id: str, task: Any) -> None:
+        with self._lock:
+            self._tasks[task_id] = task
+            self._tasks.move_to_end(task_id)
+            self._measure(task_id, task)
+        self._enforce_limits()
+
+    def get(self, task_id: str, default: Any = None) -> Any:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return default
+            self._tasks.move_to_end(task_id)
+            return task
+
+    def pop(self, task_id: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._remove(task_id, default)
+
+    def items(self) -> Iterable[Tuple[str, Any]]:
+        with self._lock:
+            return list(self._tasks.items())
+
+    def track(self, task_id: str) -> None:
+        """任务状态、股票代码、分析类型或结果变化后重新计算大小和索引"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            self._measure(task_id, task)
+        self._enforce_limits()
+
+    def find(self, company_name: Optional[str], stock_code: Optional[str] = None, status: str = "completed",
+             analysis_type: Optional[str] = None) -> Optional[str]:
+        """按公司名称或股票代码查找该分析类型指定状态的任务，返回最近更新的任务ID"""
+        keys = []
+        if company_name:
+            keys.append(("name", company_name, analysis_type))
+        if stock_code:
+            keys.append(("code", stock_code, analysis_type))
+        with self._lock:
+            candidates = set()
+            for key in keys:
+                candidates.update(self._index.get(key, ()))
+            matches = [self._tasks[task_id] for task_id in candidates if self._tasks[task_id].status == status]
+        if not matches:
+            return None
+        return max(matches, key=lambda task: task.updated_at).task_id
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tasks": len(self._tasks),
+                "max_tasks": self.max_tasks,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+    def _measure(self, task_id: str, task: Any) -> None:
+        """更新任务的大小、访问时间和索引，调用方持有锁"""
+        size = self.size_of(task)
+        self.total_bytes += size - self._sizes.get(task_id, 0)
+        self._sizes[task_id] = size
+        self._touched[task_id] = time.monotonic()
+
+        keys = set()
+        analysis_type = getattr(task, "analysis_type", None)
+        if getattr(task, "company_name", None):
+            keys.add(("name", task.company_name, analysis_type))
+        if getattr(task, "stock_code", None):
+            keys.add(("code", task.stock_code, analysis_type))
+        old_keys = self._index_keys.get(task_id, set())
+        for key in old_keys - keys:
+            self._unindex(key, task_id)
+        for key in keys - old_keys:
+            self._index.setdefault(key, set()).add(task_id)
+        self._index_keys[task_id] = keys
+
+    def _unindex(self, key: Tuple[str, str, Optional[str]], task_id: str) -> None:
+        task_ids = self._index.get(key)
+        if task_ids is not None:
+            task_ids.discard(task_id)
+            if not task_ids:
+                self._index.pop(key, None)
+
+    def _remove(self, task_id: str, default: Any = None) -> Any:
+        task = self._tasks.pop(task_id, None)
+        if task is None:
+            return default
+        self.total_bytes -= self._sizes.pop(task_id, 0)
+        self._touched.pop(task_id, None)
+        for key in self._index_keys.pop(task_id, set()):
+            self._unindex(key, task_id)
+        return task
+
+    def _expired(self, task_id: str, task: Any, now: float) -> bool:
+        ttl = self.ttl_by_status.get(task.status)
+        return ttl is not None and now - self._touched.get(task_id, now) > ttl
+
+    def _enforce_limits(self) -> None:
+        """淘汰过期任务和超出数量/字节上限的最久未访问任务"""
+        victims = []
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = now
+                for task_id, task in list(self._tasks.items()):
+                    if task.status not in ACTIVE_STATUSES and self._expired(task_id, task, now):
+                        victims.append((task_id, self._remove(task_id)))
+
+            if len(self._tasks) > self.max_tasks or self.total_bytes > self.max_bytes:
+                for task_id, task in list(self._tasks.items()):
+                    if len(self._tasks) <= self.max_tasks and self.total_bytes <= self.max_bytes:
+                        break
+                    if task.status in ACTIVE_STATUSES:
+                        continue
+                    victims.append((task_id, self._remove(task_id)))
+            self.evictions += len(victims)
+
+        # 在锁外写入注册表，避免阻塞其他请求
+        for task_id, task in victims:
+            if self.on_evict is not None:
+                try:
+                    self.on_evict(task_id, task)
+                except Exception as e:
+                    logger.error(f"淘汰任务 {task_id} 时保存结果失败: {str(e)}")
+        if victims:
+            logger.info(f"从内存中淘汰了 {len(victims)} 个任务，当前 {len(self._tasks)} 个任务 / {self.total_bytes} 字节")
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务结束时发送的事件类型，订阅者收到后关闭连接
+TERMINAL_EVENTS = ("completed", "failed", "cancelled")
+
+
+class TaskEvent:
+    """任务事件，同一事件只序列化一次，由所有订阅者共享"""
+
+    __slots__ = ("event", "data", "_json", "_sse", "_ws")
+
+    def __init__(self, event: str, data: Dict[str, Any]):
+        self.event = event
+        self.data = data
+        self._json: Optional[str] = None
+        self._sse: Optional[str] = None
+        self._ws: Optional[str] = None
+
+    @property
+    def terminal(self) -> bool:
+        return self.event in TERMINAL_EVENTS
+
+    def json(self) -> str:
+        if self._json is None:
+            self._json = json.dumps(self.data, ensure_ascii=False)
+        return self._json
+
+    def sse(self) -> str:
+        """Server-Sent Events 格式的消息帧"""
+        if self._sse is None:
+            self._sse = f"event: {self.event}\ndata: {self.json()}\n\n"
+        return self._sse
+
+    def ws(self) -> str:
+        """WebSocket 文本消息"""
+        if self._ws is None:
+            self._ws = f'{{"event": {json.dumps(self.event)}, "data": {self.json()}}}'
+        return self._ws
+
+
+class TaskSubscription:
+    """单个订阅者，持有所属事件循环中的有界队列"""
+
+    def __init__(self, task_id: str, loop: asyncio.AbstractEventLoop, max_queue_size: int):
+        self.task_id = task_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+
+    def _put(self, event: TaskEvent) -> None:
+        """在事件循环线程中执行；队列满时丢弃最旧的事件，保证最新进度送达"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[TaskEvent]:
+        """等待下一个事件，超时返回None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class TaskEventBroker:
+    """任务事件广播器
+
+    工作线程中 TaskStatus.update() 调用 publish()，事件通过
+    call_soon_threadsafe 投递到各订阅者所在的事件循环
+    """
+
+    def __init__(self, max_queue_size: int = 100):
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[TaskSubscription]] = {}
+        # 多进程部署时通过 RedisEventRelay 转发事件到其他进程的订阅者
+        self.relay: Optional["RedisEventRelay"] = None
+
+    def subscribe(self, task_id: str) -> TaskSubscription:
+        """订阅任务事件，必须在事件循环中调用"""
+        subscription = TaskSubscription(task_id, asyncio.get_running_loop(), self.max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(task_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: TaskSubscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.task_id)
+            if not subscribers:
+                return
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.task_id, None)
+
+    def has_subscribers(self, task_id: str) -> bool:
+        return task_id in self._subscribers
+
+    def should_publish(self, task_id: str) -> bool:
+        """是否需要生成事件：本进程有订阅者，或订阅者可能在其他进程"""
+        return self.relay is not None or task_id in self._subscribers
+
+    def subscriber_count(self, task_id: Optional[str] = None) -> int:
+        with self._lock:
+            if task_id is not None:
+                return len(self._subscribers.get(task_id, []))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, task_id: str, event: TaskEvent) -> None:
+        """向任务的所有订阅者广播事件，可在任意线程调用"""
+        self.publish_local(task_id, event)
+        if self.relay is not None:
+            self.relay.publish(task_id, event)
+
+    def publish_local(self, task_id: str, event: TaskEvent) -> None:
+        """只向本进程的订阅者广播事件"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, []))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                # 事件循环已关闭，移除失效的订阅者
+                self.unsubscribe(subscription)
+
+
+class RedisEventRelay:
+    """通过Redis pub/sub在进程间转发任务事件
+
+    每个进程发布的事件带有自身的实例ID，监听线程收到其他进程的事件后
+    投递给本进程的 TaskEventBroker
+    """
+
+    def __init__(self, client, broker: TaskEventBroker, channel_prefix: str = "stock_task_events:"):
+        self._client = client
+        self.broker = broker
+        self.channel_prefix = channel_prefix
+        self.instance_id = uuid.uuid4().hex
+        self._stopped = False
+        self._thread = threading.Thread(target=self._listen, name="task-event-relay", daemon=True)
+        self._thread.start()
+
+    def publish(self, task_id: str, event: TaskEvent) -> None:
+        message = f'{{"origin": "{self.instance_id}", "event": {json.dumps(event.event)}, "data": {event.json()}}}'
+        try:
+            self._client.publish(f"{self.channel_prefix}{task_id}", message)
+        except Exception as e:
+            logger.error(f"转发任务事件失败: {str(e)}")
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    def _listen(self) -> None:
+        while not self._stopped:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(f"{self.channel_prefix}*")
+                while not self._stopped:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") == self.instance_id:
+                        continue
+                    task_id = message["channel"][len(self.channel_prefix):]
+                    if self.broker.has_subscribers(task_id):
+                        self.broker.publish_local(task_id, TaskEvent(payload["event"], payload["data"]))
+            except Exception as e:
+                logger.error(f"任务事件监听中断，1秒后重连: {str(e)}")
+                time.sleep(1)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
@@ -0,0 +1,504 @@
+import json
+import os
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 未记录分析类型的旧版任务按综合分析处理
+DEFAULT_ANALYSIS_TYPE = "综合分析"
+# 服务重启后需要继续执行的任务状态
+UNFINISHED_STATUSES = ("pending", "processing")
+
+
+class TaskRegistry:
+    """基于SQLite(WAL模式)的任务注册表
+
+    任务状态行与任务结果分表存储：
+    - tasks: 每个任务一行状态信息，进度/状态更新只改写对应行
+    - task_results: 任务结果摘要，按需懒加载，不随状态一起读取
+    - task_modules: 每个结果模块预编码后的JSON字节，接口直接返回
+
+    只能在单个进程内使用，多进程部署时使用 RedisTaskRegistry
+    """
+
+    shared = False
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        """创建任务表结构"""
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    company_name TEXT,
+                    stock_code TEXT,
+                    status TEXT,
+                    progress INTEGER,
+                    message TEXT,
+                    stage TEXT,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    error TEXT,
+                    analysis_type TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_company ON tasks(company_name);
+                CREATE INDEX IF NOT EXISTS idx_tasks_stock_code ON tasks(stock_code);
+                CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+                CREATE TABLE IF NOT EXISTS task_results (
+                    task_id TEXT PRIMARY KEY,
+                    result TEXT
+                );
+                CREATE TABLE IF NOT EXISTS task_modules (
+                    task_id TEXT,
+                    module TEXT,
+                    body BLOB,
+                    PRIMARY KEY (task_id, module)
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                """
+            )
+            # 旧版数据库没有 analysis_type 列
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+            if "analysis_type" not in columns:
+                self._conn.execute("ALTER TABLE tasks ADD COLUMN analysis_type TEXT")
+
+    def save_status(self, task_id: str, status: Dict[str, Any]) -> None:
+        """写入或更新单个任务的状态行"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO tasks (task_id, company_name, stock_code, status, progress, message, stage, created_at, updated_at, error, analysis_type)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(task_id) DO UPDATE SET
+                    company_name=excluded.company_name,
+                    stock_code=excluded.stock_code,
+                    status=excluded.status,
+                    progress=excluded.progress,
+                    message=excluded.message,
+                    stage=excluded.stage,
+                    created_at=excluded.created_at,
+                    updated_at=excluded.updated_at,
+                    error=excluded.error,
+                    analysis_type=excluded.analysis_type
+                """,
+                (
+                    task_id,
+                    status.get("company_name"),
+                    status.get("stock_code"),
+                    status.get("status"),
+                    status.get("progress"),
+                    status.get("message"),
+                    status.get("stage"),
+                    status.get("created_at"),
+                    status.get("updated_at"),
+                    status.get("error"),
+                    status.get("analysis_type"),
+                ),
+            )
+
+    def save_result(self, task_id: str, result: Any) -> None:
+        """写入单个任务的结果"""
+        serialized = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO task_results (task_id, result) VALUES (?, ?)",
+                (task_id, serialized),
+            )
+
+    def save_modules(self, task_id: str, modules: Dict[str, bytes]) -> None:
+        """写入任务的各个结果模块(预编码的JSON字节)"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM task_modules WHERE task_id = ?", (task_id,))
+                self._conn.executemany(
+                    "INSERT INTO task_modules (task_id, module, body) VALUES (?, ?, ?)",
+                    [(task_id, module, body) for module, body in modules.items()],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def load_module(self, task_id: str, module: str) -> Optional[bytes]:
+        """读取单个结果模块的预编码字节"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM task_modules WHERE task_id = ? AND module = ?",
+                (task_id, module),
+            ).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
+
+    def latest_completed_tasks(self, batch_size: int = 500) -> Iterator[str]:
+        """逐批返回每个 (股票代码, 分析类型) 最近完成的任务ID"""
+        cursor = self._conn.cursor()
+        with self._lock:
+            # SQLite 中与 MAX() 一起查询的列取自最大值所在的行
+            cursor.execute(
+                """
+                SELECT task_id, MAX(updated_at) FROM tasks
+                WHERE status = 'completed' AND stock_code IS NOT NULL
+                GROUP BY stock_code, COALESCE(analysis_type, ?)
+                """,
+                (DEFAULT_ANALYSIS_TYPE,),
+            )
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row[0]
+        finally:
+            cursor.close()
+
+    def load_statuses(self) -> Dict[str, Dict[str, Any]]:
+        """读取所有任务的状态行(不包含结果)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT task_id, company_name, stock_code, status, progress, message, stage, created_at, updated_at, error, analysis_type FROM tasks"
+            )
+            columns = [col[0] for col in cursor.description]
+            rows = cursor.fetchall()
+        return {row[0]: dict(zip(columns[1:], row[1:])) for row in rows}
+
+    def load_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """读取单个任务的状态行"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT company_name, stock_code, status, progress, message, stage, created_at, updated_at, error, analysis_type FROM tasks WHERE task_id = ?",
+                (task_id,),
+            )
+            columns = [col[0] for col in cursor.description]
+            row = cursor.fetchone()
+        return dict(zip(columns, row)) if row else None
+
+    def unfinished_tasks(self) -> List[str]:
+        """排队或运行中的任务ID(走状态索引)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id FROM tasks WHERE status IN ('pending', 'processing')"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def find_completed_task(self, company_name: Optional[str], stock_code: Optional[str] = None,
+                            analysis_type: str = DEFAULT_ANALYSIS_TYPE) -> Optional[str]:
+        """按公司名称或股票代码查找该分析类型最近完成的任务ID(走索引)
+
+        旧版任务没有记录分析类型，视为综合分析
+        """
+        if not company_name and not stock_code:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT task_id FROM tasks
+                WHERE status = 'completed' AND (company_name = ? OR stock_code = ?)
+                  AND COALESCE(analysis_type, ?) = ?
+                ORDER BY updated_at DESC LIMIT 1
+                """,
+                (company_name, stock_code, DEFAULT_ANALYSIS_TYPE, analysis_type),
+            ).fetchone()
+        return row[0] if row else None
+
+    def has_result(self, task_id: str) -> bool:
+        """检查任务是否有已保存的结果"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM task_results WHERE task_id = ?", (task_id,)
+            ).fetchone()
+        return row is not None
+
+    def load_result(self, task_id: str) -> Optional[Any]:
+        """读取单个任务的结果"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM task_results WHERE task_id = ?", (task_id,)
+            ).fetchone()
+        if not row or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def delete(self, task_id: str) -> None:
+        """删除任务及其结果"""
+        with self._lock:
+            self._conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+            self._conn.execute("DELETE FROM task_results WHERE task_id = ?", (task_id,))
+            self._conn.execute("DELETE FROM task_modules WHERE task_id = ?", (task_id,))
+
+    def import_legacy_json(self, json_path: str) -> int:
+        """一次性导入旧版 task_store.json 文件中的任务
+
+        Returns:
+            int: 导入的任务数量，已导入过或文件不存在时返回0
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'legacy_json_imported'"
+            ).fetchone()
+        if row:
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"读取旧版任务文件失败: {str(e)}")
+            return 0
+
+        for task_id, task_data in data.items():
+            result = task_data.pop("result", None)
+            self.save_status(task_id, task_data)
+            if result is not None:
+                self.save_result(task_id, result)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                (json_path,),
+            )
+        logger.info(f"从 {json_path} 导入了 {len(data)} 个任务")
+        return len(data)
+
+
+# 原子地查找或登记进行中的任务
+# KEYS: 去重键；ARGV: task_id, 过期时间, 任务状态键前缀, 任务去重键集合
+_CLAIM_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    local existing = redis.call('GET', key)
+    if existing then
+        local status = redis.call('HGET', ARGV[3] .. existing, 'status')
+        if (not status) or status == 'pending' or status == 'processing' then
+            return existing
+        end
+        redis.call('DEL', key)
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, ARGV[1], 'EX', ARGV[2])
+    redis.call('SADD', ARGV[4], key)
+end
+redis.call('EXPIRE', ARGV[4], ARGV[2])
+return false
+"""
+
+# 移除任务的所有去重键(仅删除仍指向该任务的键)
+# KEYS: 任务去重键集合；ARGV: task_id
+_RELEASE_SCRIPT = """
+for i, key in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('DEL', key)
+    end
+end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+
+class RedisTaskRegistry:
+    """基于Redis的任务注册表，多个API进程/主机共享任务状态
+
+    - {prefix}:{task_id}: 任务状态哈希，每次更新整体写入并刷新过期时间
+    - {prefix}:{task_id}:result / :modules: 结果摘要和预编码的结果模块
+    - {prefix}:index: 所有任务ID的集合，过期的任务在读取时清理
+    - {prefix}:unfinished: 排队或运行中的任务ID集合
+    - {prefix}:inflight:*: 进行中任务的去重键，跨进程合并相同的分析请求
+    """
+
+    shared = True
+    STATUS_FIELDS = ("company_name", "stock_code", "status", "progress", "message", "stage", "created_at", "updated_at", "error", "analysis_type")
+
+    def __init__(self, client, raw_client, ttl: int, prefix: str = "stock_task", inflight_ttl: int = 7200):
+        self._client = client
+        self._raw = raw_client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.inflight_ttl = inflight_ttl
+        self._claim_script = client.register_script(_CLAIM_SCRIPT)
+        self._release_script = client.register_script(_RELEASE_SCRIPT)
+
+    def _key(self, task_id: str, suffix: str = "") -> str:
+        return f"{self.prefix}:{task_id}{suffix}"
+
+    @property
+    def _index_key(self) -> str:
+        return f"{self.prefix}:index"
+
+    @property
+    def _unfinished_key(self) -> str:
+        return f"{self.prefix}:unfinished"
+
+    def _decode_status(self, data: Dict[str, str]) -> Dict[str, Any]:
+        status = {field: data.get(field) for field in self.STATUS_FIELDS}
+        if status["progress"] is not None:
+            status["progress"] = int(status["progress"])
+        return status
+
+    def save_status(self, task_id: str, status: Dict[str, Any]) -> None:
+        """原子地写入任务状态并刷新过期时间"""
+        key = self._key(task_id)
+        values = {field: status.get(field) for field in self.STATUS_FIELDS}
+        pipe = self._client.pipeline(transaction=True)
+        pipe.hset(key, mapping={field: value for field, value in values.items() if value is not None})
+        empty = [field for field, value in values.items() if value is None]
+        if empty:
+            pipe.hdel(key, *empty)
+        pipe.expire(key, self.ttl)
+        pipe.sadd(self._index_key, task_id)
+        if values["status"] in UNFINISHED_STATUSES:
+            pipe.sadd(self._unfinished_key, task_id)
+        else:
+            pipe.srem(self._unfinished_key, task_id)
+        if values["status"] == "completed":
+            # 按公司名称、股票代码和分析类型索引最近完成的任务
+            analysis_type = values["analysis_type"] or DEFAULT_ANALYSIS_TYPE
+            for kind in ("company_name", "stock_code"):
+                if values[kind]:
+                    pipe.set(self._lookup_key(kind, values[kind], analysis_type), task_id, ex=self.ttl)
+        pipe.execute()
+
+    def _lookup_key(self, kind: str, value: str, analysis_type: str) -> str:
+        return f"{self.prefix}:by_{kind}:{analysis_type}:{value}"
+
+    def find_completed_task(self, company_name: Optional[str], stock_code: Optional[str] = None,
+                            analysis_type: str = DEFAULT_ANALYSIS_TYPE) -> Optional[str]:
+        """按公司名称或股票代码查找该分析类型最近完成的任务ID"""
+        for kind, value in (("company_name", company_name), ("stock_code", stock_code)):
+            if not value:
+                continue
+            task_id = self._client.get(self._lookup_key(kind, value, analysis_type))
+            if not task_id:
+                continue
+            status, task_type = self._client.hmget(self._key(task_id), "status", "analysis_type")
+            if status == "completed" and (task_type or DEFAULT_ANALYSIS_TYPE) == analysis_type:
+                return task_id
+        return None
+
+    def save_result(self, task_id: str, result: Any) -> None:
+        self._client.set(self._key(task_id, ":result"), json.dumps(result, ensure_ascii=False), ex=self.ttl)
+
+    def save_modules(self, task_id: str, modules: Dict[str, bytes]) -> None:
+        key = self._key(task_id, ":modules")
+        pipe = self._raw.pipeline(transaction=True)
+        pipe.delete(key)
+        if modules:
+            pipe.hset(key, mapping=modules)
+            pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def load_module(self, task_id: str, module: str) -> Optional[bytes]:
+        return self._raw.hget(self._key(task_id, ":modules"), module)
+
+    def latest_completed_tasks(self, batch_size: int = 500) -> Iterator[str]:
+        """按股票代码的查找键逐批返回每个 (股票代码, 分析类型) 最近完成的任务ID"""
+        keys = []
+        for key in self._client.scan_iter(match=self._lookup_key("stock_code", "*", "*"), count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                yield from filter(None, self._client.mget(keys))
+                keys = []
+        if keys:
+            yield from filter(None, self._client.mget(keys))
+
+    def load_statuses(self) -> Dict[str, Dict[str, Any]]:
+        task_ids = sorted(self._client.smembers(self._index_key))
+        if not task_ids:
+            return {}
+        pipe = self._client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hgetall(self._key(task_id))
+        statuses, expired = {}, []
+        for task_id, data in zip(task_ids, pipe.execute()):
+            if data:
+                statuses[task_id] = self._decode_status(data)
+            else:
+                expired.append(task_id)
+        if expired:
+            self._client.srem(self._index_key, *expired)
+        return statuses
+
+    def load_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        data = self._client.hgetall(self._key(task_id))
+        return self._decode_status(data) if data else None
+
+    def unfinished_tasks(self) -> List[str]:
+        """排队或运行中的任务ID，状态已过期的任务从集合中清理"""
+        task_ids = sorted(self._client.smembers(self._unfinished_key))
+        if not task_ids:
+            return []
+        pipe = self._client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hget(self._key(task_id), "status")
+        unfinished, stale = [], []
+        for task_id, status in zip(task_ids, pipe.execute()):
+            (unfinished if status in UNFINISHED_STATUSES else stale).append(task_id)
+        if stale:
+            self._client.srem(self._unfinished_key, *stale)
+        return unfinished
+
+    def has_result(self, task_id: str) -> bool:
+        return bool(self._client.exists(self._key(task_id, ":result")))
+
+    def load_result(self, task_id: str) -> Optional[Any]:
+        data = self._client.get(self._key(task_id, ":result"))
+        return json.loads(data) if data else None
+
+    def delete(self, task_id: str) -> None:
+        pipe = self._client.pipeline(transaction=True)
+        pipe.delete(self._key(task_id), self._key(task_id, ":result"), self._key(task_id, ":modules"))
+        pipe.srem(self._index_key, task_id)
+        pipe.srem(self._unfinished_key, task_id)
+        pipe.execute()
+
+    def import_legacy_json(self, json_path: str) -> int:
+        """Redis后端不导入旧版JSON文件，旧任务保留在SQLite注册表中"""
+        return 0
+
+    def request_cancel(self, task_id: str) -> None:
+        """记录取消请求，由执行该任务的进程轮询"""
+        self._client.set(self._key(task_id, ":cancel"), "1", ex=self.inflight_ttl)
+
+    def cancel_requested(self, task_id: str) -> bool:
+        return bool(self._client.exists(self._key(task_id, ":cancel")))
+
+    def clear_cancel(self, task_id: str) -> None:
+        """任务重新提交前清除之前的取消请求"""
+        self._client.delete(self._key(task_id, ":cancel"))
+
+    def _inflight_key(self, key: tuple) -> str:
+        return f"{self.prefix}:inflight:" + ":".join(str(part) for part in key)
+
+    def claim_inflight(self, task_id: str, keys: List[tuple]) -> Optional[str]:
+        """跨进程原子地查找或登记进行中的任务，返回已存在的任务ID或None"""
+        return self._claim_script(
+            keys=[self._inflight_key(key) for key in keys],
+            args=[task_id, self.inflight_ttl, f"{self.prefix}:", self._key(task_id, ":inflight")],
+        )
+
+    def add_inflight_alias(self, task_id: str, key: tuple) -> None:
+        inflight_key = self._inflight_key(key)
+        pipe = self._client.pipeline(transaction=True)
+        pipe.set(inflight_key, task_id, ex=self.inflight_ttl, nx=True)
+        pipe.sadd(self._key(task_id, ":inflight"), inflight_key)
+        pipe.execute()
+
+    def release_inflight(self, task_id: str) -> None:
+        self._release_script(keys=[self._key(task_id, ":inflight")], args=[task_id])
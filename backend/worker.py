@@ -0,0 +1,38 @@
+"""
+独立的分析工作进程
+
+在 TASK_REGISTRY_BACKEND=redis 时从共享队列领取分析任务，可以在多台主机上运行多个实例。
+API进程设置 ANALYSIS_MAX_WORKERS=0 后只负责接收请求和提交任务。
+工作进程在 WORKER_METRICS_PORT 上提供 /metrics，节点、LLM和工作线程指标需要单独抓取。
+
+用法: python worker.py
+"""
+import os
+import time
+
+os.environ.setdefault("TASK_REGISTRY_BACKEND", "redis")
+
+import server
+from config.settings import WORKER_METRICS_PORT, WORKER_METRICS_HOST
+from utils.metrics import start_metrics_server
+
+
+def main():
+    if not server.task_registry.shared:
+        raise SystemExit("Redis不可用，独立工作进程需要共享任务注册表")
+    server.logger.info(f"分析工作进程已启动，工作线程数: {server.analysis_scheduler.max_workers}")
+    metrics_server = start_metrics_server(WORKER_METRICS_PORT, WORKER_METRICS_HOST) if WORKER_METRICS_PORT else None
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        server.analysis_scheduler.shutdown()
+        server.shutdown_chart_pool()
+        if server.task_events.relay is not None:
+            server.task_events.relay.stop()
+
+
+if __name__ == "__main__":
+    main()